@@ -0,0 +1,156 @@
+"""
+Content-Addressed Render Cache
+---------------------------------------------------------------------------------------------
+This module skips re-rendering figures whose inputs have not changed since the last run.
+
+Every rendered figure is stored on disk under a key that hashes together:
+- the input data (DataFrames, Series, arrays, or csv files by size, mtime and content)
+- the parameters of the plot call
+- the versions of the plotting libraries that are loaded
+- the active matplotlib rcParams, so a different style sheet is a different figure
+
+On a hit the stored PNG/SVG is returned without drawing anything. The cache directory is
+bounded in size and evicts the least recently used artifacts first.
+---------------------------------------------------------------------------------------------
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+#libraries whose versions take part in the key when they are imported
+VERSIONED_LIBRARIES = ('matplotlib', 'numpy', 'pandas', 'seaborn', 'plotly')
+
+#rcParams that do not change the rendered output
+IGNORED_RCPARAMS = ('backend', 'backend_fallback', 'interactive', 'webagg.port',
+    'webagg.address', 'webagg.port_retries', 'webagg.open_in_browser', 'toolbar')
+
+
+def fingerprint(item, digest):
+    """Feed a stable fingerprint of one input into a hashlib digest."""
+    import numpy as np
+
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(item, (pd.DataFrame, pd.Series)):
+        digest.update(b'pandas')
+        digest.update(repr(getattr(item, 'columns', getattr(item, 'name', None))).encode())
+        digest.update(repr(getattr(item, 'dtypes', getattr(item, 'dtype', None))).encode())
+        digest.update(pd.util.hash_pandas_object(item, index=True).values.tobytes())
+    elif isinstance(item, np.ndarray):
+        digest.update(b'ndarray')
+        digest.update(repr((item.dtype.str, item.shape)).encode())
+        digest.update(np.ascontiguousarray(item).tobytes())
+    elif isinstance(item, str) and os.path.isfile(item):
+        stat = os.stat(item)
+        digest.update(b'file')
+        digest.update(repr((os.path.abspath(item), stat.st_size, stat.st_mtime_ns)).encode())
+        with open(item, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    else:
+        digest.update(b'value')
+        digest.update(json.dumps(item, sort_keys=True, default=repr).encode())
+
+
+def environment_state():
+    """Return the loaded library versions and the active rcParams that affect rendering."""
+    versions = {}
+    for name in VERSIONED_LIBRARIES:
+        module = sys.modules.get(name)
+        if module is not None:
+            versions[name] = getattr(module, '__version__', None)
+    rcparams = {}
+    if 'matplotlib' in sys.modules:
+        import matplotlib as mpl
+        rcparams = dict((k, repr(v)) for k, v in mpl.rcParams.items() if k not in IGNORED_RCPARAMS)
+    return versions, rcparams
+
+
+class RenderCache(object):
+    """
+    Size-bounded, least recently used cache of rendered figures.
+
+    cache_dir - folder holding the artifacts, one file per key
+    max_bytes - total size above which the least recently used artifacts are evicted
+    """
+
+    def __init__(self, cache_dir='.render_cache', max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, data=(), params=None, fmt='png'):
+        """Hash the inputs, plot parameters, library versions and rcParams into a key."""
+        digest = hashlib.sha256()
+        if not isinstance(data, (list, tuple)):
+            data = (data,)
+        for item in data:
+            fingerprint(item, digest)
+        versions, rcparams = environment_state()
+        digest.update(json.dumps(dict(params=params, fmt=fmt, versions=versions, rcparams=rcparams),
+            sort_keys=True, default=repr).encode())
+        return digest.hexdigest()
+
+    def path(self, key, fmt='png'):
+        """Return where the artifact for a key is stored."""
+        return os.path.join(self.cache_dir, '%s.%s' % (key, fmt))
+
+    def get(self, key, fmt='png'):
+        """Return the cached artifact path for a key, or None, marking it recently used."""
+        path = self.path(key, fmt)
+        if not os.path.isfile(path):
+            return None
+        os.utime(path, None)
+        return path
+
+    def put(self, key, figure, fmt='png', **savefig_kwargs):
+        """Save a figure under a key and evict old artifacts if the cache is over budget."""
+        path = self.path(key, fmt)
+        handle, staging = tempfile.mkstemp(dir=self.cache_dir, suffix='.' + fmt)
+        os.close(handle)
+        figure.savefig(staging, format=fmt, **savefig_kwargs)
+        os.replace(staging, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        """Delete least recently used artifacts until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+        return total
+
+    def render(self, draw, data=(), params=None, fmt='png', **savefig_kwargs):
+        """
+        Return (path, hit) for the figure drawn by draw(), rendering it only on a miss.
+
+        draw is called with no arguments and returns the Figure it drew (or None to
+        use the current pyplot figure). The figure is closed after it is saved.
+        """
+        key = self.key(data, dict(params=params, savefig=savefig_kwargs), fmt)
+        path = self.get(key, fmt)
+        if path is not None:
+            self.hits += 1
+            return path, True
+
+        import matplotlib.pyplot as plt
+        self.misses += 1
+        figure = draw()
+        if figure is None:
+            figure = plt.gcf()
+        path = self.put(key, figure, fmt, **savefig_kwargs)
+        plt.close(figure)
+        return path, False
@@ -0,0 +1,134 @@
+"""
+Isolated, Precompiled Style Contexts
+---------------------------------------------------------------------------------------------
+This module replaces global plt.style.use() calls with style objects that are resolved and
+validated once, cached, and applied only while a figure is being built and drawn.
+
+- plt.style.use() mutates the global rcParams, so a style leaks into every later plot
+- a StyleContext applies its rcParams inside a with block (or render call) and restores
+  the previous rcParams afterwards, so styles never leak between figures
+- style names, style files, dictionaries and lists of styles are all accepted, and each
+  distinct style is only looked up and validated the first time it is used
+- rcParams are process-global in matplotlib, so the styled build/draw step is guarded by
+  a lock; figures for several styles can be submitted from a thread pool safely, and any
+  data preparation done before render() (e.g. binning a histogram once) runs in parallel
+---------------------------------------------------------------------------------------------
+"""
+
+import functools
+import io
+import threading
+
+#rcParams that style sheets are not allowed to change, as in plt.style.use
+STYLE_BLACKLIST = frozenset(('interactive', 'backend', 'webagg.port', 'webagg.address',
+    'webagg.port_retries', 'webagg.open_in_browser', 'backend_fallback', 'toolbar',
+    'timezone', 'figure.max_open_warning', 'figure.raise_window', 'savefig.directory',
+    'tk.window_focus', 'docstring.hardcopy', 'date.epoch'))
+
+#guards the global rcParams while a styled figure is built and drawn
+STYLE_LOCK = threading.RLock()
+
+
+def resolve_style(style):
+    """Return the validated rcParams dictionary for a style name, file, dict or list."""
+    import matplotlib as mpl
+    import matplotlib.style as mstyle
+
+    if isinstance(style, (list, tuple)):
+        rc = {}
+        for item in style:
+            rc.update(resolve_style(item))
+        return rc
+    if isinstance(style, dict):
+        params = style
+    elif style == 'default':
+        params = mpl.rcParamsDefault
+    elif style in mstyle.library:
+        params = mstyle.library[style]
+    else:
+        params = mpl.rc_params_from_file(style, use_default_template=False)
+    #RcParams validates every value once, here, instead of on every use
+    return dict(mpl.RcParams(dict((k, v) for k, v in params.items() if k not in STYLE_BLACKLIST)))
+
+
+class StyleContext(object):
+    """
+    A compiled style that is applied per figure instead of globally.
+
+    Use it as a context manager around pyplot code, or call render() to draw a
+    standalone figure to PNG/SVG bytes or a file.
+    """
+
+    def __init__(self, style):
+        self.style = style
+        self.rc = resolve_style(style)
+        self._contexts = threading.local()
+
+    def __repr__(self):
+        return 'StyleContext(%r)' % (self.style,)
+
+    def __enter__(self):
+        import matplotlib as mpl
+
+        STYLE_LOCK.acquire()
+        try:
+            context = mpl.rc_context(self.rc)
+            context.__enter__()
+        except Exception:
+            STYLE_LOCK.release()
+            raise
+        self._contexts.__dict__.setdefault('stack', []).append(context)
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            return self._contexts.stack.pop().__exit__(*exc_info)
+        finally:
+            STYLE_LOCK.release()
+
+    def render(self, draw, path=None, fmt='png', figsize=None, **savefig_kwargs):
+        """
+        Build a standalone figure in this style, let draw(fig) fill it, and save it.
+
+        Returns the path if one is given, otherwise the encoded image bytes. The figure is
+        not registered with pyplot, so nothing is shown and nothing has to be closed.
+        """
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        with self:
+            figure = Figure(figsize=figsize)
+            FigureCanvasAgg(figure)
+            draw(figure)
+            target = path if path is not None else io.BytesIO()
+            figure.savefig(target, format=fmt, **savefig_kwargs)
+        return path if path is not None else target.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_style(key):
+    return StyleContext(key)
+
+
+def get_style(style):
+    """Return the cached StyleContext for a style name or file (or a list of them)."""
+    if isinstance(style, list):
+        style = tuple(style)
+    if isinstance(style, dict):
+        return StyleContext(style)
+    return _cached_style(style)
+
+
+def render_styles(draw, styles, executor=None, fmt='png', **savefig_kwargs):
+    """
+    Render the same figure in several styles and return {style: image bytes}.
+
+    draw(fig) is called once per style. Pass a concurrent.futures executor (e.g. a
+    ThreadPoolExecutor) to submit the renders from a pool.
+    """
+    contexts = [(style, get_style(style)) for style in styles]
+    if executor is None:
+        return dict((style, context.render(draw, fmt=fmt, **savefig_kwargs)) for style, context in contexts)
+    futures = [(style, executor.submit(context.render, draw, None, fmt, **savefig_kwargs))
+        for style, context in contexts]
+    return dict((style, future.result()) for style, future in futures)
@@ -0,0 +1,148 @@
+"""
+Binned Fast Kernel Density Estimation
+---------------------------------------------------------------------------------------------
+This module estimates Gaussian kernel densities by linear binning onto an evenly spaced
+grid followed by an FFT convolution, instead of summing a kernel for every sample at
+every evaluation point.
+
+- direct summation costs O(n * m) for n samples and m grid points
+- binning costs O(n), and the convolution O(m log m), independent of n
+- every column of a 2-D array or DataFrame is estimated in the same FFT call
+- bandwidths follow scipy's gaussian_kde rules: 'scott', 'silverman', or a scalar factor
+  multiplying the sample standard deviation (or a callable returning that factor)
+
+Error bound
+-----------
+At the grid points, the binned estimate equals the exact estimate with the kernel of every
+sample replaced by its linear interpolation between the two neighbouring grid points.
+For a Gaussian kernel with bandwidth h and grid spacing d, linear interpolation error is
+at most d^2 / 8 times the largest second derivative of the kernel, so
+
+    |binned(g) - exact(g)| <= d^2 / (8 * sqrt(2 * pi) * h^3)
+
+at every grid point g, or (d / h)^2 / 8 relative to the kernel peak 1 / (sqrt(2 * pi) * h).
+error_bound() returns this bound for a grid and a set of bandwidths; a finer grid shrinks
+it quadratically.
+The bound holds for samples inside the grid; samples outside a user supplied grid are
+assigned to the nearest end point.
+---------------------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+
+def bandwidth_factor(n, bw_method='scott', data=None):
+    """Return the factor that multiplies the sample standard deviation, as in gaussian_kde."""
+    if bw_method is None or bw_method == 'scott':
+        return n ** (-1. / 5)
+    if bw_method == 'silverman':
+        return (n * 3. / 4) ** (-1. / 5)
+    if np.isscalar(bw_method) and not isinstance(bw_method, str):
+        return float(bw_method)
+    if callable(bw_method):
+        return float(bw_method(data))
+    raise ValueError("bw_method should be 'scott', 'silverman', a scalar or a callable, got %r" % (bw_method,))
+
+
+def as_columns(data):
+    """Split 1-D or 2-D data (array, Series or DataFrame) into a list of NaN-free columns."""
+    values = np.asarray(data, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    return [column[~np.isnan(column)] for column in values.T]
+
+
+def bandwidths(columns, bw_method='scott'):
+    """Return the kernel bandwidth h of every column."""
+    return np.array([
+        bandwidth_factor(column.size, bw_method, column) * np.std(column, ddof=1)
+        for column in columns])
+
+
+def error_bound(grid, h):
+    """Return the absolute error bound of the binned estimate for grid spacing and bandwidths h."""
+    spacing = grid[1] - grid[0]
+    return spacing ** 2 / (8 * np.sqrt(2 * np.pi) * np.asarray(h, dtype=float) ** 3)
+
+
+def linear_bin(columns, grid):
+    """Linearly bin every column onto an evenly spaced grid, returning a (k, m) weight array."""
+    m = grid.size
+    spacing = grid[1] - grid[0]
+    index, weights = [], []
+    for c, column in enumerate(columns):
+        position = np.clip((column - grid[0]) / spacing, 0, m - 1)
+        left = np.minimum(np.floor(position).astype(np.int64), m - 2)
+        frac = position - left
+        index.extend([c * m + left, c * m + left + 1])
+        weights.extend([1 - frac, frac])
+    if not index:
+        return np.zeros((0, m))
+    counts = np.bincount(np.concatenate(index), weights=np.concatenate(weights), minlength=len(columns) * m)
+    return counts.reshape(len(columns), m)
+
+
+def binned_kde(data, grid=None, gridsize=1000, bw_method='scott', cut=None):
+    """
+    Estimate the density of every column of data on a shared, evenly spaced grid.
+
+    data      - 1-D array, Series, 2-D array or DataFrame (one density per column)
+    grid      - evenly spaced evaluation points; built from the data if None
+    gridsize  - number of grid points when the grid is built from the data
+    bw_method - 'scott', 'silverman', a scalar factor or a callable returning the factor
+    cut       - if given, extend the grid cut bandwidths past the data (seaborn style),
+                otherwise extend it by half the data range on each side (pandas style)
+
+    Returns (grid, densities, h) with densities shaped (k, gridsize) and h the bandwidths.
+    """
+    columns = as_columns(data)
+    h = bandwidths(columns, bw_method)
+
+    if grid is None:
+        lo = min(column.min() for column in columns)
+        hi = max(column.max() for column in columns)
+        if cut is None:
+            pad = 0.5 * (hi - lo)
+        else:
+            pad = cut * h.max()
+        grid = np.linspace(lo - pad, hi + pad, gridsize)
+    else:
+        grid = np.asarray(grid, dtype=float)
+        if not np.allclose(np.diff(grid), grid[1] - grid[0]):
+            raise ValueError('binned_kde needs an evenly spaced grid')
+
+    m = grid.size
+    spacing = grid[1] - grid[0]
+    binned = linear_bin(columns, grid)
+
+    #zero-pad so the circular FFT convolution equals the linear one
+    size = 1 << int(np.ceil(np.log2(2 * m - 1)))
+    lags = np.arange(size)
+    lags = np.where(lags < m, lags, lags - size) * spacing
+    kernels = np.exp(-0.5 * (lags[None, :] / h[:, None]) ** 2) / (np.sqrt(2 * np.pi) * h[:, None])
+
+    convolved = np.fft.irfft(np.fft.rfft(binned, size, axis=1) * np.fft.rfft(kernels, axis=1), size, axis=1)
+    counts = np.array([column.size for column in columns], dtype=float)
+    densities = np.maximum(convolved[:, :m], 0) / counts[:, None]
+    return grid, densities, h
+
+
+def plot_kde(data, ax=None, ind=None, gridsize=1000, bw_method='scott', cut=None, legend=True, **kwargs):
+    """
+    Draw binned KDE lines the way Series/DataFrame.plot.kde() and sns.kdeplot() do.
+
+    A Series or 1-D array draws one line, a DataFrame draws one labelled line per column.
+    Returns the axes.
+    """
+    import matplotlib.pyplot as plt
+
+    if ax is None:
+        ax = plt.gca()
+    grid, densities, h = binned_kde(data, grid=ind, gridsize=gridsize, bw_method=bw_method, cut=cut)
+    labels = list(data.columns) if hasattr(data, 'columns') else [getattr(data, 'name', None)]
+    for label, density in zip(labels, densities):
+        ax.plot(grid, density, label=label, **kwargs)
+    if legend and hasattr(data, 'columns'):
+        ax.legend()
+    ax.set_ylabel('Density')
+    return ax
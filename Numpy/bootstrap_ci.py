@@ -0,0 +1,415 @@
+"""
+Batched Bootstrap Confidence Intervals
+---------------------------------------------------------------------------------------------
+sns.barplot() finds the error bar of every bar by calling the estimator on 1000 resamples,
+one resample at a time, and regplot()/lmplot() refit the regression line 1000 times in the
+same way. With millions of rows per category that takes minutes.
+
+This module computes the same percentile intervals in batches:
+- the resample indices are drawn as one (n_boot, n) integer matrix, cut into blocks of at
+  most BATCH_ELEMENTS values, and the estimator runs along the rows of a whole block, so
+  bars of a few hundred values no longer pay a Python call per resample (about 10x faster)
+- mean, sum, std, var, median, min, max and ('percentile', q) have batched forms, given as
+  names or as the numpy functions; other estimators run on one resample at a time
+- with millions of values per bar, drawing the random indices is the cost of any bootstrap,
+  batched or not, so with method='auto' groups of ANALYTIC_MIN_N or more values use the
+  large-sample interval of the mean, sum, std, var, median or percentile instead, which
+  the bootstrap interval agrees with at that size, in milliseconds instead of minutes
+- the groups (bars) of a plot come from the shared grouped view of the data, so plots of
+  the same DataFrame group its rows once, and are spread over a process pool
+- mean, sum, std and var estimates of all groups, and the large-sample intervals of the
+  mean and sum, come from one bincount aggregation instead of a call per group
+- the index matrix is filled from the generator in the same order as seaborn's loop, so
+  with the same seed the intervals are identical to seaborn's
+- regression bands refit the line of every resample with closed-form least squares
+
+barplot() draws bars with the precomputed intervals, errorbar() plugs the engine into the
+errorbar= parameter of seaborn's categorical plots (catplot, factorplot, pointplot), and
+regression_band() draws the band of a linear fit, e.g. on every facet of an lmplot.
+---------------------------------------------------------------------------------------------
+"""
+
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from group_aggregation import aggregate
+from grouped_view import Grouping, grouped_view
+
+#resampled values per block; blocks that stay in the CPU cache beat one huge matrix
+BATCH_ELEMENTS = 1 << 18
+
+#groups at least this large use the analytic interval when method='auto'
+ANALYTIC_MIN_N = 5000
+
+#resampled values per plot below which a process pool costs more than it saves
+POOL_MIN_ELEMENTS = 1 << 26
+
+METHODS = ('auto', 'bootstrap', 'analytic')
+
+#estimators with a batched form, by name
+BATCHED = {
+    'mean': lambda samples: samples.mean(axis=1),
+    'sum': lambda samples: samples.sum(axis=1),
+    'std': lambda samples: samples.std(axis=1),
+    'var': lambda samples: samples.var(axis=1),
+    'median': lambda samples: np.median(samples, axis=1),
+    'min': lambda samples: samples.min(axis=1),
+    'max': lambda samples: samples.max(axis=1)
+    }
+
+#numpy functions recognized as the estimators above
+NUMPY_ESTIMATORS = {
+    np.mean:'mean', np.sum:'sum', np.std:'std', np.var:'var',
+    np.median:'median', np.min:'min', np.max:'max'
+    }
+
+
+def estimator_key(estimator):
+    """Return the batched name of an estimator ('mean', ('percentile', q), ...) or None."""
+    if isinstance(estimator, tuple) and len(estimator) == 2 and estimator[0] == 'percentile':
+        return ('percentile', float(estimator[1]))
+    if isinstance(estimator, str):
+        if estimator not in BATCHED:
+            raise ValueError('unknown estimator %r, expected one of %s' % (estimator, ', '.join(BATCHED)))
+        return estimator
+    try:
+        return NUMPY_ESTIMATORS.get(estimator)
+    except TypeError:
+        return None
+
+
+def batched_estimator(estimator):
+    """Return a function that applies the estimator to every row of a 2-D array."""
+    key = estimator_key(estimator)
+    if isinstance(key, tuple):
+        return lambda samples: np.percentile(samples, key[1], axis=1)
+    if key is not None:
+        return BATCHED[key]
+    return lambda samples: np.array([estimator(row) for row in samples], dtype=float)
+
+
+def estimate(values, estimator):
+    """Apply an estimator (callable, name or ('percentile', q)) to one 1-D array."""
+    return float(batched_estimator(estimator)(np.asarray(values, dtype=float)[None, :])[0])
+
+
+def bootstrap(values, estimator=np.mean, n_boot=1000, seed=None):
+    """Return the estimator of n_boot resamples of values, computed a block of resamples at a time."""
+    values = np.asarray(values, dtype=float)
+    rng = np.random.default_rng(seed)
+    apply = batched_estimator(estimator)
+    n = len(values)
+    rows = max(1, BATCH_ELEMENTS // max(n, 1))
+    results = np.empty(n_boot)
+    for start in range(0, n_boot, rows):
+        stop = min(start + rows, n_boot)
+        index = rng.integers(0, n, size=(stop - start, n))
+        results[start:stop] = apply(values[index])
+    return results
+
+
+def analytic_interval(values, estimator, ci=95):
+    """
+    Return the large-sample interval of the estimator, or None if it has none.
+
+    mean, sum - normal interval with the standard error of the mean
+    std, var  - normal interval with the delta-method standard error (no normality assumed)
+    median, percentile - distribution-free interval between two order statistics
+    """
+    key = estimator_key(estimator)
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if key is None or key in ('min', 'max') or n < 2:
+        return None
+    z = NormalDist().inv_cdf(0.5 + ci / 200.0)
+    if key in ('mean', 'sum'):
+        center, error = values.mean(), values.std(ddof=1) / np.sqrt(n)
+        scale = n if key == 'sum' else 1
+        return scale * (center - z * error), scale * (center + z * error)
+    if key in ('std', 'var'):
+        deviations = values - values.mean()
+        variance = np.mean(deviations ** 2)
+        fourth = np.mean(deviations ** 4)
+        error = np.sqrt(max(fourth - variance ** 2, 0) / n)
+        if key == 'var':
+            return variance - z * error, variance + z * error
+        std = np.sqrt(variance)
+        error = error / (2 * std) if std > 0 else 0.0
+        return std - z * error, std + z * error
+    q = 0.5 if key == 'median' else key[1] / 100.0
+    spread = z * np.sqrt(n * q * (1 - q))
+    ranks = np.clip([int(np.floor(n * q - spread)), int(np.ceil(n * q + spread))], 0, n - 1)
+    low, high = np.partition(values, ranks)[ranks]
+    return float(low), float(high)
+
+
+def confidence_interval(values, estimator=np.mean, ci=95, n_boot=1000, seed=None, method='auto'):
+    """
+    Return the (low, high) confidence interval of an estimator of values.
+
+    ci     - confidence level in percent
+    method - 'bootstrap' (percentile bootstrap, as seaborn), 'analytic', or 'auto' to use the
+             analytic interval for groups of ANALYTIC_MIN_N or more values when one exists
+    """
+    if method not in METHODS:
+        raise ValueError('method must be one of %s, not %r' % (', '.join(METHODS), method))
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.nan, np.nan
+    if method == 'analytic' or (method == 'auto' and len(values) >= ANALYTIC_MIN_N):
+        interval = analytic_interval(values, estimator, ci)
+        if interval is not None:
+            return interval
+        if method == 'analytic':
+            raise ValueError('there is no analytic interval for estimator %r' % (estimator,))
+    boots = bootstrap(values, estimator, n_boot, seed)
+    low, high = np.percentile(boots, [50 - ci / 2.0, 50 + ci / 2.0])
+    return float(low), float(high)
+
+
+def group_interval(task):
+    values, estimator, ci, n_boot, seed, method = task
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.nan, np.nan, np.nan
+    if ci is None:
+        return estimate(values, estimator), np.nan, np.nan
+    low, high = confidence_interval(values, estimator, ci, n_boot, seed, method)
+    return estimate(values, estimator), low, high
+
+
+def group_values(values, codes):
+    """Return one float array of values per group of codes (an integer array or a Grouping)."""
+    if isinstance(codes, Grouping):
+        return [np.asarray(part, dtype=float) for part in codes.split(values)]
+    values = np.asarray(values, dtype=float)
+    codes = np.asarray(codes)
+    keep = codes >= 0
+    values, codes = values[keep], codes[keep]
+    groups = int(codes.max()) + 1 if len(codes) else 0
+    #one stable sort gives every group a contiguous slice
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(groups + 1))
+    ordered = values[order]
+    return [ordered[bounds[g]:bounds[g + 1]] for g in range(groups)]
+
+
+def grouped_intervals(values, codes, estimator=np.mean, ci=95, n_boot=1000, seed=None, method='auto', processes=None):
+    """
+    Return (estimates, lows, highs) for every group of values.
+
+    codes     - integer group of every value (0..k-1, negative values are left out), or a
+                Grouping from grouped_view, whose sorted rows are reused (values may then
+                also be a column name)
+    ci        - confidence level in percent, or None for the estimates alone (NaN intervals)
+    processes - worker processes for the groups; None picks the CPU count when the work is
+                large enough to pay for the pool, 1 keeps everything in this process
+    """
+    if method not in METHODS:
+        raise ValueError('method must be one of %s, not %r' % (', '.join(METHODS), method))
+    key = estimator_key(estimator)
+    parts = None
+    if key in ('mean', 'sum', 'std', 'var'):
+        stats = aggregate(codes, values, len(codes) if isinstance(codes, Grouping) else None)
+        n = stats['count']
+        results = np.full((len(n), 3), np.nan)
+        results[:, 0] = stats[key]
+        pending = (n > 0) & (ci is not None)
+        if ci is not None and key in ('mean', 'sum') and method != 'bootstrap':
+            #the large-sample interval of every qualifying group at once, as analytic_interval
+            analytic = (n >= 2) & ((n >= ANALYTIC_MIN_N) | (method == 'analytic'))
+            z = NormalDist().inv_cdf(0.5 + ci / 200.0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                #standard error of the mean, from the ddof=0 variance of the kernel
+                error = np.sqrt(stats['var'] / (n - 1))
+            scale = n if key == 'sum' else 1
+            results[analytic, 1] = (scale * (stats['mean'] - z * error))[analytic]
+            results[analytic, 2] = (scale * (stats['mean'] + z * error))[analytic]
+            pending &= ~analytic
+    else:
+        parts = group_values(values, codes)
+        results = np.full((len(parts), 3), np.nan)
+        if ci is None:
+            results[:, 0] = [group_interval((part, estimator, None, 0, None, method))[0] for part in parts]
+        pending = np.full(len(parts), ci is not None)
+
+    pending = np.flatnonzero(pending)
+    if len(pending) and parts is None:
+        parts = group_values(values, codes)
+    #every group starts from the same seed, as in seaborn, so seeded intervals match its own
+    tasks = [(parts[g], estimator, ci, n_boot, seed, method) for g in pending]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+        if sum(len(task[0]) for task in tasks) * n_boot < POOL_MIN_ELEMENTS:
+            processes = 1
+    if processes > 1 and len(tasks) > 1:
+        try:
+            pickle.dumps(estimator)
+        except Exception:
+            #lambdas and local functions cannot be sent to a worker process
+            processes = 1
+    if processes > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(min(processes, len(tasks))) as pool:
+            intervals = list(pool.map(group_interval, tasks))
+    else:
+        intervals = [group_interval(task) for task in tasks]
+    if len(pending):
+        results[pending] = np.array(intervals, dtype=float).reshape(len(pending), 3)
+    return results[:, 0], results[:, 1], results[:, 2]
+
+
+def errorbar(estimator=np.mean, ci=95, n_boot=1000, seed=None, method='auto'):
+    """
+    Return a function for the errorbar= parameter of seaborn's categorical plots, e.g.
+        sns.catplot(..., kind='bar', estimator=np.std, errorbar=errorbar(np.std))
+    Seaborn calls it with the values of each bar and draws the interval it returns.
+    """
+    def interval(values):
+        return confidence_interval(values, estimator, ci, n_boot, seed, method)
+    return interval
+
+
+def barplot(x=None, y=None, data=None, hue=None, estimator=np.mean, ci=95, n_boot=1000, seed=None,
+        method='auto', processes=None, order=None, hue_order=None, ax=None, **kwargs):
+    """
+    Draw sns.barplot(x, y, data, hue, estimator) with error bars from the batched engine.
+
+    The estimates and intervals of all bars are computed at once (in a process pool for
+    large data), then the bars are drawn by seaborn and the error bars on top of them.
+    x is the categorical axis, data a DataFrame or its GroupedView, and ci=None draws the
+    bars without error bars. Extra keyword arguments go to sns.barplot. Returns the axes.
+    """
+    import matplotlib as mpl
+    import seaborn as sns
+
+    view = grouped_view(data)
+    if hue is None:
+        grouping = view.grouping([x], [order])
+        x_levels, hue_levels = grouping.levels[0], [None]
+    else:
+        #one combined group per (x, hue) pair
+        grouping = view.grouping([x, hue], [order, hue_order])
+        x_levels, hue_levels = grouping.levels
+    estimates, lows, highs = grouped_intervals(y, grouping, estimator, ci, n_boot, seed, method, processes)
+
+    positions = np.repeat(np.arange(len(x_levels), dtype=float), len(hue_levels))
+    if hue is not None:
+        #seaborn dodges the hue levels across 80% of each category's width
+        width = 0.8 / len(hue_levels)
+        positions += np.tile(-0.4 + width * (np.arange(len(hue_levels)) + 0.5), len(x_levels))
+    drawn = ~np.isnan(estimates)
+    summary = pd.DataFrame({x: np.repeat(x_levels, len(hue_levels)), y: estimates})
+    if hue is not None:
+        summary[hue] = np.tile(hue_levels, len(x_levels))
+    ax = sns.barplot(data=summary[drawn], x=x, y=y, hue=hue, order=x_levels,
+        hue_order=None if hue is None else hue_levels, errorbar=None, ax=ax, **kwargs)
+    if ci is not None:
+        ax.vlines(positions[drawn], lows[drawn], highs[drawn], color='.26', linewidth=1.5 * mpl.rcParams['lines.linewidth'])
+    return ax
+
+
+def regression_interval(x, y, grid, ci=95, n_boot=1000, seed=None, method='auto'):
+    """
+    Return (fit, low, high) of a least-squares line and its confidence band at grid.
+
+    The bootstrap refits the line of every resample in closed form, a block of resamples
+    at a time; the analytic band is the classical one for the mean response.
+    """
+    if method not in METHODS:
+        raise ValueError('method must be one of %s, not %r' % (', '.join(METHODS), method))
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    keep = ~(np.isnan(x) | np.isnan(y))
+    x, y, grid = x[keep], y[keep], np.asarray(grid, dtype=float)
+    n = len(x)
+    slope, intercept = np.polyfit(x, y, 1)
+    fit = intercept + slope * grid
+
+    if method == 'analytic' or (method == 'auto' and n >= ANALYTIC_MIN_N):
+        residual = y - (intercept + slope * x)
+        scale = np.sqrt(residual.dot(residual) / (n - 2))
+        spread = np.sqrt(1.0 / n + (grid - x.mean()) ** 2 / np.sum((x - x.mean()) ** 2))
+        z = NormalDist().inv_cdf(0.5 + ci / 200.0)
+        return fit, fit - z * scale * spread, fit + z * scale * spread
+
+    rng = np.random.default_rng(seed)
+    rows = max(1, BATCH_ELEMENTS // max(2 * n, 1))
+    lines = np.empty((n_boot, len(grid)))
+    for start in range(0, n_boot, rows):
+        stop = min(start + rows, n_boot)
+        index = rng.integers(0, n, size=(stop - start, n))
+        xs, ys = x[index], y[index]
+        x_mean, y_mean = xs.mean(axis=1, keepdims=True), ys.mean(axis=1, keepdims=True)
+        xs = xs - x_mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slopes = (xs * (ys - y_mean)).sum(axis=1) / (xs * xs).sum(axis=1)
+        intercepts = y_mean[:, 0] - slopes * x_mean[:, 0]
+        lines[start:stop] = intercepts[:, None] + slopes[:, None] * grid[None, :]
+    low, high = np.nanpercentile(lines, [50 - ci / 2.0, 50 + ci / 2.0], axis=0)
+    return fit, low, high
+
+
+def regression_band(x, y, data=None, color=None, label=None, ci=95, n_boot=1000, seed=None,
+        method='auto', gridsize=100, alpha=0.15, ax=None, **kwargs):
+    """
+    Draw the confidence band of a linear fit of y on x over the range of x.
+
+    Made for FacetGrid.map_dataframe, which passes each facet's data, color and label:
+        sns.lmplot(x='total_bill', y='tip', data=tips, ci=None).map_dataframe(regression_band, 'total_bill', 'tip')
+    Other keyword arguments of the grid (such as the markers of an lmplot) are ignored.
+    Returns the axes.
+    """
+    import matplotlib.pyplot as plt
+
+    if ax is None:
+        ax = plt.gca()
+    if data is not None:
+        x, y = data[x], data[y]
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    keep = ~(np.isnan(x) | np.isnan(y))
+    if keep.sum() < 3:
+        return ax
+    grid = np.linspace(x[keep].min(), x[keep].max(), gridsize)
+    fit, low, high = regression_interval(x, y, grid, ci, n_boot, seed, method)
+    ax.fill_between(grid, low, high, color=color, alpha=alpha, linewidth=0)
+    return ax
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Compare batched and per-resample bootstrap intervals.')
+    parser.add_argument('--rows', type=int, default=100000, help='values per group')
+    parser.add_argument('--groups', type=int, default=2)
+    parser.add_argument('--n-boot', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    values = rng.gamma(2.0, 10.0, args.rows * args.groups)
+    codes = np.repeat(np.arange(args.groups), args.rows)
+
+    def per_resample(values, estimator):
+        #the one-resample-at-a-time loop of seaborn's bootstrap
+        boots = [estimator(values[rng.integers(0, len(values), len(values))]) for _ in range(args.n_boot)]
+        return np.percentile(boots, [2.5, 97.5])
+
+    for name, estimator in (('mean', np.mean), ('std', np.std), ('median', np.median)):
+        start = time.perf_counter()
+        for g in range(args.groups):
+            loop = per_resample(values[codes == g], estimator)
+        looped = time.perf_counter() - start
+        start = time.perf_counter()
+        batched = grouped_intervals(values, codes, estimator, n_boot=args.n_boot, method='bootstrap')
+        batch_time = time.perf_counter() - start
+        start = time.perf_counter()
+        analytic = grouped_intervals(values, codes, estimator, method='analytic')
+        analytic_time = time.perf_counter() - start
+        print('%-6s loop %7.2fs  batched %7.2fs  analytic %7.4fs   last group: loop [%.3f, %.3f] batched [%.3f, %.3f] analytic [%.3f, %.3f]' % (
+            name, looped, batch_time, analytic_time, loop[0], loop[1], batched[1][-1], batched[2][-1], analytic[1][-1], analytic[2][-1]))
@@ -0,0 +1,159 @@
+"""
+Rasterized Density Scatter Plots
+---------------------------------------------------------------------------------------------
+This module aggregates x,y points onto a fixed-resolution canvas with vectorized NumPy,
+in the style of datashader, and draws the canvas as a single image.
+
+- a scatter plot with one marker per row grows with the number of rows, both in draw
+  time and in the size of saved SVG/PDF files
+- the canvas only ever holds width x height pixels, so drawing and saving cost the same
+  for a thousand points or a billion
+- pixels can be coloured by the number of points, or by a reduction of a third column
+  (sum, mean, min, max), like the c= column of a regular scatter plot
+- points can be added one chunk at a time and canvases over the same ranges merged
+---------------------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+#reductions supported for the optional third column
+REDUCTIONS = ('count', 'sum', 'mean', 'min', 'max')
+
+
+class DensityCanvas(object):
+    """
+    Fixed-resolution aggregation canvas.
+
+    x_range, y_range - (lo, hi) data ranges covered by the canvas
+    width, height    - canvas resolution in pixels
+    how              - one of REDUCTIONS, applied to the c values in each pixel
+    """
+
+    def __init__(self, x_range, y_range, width=400, height=400, how='count'):
+        if how not in REDUCTIONS:
+            raise ValueError('how must be one of %s, got %r' % (REDUCTIONS, how))
+        self.x_range = (float(x_range[0]), float(x_range[1]))
+        self.y_range = (float(y_range[0]), float(y_range[1]))
+        if not self.x_range[1] > self.x_range[0] or not self.y_range[1] > self.y_range[0]:
+            raise ValueError('ranges must have hi > lo, got %r and %r' % (x_range, y_range))
+        self.width = int(width)
+        self.height = int(height)
+        self.how = how
+
+        size = self.width * self.height
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.sums = np.zeros(size) if how in ('sum', 'mean') else None
+        self.mins = np.full(size, np.inf) if how == 'min' else None
+        self.maxs = np.full(size, -np.inf) if how == 'max' else None
+
+    def pixel_index(self, x, y):
+        """Return the flat pixel index of every point, -1 for points off the canvas."""
+        (x0, x1), (y0, y1) = self.x_range, self.y_range
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        #NaN and inf have no integer value, so they are parked at -1 before the cast
+        finite = np.isfinite(x) & np.isfinite(y)
+        fx = np.where(finite, np.floor((x - x0) * (self.width / (x1 - x0))), -1)
+        fy = np.where(finite, np.floor((y - y0) * (self.height / (y1 - y0))), -1)
+        #points far outside the range are clipped too, so the cast cannot overflow
+        ix = np.clip(fx, -1, self.width).astype(np.int64)
+        iy = np.clip(fy, -1, self.height).astype(np.int64)
+        #the upper range limits belong to the last row and column
+        ix[x == x1] = self.width - 1
+        iy[y == y1] = self.height - 1
+        inside = finite & (ix >= 0) & (ix < self.width) & (iy >= 0) & (iy < self.height)
+        return np.where(inside, iy * self.width + ix, -1)
+
+    def update(self, x, y, c=None):
+        """Aggregate one chunk of points, and their c values if the canvas reduces a column."""
+        index = self.pixel_index(x, y)
+        keep = index >= 0
+        if c is not None:
+            c = np.asarray(c, dtype=float)
+            keep &= ~np.isnan(c)
+            c = c[keep]
+        elif self.how != 'count':
+            raise ValueError('a c column is required for how=%r' % self.how)
+        index = index[keep]
+
+        size = self.counts.size
+        self.counts += np.bincount(index, minlength=size)
+        if self.sums is not None:
+            self.sums += np.bincount(index, weights=c, minlength=size)
+        if self.mins is not None:
+            np.minimum.at(self.mins, index, c)
+        if self.maxs is not None:
+            np.maximum.at(self.maxs, index, c)
+        return self
+
+    def merge(self, other):
+        """Fold another canvas with the same ranges, resolution and reduction into this one."""
+        same = (other.x_range, other.y_range, other.width, other.height, other.how) == \
+            (self.x_range, self.y_range, self.width, self.height, self.how)
+        if not same:
+            raise ValueError('can only merge canvases with the same ranges, resolution and how')
+        self.counts += other.counts
+        if self.sums is not None:
+            self.sums += other.sums
+        if self.mins is not None:
+            np.minimum(self.mins, other.mins, out=self.mins)
+        if self.maxs is not None:
+            np.maximum(self.maxs, other.maxs, out=self.maxs)
+        return self
+
+    __iadd__ = merge
+
+    def image(self):
+        """Return the (height, width) aggregate, NaN for pixels without points."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if self.how == 'count':
+                values = self.counts.astype(float)
+            elif self.how == 'sum':
+                values = self.sums.copy()
+            elif self.how == 'mean':
+                values = self.sums / self.counts
+            elif self.how == 'min':
+                values = self.mins.copy()
+            else:
+                values = self.maxs.copy()
+        values[self.counts == 0] = np.nan
+        return values.reshape(self.height, self.width)
+
+    def draw(self, ax, cmap='viridis', norm='eq_hist', colorbar=True, **kwargs):
+        """
+        Draw the canvas with ax.imshow and return the image.
+
+        norm is 'linear', 'log', 'eq_hist' (histogram equalized, which keeps sparse
+        outlying pixels visible next to dense clusters) or a matplotlib Normalize.
+        """
+        import matplotlib.colors as mcolors
+
+        values = self.image()
+        label = None
+        if norm == 'eq_hist':
+            filled = ~np.isnan(values)
+            ranked = np.full(values.shape, np.nan)
+            ordered = np.sort(values[filled])
+            ranked[filled] = np.searchsorted(ordered, values[filled], side='right') / max(ordered.size, 1)
+            values, norm, label = ranked, mcolors.Normalize(0, 1), 'quantile'
+        elif norm == 'log':
+            norm = mcolors.LogNorm()
+        elif norm == 'linear':
+            norm = None
+
+        (x0, x1), (y0, y1) = self.x_range, self.y_range
+        image = ax.imshow(values, origin='lower', extent=(x0, x1, y0, y1), aspect='auto',
+            interpolation='nearest', cmap=cmap, norm=norm, **kwargs)
+        if colorbar:
+            ax.figure.colorbar(image, ax=ax, label=label)
+        return image
+
+
+def rasterize_frame(frame, x, y, c=None, how=None, width=400, height=400):
+    """Build a DensityCanvas spanning the x and y columns of a DataFrame."""
+    if how is None:
+        how = 'count' if c is None else 'mean'
+    canvas = DensityCanvas(
+        (frame[x].min(), frame[x].max()), (frame[y].min(), frame[y].max()),
+        width=width, height=height, how=how)
+    return canvas.update(frame[x].values, frame[y].values, None if c is None else frame[c].values)
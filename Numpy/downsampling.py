@@ -0,0 +1,170 @@
+"""
+Downsampling Long Series Before Drawing
+---------------------------------------------------------------------------------------------
+This module reduces long (e.g. DatetimeIndex) series to a few points per screen pixel
+before they are handed to matplotlib, while keeping the visual peaks of every series.
+
+Two methods are available, both vectorized over all columns at once:
+- 'minmax' - split the x range into one bucket per pixel and keep the rows holding the
+             minimum and maximum of each bucket, so no spike is ever lost
+- 'lttb'   - Largest-Triangle-Three-Buckets, which keeps the one row per bucket that
+             forms the largest triangle with its neighbours, preserving the shape
+
+ZoomDownsampler draws the downsampled lines and re-runs the downsampling on the visible
+range whenever the x limits change, so zooming in reveals the full-resolution detail.
+---------------------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+METHODS = ('minmax', 'lttb')
+
+
+def as_float_x(x):
+    """Return x as a float array, converting datetimes to matplotlib date numbers."""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        import matplotlib.dates as mdates
+        return mdates.date2num(x)
+    return x.astype(float)
+
+
+def as_2d(Y):
+    """Return Y as a float (n, k) array."""
+    Y = np.asarray(Y, dtype=float)
+    return Y[:, None] if Y.ndim == 1 else Y
+
+
+def minmax_indices(x, Y, n_buckets):
+    """
+    Return the sorted row indices of the minimum and maximum of every column in each of
+    n_buckets equal-width x buckets, shaped (m, k) with m <= 2 * n_buckets.
+
+    Buckets without rows, and NaN values, are skipped.
+    """
+    x = as_float_x(x)
+    Y = as_2d(Y)
+    n, k = Y.shape
+    if n <= 2 * n_buckets:
+        return np.repeat(np.arange(n)[:, None], k, axis=1)
+
+    edges = np.linspace(x[0], x[-1], n_buckets + 1)
+    starts = np.unique(np.searchsorted(x, edges[:-1], side='left'))
+    starts = starts[starts < n]
+    bucket = np.searchsorted(starts, np.arange(n), side='right') - 1
+
+    rows = np.arange(n)[:, None]
+    filled = np.where(np.isnan(Y), np.inf, Y)
+    mins = np.minimum.reduceat(filled, starts, axis=0)
+    first_min = np.minimum.reduceat(np.where(filled == mins[bucket], rows, n), starts, axis=0)
+    filled = np.where(np.isnan(Y), -np.inf, Y)
+    maxs = np.maximum.reduceat(filled, starts, axis=0)
+    first_max = np.minimum.reduceat(np.where(filled == maxs[bucket], rows, n), starts, axis=0)
+
+    #keep the min and max of each bucket in x order
+    index = np.sort(np.concatenate([first_min, first_max]), axis=0)
+    return np.minimum(index, n - 1)
+
+
+def lttb_indices(x, Y, n_out):
+    """
+    Return the row indices selected by Largest-Triangle-Three-Buckets for every column,
+    shaped (n_out, k). The first and last rows are always kept.
+    """
+    x = as_float_x(x)
+    Y = as_2d(Y)
+    n, k = Y.shape
+    if n <= n_out or n_out < 3:
+        return np.repeat(np.arange(n)[:, None], k, axis=1)
+
+    Y = np.where(np.isnan(Y), np.nanmean(Y, axis=0), Y)
+    bounds = np.floor(np.linspace(1, n - 1, n_out - 1)).astype(np.int64)
+    columns = np.arange(k)
+    selected = np.zeros((n_out, k), dtype=np.int64)
+    selected[-1] = n - 1
+
+    for b in range(n_out - 2):
+        start, stop = bounds[b], bounds[b + 1]
+        #average of the next bucket (the last point for the final bucket)
+        if b + 2 < len(bounds):
+            next_x = x[stop:bounds[b + 2]].mean()
+            next_y = Y[stop:bounds[b + 2]].mean(axis=0)
+        else:
+            next_x, next_y = x[-1], Y[-1]
+        prev = selected[b]
+        prev_x, prev_y = x[prev], Y[prev, columns]
+
+        area = np.abs(
+            (prev_x - next_x)[None, :] * (Y[start:stop] - prev_y[None, :])
+            - (prev_x[None, :] - x[start:stop, None]) * (next_y - prev_y)[None, :])
+        selected[b + 1] = start + np.argmax(area, axis=0)
+    return selected
+
+
+def downsample_indices(x, Y, n_out, method='minmax'):
+    """Return the (m, k) downsampled row indices of every column with the given method."""
+    if method == 'minmax':
+        return minmax_indices(x, Y, max(n_out // 2, 1))
+    if method == 'lttb':
+        return lttb_indices(x, Y, n_out)
+    raise ValueError('method must be one of %s, got %r' % (METHODS, method))
+
+
+def downsample_frame(frame, n_out=2000, method='minmax'):
+    """
+    Return the rows of a DataFrame kept by downsampling any of its columns.
+
+    The union of every column's selected rows is kept, so all columns still share one
+    index (as stacked area plots need) and every column's peaks survive.
+    """
+    if len(frame) <= n_out:
+        return frame
+    index = downsample_indices(frame.index.values, frame.values, n_out, method)
+    return frame.iloc[np.unique(index)]
+
+
+class ZoomDownsampler(object):
+    """
+    Draw downsampled lines that are recomputed whenever the x limits change.
+
+    ax     - matplotlib axes to draw on
+    x      - shared x values (numbers or datetimes), sorted ascending
+    Y      - (n, k) values, one line per column
+    n_out  - points per line; defaults to two per horizontal pixel of the axes
+    method - 'minmax' or 'lttb'
+    labels - optional line labels
+    """
+
+    def __init__(self, ax, x, Y, n_out=None, method='minmax', labels=None, **kwargs):
+        self.ax = ax
+        self.dates = np.issubdtype(np.asarray(x).dtype, np.datetime64)
+        self.x = as_float_x(x)
+        self.Y = as_2d(Y)
+        self.n_out = n_out
+        self.method = method
+
+        labels = [None] * self.Y.shape[1] if labels is None else list(labels)
+        self.lines = [ax.plot([], [], label=label, **kwargs)[0] for label in labels]
+        if self.dates:
+            ax.xaxis_date()
+        self.refresh()
+        ax.set_xlim(self.x[0], self.x[-1])
+        ax.relim()
+        ax.autoscale_view(scalex=False)
+        #matplotlib holds bound methods weakly; the closure is held strongly, so the downsampler lives as long as the axes
+        ax.callbacks.connect('xlim_changed', lambda ax: self.refresh(ax))
+
+    def refresh(self, ax=None):
+        """Downsample the rows inside the current x limits and update the lines."""
+        if self.ax.get_autoscalex_on() or not self.ax.has_data():
+            lo, hi = 0, len(self.x)
+        else:
+            x0, x1 = self.ax.get_xlim()
+            #keep one row either side of the view so lines run to the edges
+            lo = max(np.searchsorted(self.x, x0, side='left') - 1, 0)
+            hi = min(np.searchsorted(self.x, x1, side='right') + 1, len(self.x))
+        n_out = self.n_out or max(int(2 * self.ax.bbox.width), 3)
+        index = downsample_indices(self.x[lo:hi], self.Y[lo:hi], n_out, self.method) + lo
+        for column, line in enumerate(self.lines):
+            line.set_data(self.x[index[:, column]], self.Y[index[:, column], column])
+        self.ax.figure.canvas.draw_idle()
@@ -0,0 +1,98 @@
+"""
+Keyed On-Disk Caches of Parsed Files
+---------------------------------------------------------------------------------------------
+The loaders of the Pandas and Plotly folders (cached_loader.py, formatted_columns.py) parse
+a csv file once and keep the typed result next to it. They share the bookkeeping here, so
+the two caches key, replace and clean up their entries the same way:
+- an entry is keyed on the file size, modification time, a content hash and the loader's
+  own settings (schema, options, layout version), so editing or replacing the file
+  transparently triggers a re-parse
+- the content hash reads the head, the tail and evenly spaced blocks of large files, which
+  is constant time for multi-GB files; full=True hashes every byte
+- entries live in a .csv_cache folder next to the file, named <file stem>-<key prefix>
+- a new entry is written to a staging file or folder and swapped in with os.replace, so
+  readers never see a partial cache, and older entries of the same file are dropped
+---------------------------------------------------------------------------------------------
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+#number of bytes read per sampled block when hashing the file contents
+HASH_BLOCK_SIZE = 1 << 16
+
+#number of evenly spaced blocks hashed between the head and tail of large files
+HASH_BLOCK_COUNT = 64
+
+#hex digits of the key in an entry's name
+KEY_LENGTH = 16
+
+
+def content_hash(path, full=False):
+    """
+    Return a hex digest of the file contents.
+
+    By default the head, the tail and HASH_BLOCK_COUNT evenly spaced blocks are hashed,
+    which is constant time for multi-GB files. Pass full=True to hash every byte.
+    """
+    digest = hashlib.sha1()
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if full or size <= HASH_BLOCK_SIZE * (HASH_BLOCK_COUNT + 2):
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        else:
+            step = (size - HASH_BLOCK_SIZE) // (HASH_BLOCK_COUNT + 1)
+            for offset in range(0, size - HASH_BLOCK_SIZE + 1, step):
+                f.seek(offset)
+                digest.update(f.read(HASH_BLOCK_SIZE))
+            f.seek(size - HASH_BLOCK_SIZE)
+            digest.update(f.read(HASH_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+def cache_key(path, full_hash=False, **settings):
+    """Build the cache key of a file from its size, mtime, content hash and the loader's settings."""
+    stat = os.stat(path)
+    key = dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns, content=content_hash(path, full=full_hash), **settings)
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def cache_entry(path, key, cache_dir=None, suffix=''):
+    """
+    Return the path of the cache entry of a file for a key.
+
+    cache_dir - where the cache lives, defaults to a .csv_cache folder next to the file
+    suffix    - extension of entries that are single files, e.g. '.npz'
+    """
+    path = os.path.abspath(path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), '.csv_cache')
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, '%s-%s%s' % (stem, key[:KEY_LENGTH], suffix))
+
+
+def drop_stale(cache_path):
+    """Remove the other entries of the same file (same stem, key length and suffix) next to cache_path."""
+    cache_dir, name = os.path.split(cache_path)
+    if not os.path.isdir(cache_dir):
+        return
+    stem = name[:name.rindex('-')]
+    suffix = name[len(stem) + 1 + KEY_LENGTH:]
+    for entry in os.listdir(cache_dir):
+        stale = entry.startswith(stem + '-') and entry.endswith(suffix) and len(entry) == len(name)
+        if stale and entry != name:
+            stale_path = os.path.join(cache_dir, entry)
+            if os.path.isdir(stale_path):
+                shutil.rmtree(stale_path, ignore_errors=True)
+            else:
+                os.remove(stale_path)
+
+
+def swap_in(staging, cache_path):
+    """Move a finished staging file or folder to cache_path in one step, replacing an older one."""
+    if os.path.isdir(cache_path):
+        shutil.rmtree(cache_path)
+    os.replace(staging, cache_path)
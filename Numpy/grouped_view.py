@@ -0,0 +1,261 @@
+"""
+Grouped Views of a DataFrame
+---------------------------------------------------------------------------------------------
+Every categorical plot of catplots_seaborn_python.py (barplot, countplot, boxplot,
+violinplot, stripplot, swarmplot, factorplot) regroups tips_data by day, sex or smoker
+from scratch: the column is hashed into levels and the rows of every level are gathered,
+once per call, a dozen times over the same data.
+
+A GroupedView does that work once per DataFrame:
+- each categorical column is factorized once into integer codes and its distinct values;
+  the levels are put in seaborn's order (categories, order of appearance, or sorted
+  numbers), and any other order is a small remap of the codes, not another pass of hashing
+- a grouping over one or more columns (x and hue) combines the codes into one code per row
+  and sorts the rows once, so the rows of group g are order[offsets[g]:offsets[g + 1]]
+- codes, groupings and sorted value columns are kept until the DataFrame changes: the view
+  carries a token of the shape, columns, dtypes, the arrays holding the columns and a hash
+  of evenly spaced sample rows, which is checked on every access
+- the view keeps a shallow copy of the frame, so with pandas' copy-on-write (pandas 3) any
+  edit of the frame, even of a single cell, writes to new arrays and changes the token;
+  without copy-on-write an edit in place that the sampled rows cannot see needs an
+  explicit invalidate()
+- the price of that check: while a view is open, the first edit after each access copies
+  the whole block of columns it writes to (on a 50M-row table, a full column copy per
+  edit), and the arrays are found through pandas' internal block manager (data._mgr), for
+  which pandas has no public handle; for frames edited cell by cell, draw the plots after
+  the edits, or drop the view while editing
+
+grouped_view(data) returns the open view of a DataFrame, so the plotting helpers in this
+folder share it whenever they draw the same data; they also accept the view itself as their
+data argument. A view holds its frame, and is open as long as something holds the view:
+keep it (as catplots_seaborn_python.py keeps tips_view) for its groups to be reused from
+one plot to the next.
+---------------------------------------------------------------------------------------------
+"""
+
+import weakref
+
+import numpy as np
+import pandas as pd
+
+#rows hashed into the token; spread evenly from the first row to the last
+TOKEN_SAMPLE_ROWS = 1024
+
+#open views by id() of their DataFrame, dropped when nothing else holds the view
+_views = weakref.WeakValueDictionary()
+
+
+def block_ids(data):
+    """Return the ids of the arrays holding the columns of data."""
+    #pandas has no public handle on its blocks; an edit under copy-on-write replaces the written block
+    return tuple(id(block.values) for block in data._mgr.blocks)
+
+
+def data_token(data):
+    """Return a token that changes when the shape, columns, dtypes, column arrays or sampled rows of data change."""
+    rows = np.unique(np.linspace(0, len(data) - 1, min(len(data), TOKEN_SAMPLE_ROWS)).astype(np.int64))
+    sample = pd.util.hash_pandas_object(data.iloc[rows], index=True).to_numpy()
+    return (data.shape, tuple(data.columns), tuple(str(dtype) for dtype in data.dtypes), block_ids(data),
+        int(sample.sum(dtype=np.uint64)), int(np.bitwise_xor.reduce(sample)) if len(sample) else 0)
+
+
+class Grouping(object):
+    """
+    The rows of a DataFrame grouped by the combined levels of one or more columns.
+
+    data    - the DataFrame
+    columns - the grouping columns, the first varying slowest
+    levels  - list of the levels of every column
+    codes   - combined group of every row, -1 where any column is missing or not in its levels
+    order   - row numbers sorted by group, rows without a group first
+    offsets - the rows of group g are order[offsets[g]:offsets[g + 1]]
+    """
+
+    def __init__(self, data, columns, levels, column_codes):
+        self.data = data
+        self.columns = tuple(columns)
+        self.levels = [list(level) for level in levels]
+        self.shape = tuple(len(level) for level in self.levels)
+        codes = np.zeros(len(column_codes[0]), dtype=np.int64)
+        missing = np.zeros(len(codes), dtype=bool)
+        for size, part in zip(self.shape, column_codes):
+            codes = codes * size + part
+            missing |= part < 0
+        codes[missing] = -1
+        self.codes = codes
+        self.order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes[~missing], minlength=len(self))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]) + missing.sum()
+        self._sorted = {}
+
+    def __len__(self):
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    def __repr__(self):
+        return 'Grouping(%r, shape=%r)' % (self.columns, self.shape)
+
+    @property
+    def sizes(self):
+        """Number of rows in every group."""
+        return np.diff(self.offsets)
+
+    def members(self, group):
+        """Row numbers of one group, by combined code or by a tuple of per-column codes."""
+        if isinstance(group, tuple):
+            group = int(np.ravel_multi_index(group, self.shape))
+        return self.order[self.offsets[group]:self.offsets[group + 1]]
+
+    def sort(self, values):
+        """Return values (one per row) in group order, rows without a group dropped."""
+        values = np.asarray(getattr(values, 'values', values))
+        return values[self.order[self.offsets[0]:]]
+
+    def split(self, values):
+        """Return one array of values per group; values is an array or, cached, a column name."""
+        if isinstance(values, str):
+            if values not in self._sorted:
+                self._sorted[values] = self.sort(self.data[values].to_numpy())
+            ordered = self._sorted[values]
+        else:
+            ordered = self.sort(values)
+        bounds = self.offsets - self.offsets[0]
+        return [ordered[bounds[g]:bounds[g + 1]] for g in range(len(self))]
+
+
+class GroupedView(object):
+    """
+    Cached factorizations and groupings of the categorical columns of one DataFrame.
+
+    data - the DataFrame; the cache is kept until the frame changes or invalidate() is called
+    """
+
+    def __init__(self, data):
+        if not isinstance(data, pd.DataFrame):
+            raise ValueError('a grouped view needs a DataFrame, not %s' % type(data).__name__)
+        self.data = data
+        self._factors = {}
+        self._codes = {}
+        self._groupings = {}
+        self.invalidate()
+
+    def __repr__(self):
+        return 'GroupedView(%d rows, %d groupings)' % (len(self.data), len(self._groupings))
+
+    def __getitem__(self, column):
+        return self.data[column]
+
+    def invalidate(self):
+        """Drop every cached code and grouping, and take a new token of the data."""
+        data = self.data
+        #the shallow copy shares the frame's arrays, so copy-on-write gives any later edit new ones
+        self._snapshot = data.copy(deep=False)
+        self.token = data_token(data)
+        self._factors.clear()
+        self._codes.clear()
+        self._groupings.clear()
+
+    def check(self):
+        """Invalidate the view if the token of the data has changed. Returns True if it had."""
+        if data_token(self.data) != self.token:
+            self.invalidate()
+            return True
+        return False
+
+    def factorize(self, column):
+        """Return (codes, levels) of a column, with the levels in seaborn's default order."""
+        self.check()
+        if column not in self._factors:
+            values = self.data[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                self._factors[column] = (values.cat.codes.to_numpy().astype(np.int64), list(values.cat.categories))
+            else:
+                codes, uniques = pd.factorize(values, use_na_sentinel=True)
+                codes = codes.astype(np.int64)
+                if pd.api.types.is_numeric_dtype(values):
+                    #renumber the levels in sorted order
+                    rank = np.argsort(np.argsort(np.asarray(uniques), kind='stable'))
+                    codes = np.where(codes >= 0, rank[codes], -1)
+                    uniques = np.sort(np.asarray(uniques))
+                self._factors[column] = (codes, list(uniques))
+        return self._factors[column]
+
+    def levels(self, column, order=None):
+        """Return the levels of a column, in the given order or seaborn's."""
+        return list(order) if order is not None else self.factorize(column)[1]
+
+    def codes(self, column, order=None):
+        """Return the code of every row in the levels of column (-1 when missing or not listed)."""
+        self.check()
+        key = (column, None if order is None else tuple(order))
+        if key not in self._codes:
+            codes, levels = self.factorize(column)
+            if order is None:
+                self._codes[key] = codes
+            else:
+                position = {level: i for i, level in enumerate(order)}
+                remap = np.array([position.get(level, -1) for level in levels] + [-1], dtype=np.int64)
+                self._codes[key] = remap[codes]
+        return self._codes[key]
+
+    def grouping(self, columns, orders=None):
+        """
+        Return the Grouping of the rows by one or more columns (x, or x and hue).
+
+        orders - one level order (or None) per column
+        """
+        if isinstance(columns, str):
+            columns, orders = [columns], [orders]
+        columns = list(columns)
+        orders = list(orders) if orders is not None else [None] * len(columns)
+        self.check()
+        key = tuple((column, None if order is None else tuple(order)) for column, order in zip(columns, orders))
+        if key not in self._groupings:
+            self._groupings[key] = Grouping(self.data, columns, [self.levels(c, o) for c, o in zip(columns, orders)],
+                [self.codes(c, o) for c, o in zip(columns, orders)])
+        return self._groupings[key]
+
+
+def grouped_view(data):
+    """Return the shared GroupedView of a DataFrame (a view is returned as it is)."""
+    if isinstance(data, GroupedView):
+        return data
+    key = id(data)
+    view = _views.get(key)
+    #a view holds its frame, so the id of an open view's frame cannot have been reused
+    if view is None:
+        view = _views[key] = GroupedView(data)
+    return view
+
+
+def as_frame(data):
+    """Return the DataFrame behind data, which may be a DataFrame or a GroupedView."""
+    return data.data if isinstance(data, GroupedView) else data
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Compare grouping through a cached view with regrouping per plot.')
+    parser.add_argument('--rows', type=int, default=5000000)
+    parser.add_argument('--plots', type=int, default=12)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    days = pd.Categorical(rng.choice(['Thur', 'Fri', 'Sat', 'Sun'], args.rows), categories=['Thur', 'Fri', 'Sat', 'Sun'])
+    data = pd.DataFrame({'day': days, 'sex': rng.choice(['Male', 'Female'], args.rows),
+        'total_bill': rng.gamma(2.0, 10.0, args.rows)})
+
+    start = time.perf_counter()
+    for _ in range(args.plots):
+        means = [part.mean() for _, part in data.groupby(['day', 'sex'], observed=True)['total_bill']]
+    regroup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    view = grouped_view(data)
+    first = None
+    for _ in range(args.plots):
+        means = [part.mean() for part in view.grouping(['day', 'sex']).split('total_bill')]
+        first = first or time.perf_counter() - start
+    cached = time.perf_counter() - start
+    print('%d rows, %d plots: regrouping %.2fs, grouped view %.2fs (first plot %.2fs)' % (args.rows, args.plots, regroup, cached, first))
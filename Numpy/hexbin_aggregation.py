@@ -0,0 +1,225 @@
+"""
+Out-of-Core Hexagonal Binning
+---------------------------------------------------------------------------------------------
+This module bins x,y points into a hexagonal grid with vectorized NumPy, so that
+hexbin plots can be built from data that is read one chunk at a time.
+
+- the grid uses the same hexagon layout as matplotlib's Axes.hexbin
+- counts, sums, means, minimums and maximums of a C column can be accumulated
+- partial grids built over the same extent can be merged, e.g. across processes
+- a finished grid draws straight onto a matplotlib axes as a PolyCollection
+
+The extent of the grid has to be known up front, since the raw x,y columns are never
+held in memory at once.
+---------------------------------------------------------------------------------------------
+"""
+
+import math
+
+import numpy as np
+
+#reductions supported for the optional C column
+REDUCTIONS = ('count', 'sum', 'mean', 'min', 'max')
+
+
+class HexbinGrid(object):
+    """
+    Mergeable hexagonal bin accumulator.
+
+    extent   - (xmin, xmax, ymin, ymax) covered by the grid
+    gridsize - number of hexagons in the x direction, or an (nx, ny) tuple
+    reduce   - one of REDUCTIONS, applied to the C values of each hexagon
+    """
+
+    def __init__(self, extent, gridsize=100, reduce='count'):
+        if reduce not in REDUCTIONS:
+            raise ValueError('reduce must be one of %s, got %r' % (REDUCTIONS, reduce))
+        if np.iterable(gridsize):
+            nx, ny = gridsize
+        else:
+            nx = gridsize
+            ny = int(nx / math.sqrt(3))
+
+        xmin, xmax, ymin, ymax = [float(v) for v in extent]
+        if not xmax > xmin or not ymax > ymin:
+            raise ValueError('extent must have xmax > xmin and ymax > ymin, got %r' % (extent,))
+
+        self.extent = (xmin, xmax, ymin, ymax)
+        self.gridsize = (int(nx), int(ny))
+        self.reduce = reduce
+
+        #the hexagons exactly cover xmin to xmax, pad slightly against roundoff
+        self.padding = 1.e-9 * (xmax - xmin)
+        self.sx = (xmax - xmin + 2 * self.padding) / nx
+        self.sy = (ymax - ymin) / ny
+
+        #two interleaved lattices, as in matplotlib's hexbin
+        self.n1 = (nx + 1) * (ny + 1)
+        self.n2 = nx * ny
+        size = self.n1 + self.n2
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.sums = np.zeros(size) if reduce in ('sum', 'mean') else None
+        self.mins = np.full(size, np.inf) if reduce == 'min' else None
+        self.maxs = np.full(size, -np.inf) if reduce == 'max' else None
+
+    def bin_index(self, x, y):
+        """Return the hexagon index of every point, -1 for points outside the extent."""
+        nx, ny = self.gridsize
+        xmin, xmax, ymin, ymax = self.extent
+        ix = (np.asarray(x, dtype=float) - xmin + self.padding) / self.sx
+        iy = (np.asarray(y, dtype=float) - ymin) / self.sy
+
+        ix1 = np.round(ix).astype(np.int64)
+        iy1 = np.round(iy).astype(np.int64)
+        ix2 = np.floor(ix).astype(np.int64)
+        iy2 = np.floor(iy).astype(np.int64)
+
+        #pick whichever lattice centre is closer in hexagon metric
+        d1 = (ix - ix1) ** 2 + 3.0 * (iy - iy1) ** 2
+        d2 = (ix - ix2 - 0.5) ** 2 + 3.0 * (iy - iy2 - 0.5) ** 2
+        first = d1 < d2
+
+        inside1 = (ix1 >= 0) & (ix1 <= nx) & (iy1 >= 0) & (iy1 <= ny)
+        inside2 = (ix2 >= 0) & (ix2 < nx) & (iy2 >= 0) & (iy2 < ny)
+        index = np.where(first, ix1 * (ny + 1) + iy1, self.n1 + ix2 * ny + iy2)
+        inside = np.where(first, inside1, inside2) & np.isfinite(ix) & np.isfinite(iy)
+        return np.where(inside, index, -1)
+
+    def update(self, x, y, C=None):
+        """Accumulate one chunk of points, and their C values if the grid reduces a column."""
+        index = self.bin_index(x, y)
+        keep = index >= 0
+        if C is not None:
+            C = np.asarray(C, dtype=float)
+            keep &= ~np.isnan(C)
+            C = C[keep]
+        elif self.reduce != 'count':
+            raise ValueError('a C column is required for reduce=%r' % self.reduce)
+        index = index[keep]
+
+        size = self.counts.size
+        self.counts += np.bincount(index, minlength=size)
+        if self.sums is not None:
+            self.sums += np.bincount(index, weights=C, minlength=size)
+        if self.mins is not None:
+            np.minimum.at(self.mins, index, C)
+        if self.maxs is not None:
+            np.maximum.at(self.maxs, index, C)
+        return self
+
+    def merge(self, other):
+        """Fold another grid with the same extent, gridsize and reduction into this one."""
+        if (other.extent, other.gridsize, other.reduce) != (self.extent, self.gridsize, self.reduce):
+            raise ValueError('can only merge hexbin grids with the same extent, gridsize and reduce')
+        self.counts += other.counts
+        if self.sums is not None:
+            self.sums += other.sums
+        if self.mins is not None:
+            np.minimum(self.mins, other.mins, out=self.mins)
+        if self.maxs is not None:
+            np.maximum(self.maxs, other.maxs, out=self.maxs)
+        return self
+
+    __iadd__ = merge
+
+    def offsets(self):
+        """Return the (n, 2) centre of every hexagon in data coordinates."""
+        nx, ny = self.gridsize
+        xmin, xmax, ymin, ymax = self.extent
+        offsets = np.zeros((self.n1 + self.n2, 2))
+        offsets[:self.n1, 0] = np.repeat(np.arange(nx + 1), ny + 1)
+        offsets[:self.n1, 1] = np.tile(np.arange(ny + 1), nx + 1)
+        offsets[self.n1:, 0] = np.repeat(np.arange(nx) + 0.5, ny)
+        offsets[self.n1:, 1] = np.tile(np.arange(ny), nx) + 0.5
+        offsets[:, 0] = offsets[:, 0] * self.sx + xmin - self.padding
+        offsets[:, 1] = offsets[:, 1] * self.sy + ymin
+        return offsets
+
+    def values(self, mincnt=None):
+        """
+        Return the reduced value of every hexagon, NaN where it should not be drawn.
+
+        mincnt defaults to 0 for counts (every hexagon is drawn) and 1 for reductions.
+        """
+        if mincnt is None:
+            mincnt = 0 if self.reduce == 'count' else 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if self.reduce == 'count':
+                values = self.counts.astype(float)
+            elif self.reduce == 'sum':
+                values = self.sums.copy()
+            elif self.reduce == 'mean':
+                values = self.sums / self.counts
+            elif self.reduce == 'min':
+                values = self.mins.copy()
+            else:
+                values = self.maxs.copy()
+        values[self.counts < max(mincnt, 0)] = np.nan
+        if self.reduce != 'count':
+            values[self.counts == 0] = np.nan
+        return values
+
+    def hexagon(self):
+        """Return the vertices of a single hexagon centred on the origin."""
+        return [self.sx, self.sy / 3] * np.array(
+            [[.5, -.5], [.5, .5], [0., 1.], [-.5, .5], [-.5, -.5], [0., -1.]])
+
+    def draw(self, ax, cmap=None, mincnt=None, colorbar=True, edgecolors='face', linewidths=None, **kwargs):
+        """Draw the grid as a PolyCollection of hexagons and return the collection."""
+        import matplotlib as mpl
+        import matplotlib.collections as mcoll
+        import matplotlib.transforms as mtransforms
+
+        if linewidths is None:
+            linewidths = [mpl.rcParams['patch.linewidth']]
+
+        values = self.values(mincnt)
+        good = ~np.isnan(values)
+        collection = mcoll.PolyCollection(
+            [self.hexagon()],
+            edgecolors = edgecolors,
+            linewidths = linewidths,
+            offsets = self.offsets()[good],
+            offset_transform = mtransforms.AffineDeltaTransform(ax.transData),
+            **kwargs)
+        collection.set_array(values[good])
+        collection.set_cmap(cmap)
+        collection.autoscale_None()
+
+        xmin, xmax, ymin, ymax = self.extent
+        ax.add_collection(collection, autolim=False)
+        ax.update_datalim([(xmin, ymin), (xmax, ymax)])
+        ax.autoscale_view()
+        if colorbar:
+            ax.figure.colorbar(collection, ax=ax)
+        return collection
+
+    def save(self, path):
+        """Write the partial grid to an .npz file so another process can merge it."""
+        arrays = dict(extent=self.extent, gridsize=self.gridsize, reduce=self.reduce, counts=self.counts)
+        for name in ('sums', 'mins', 'maxs'):
+            if getattr(self, name) is not None:
+                arrays[name] = getattr(self, name)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Read a grid written by save()."""
+        with np.load(path) as arrays:
+            grid = cls(arrays['extent'], tuple(arrays['gridsize']), str(arrays['reduce']))
+            grid.counts[:] = arrays['counts']
+            for name in ('sums', 'mins', 'maxs'):
+                if name in arrays:
+                    getattr(grid, name)[:] = arrays[name]
+        return grid
+
+
+def hexbin_frames(frames, x, y, extent, C=None, gridsize=100, reduce='count'):
+    """
+    Build a HexbinGrid from an iterable of DataFrame chunks,
+    e.g. pd.read_csv(path, chunksize=1000000).
+    """
+    grid = HexbinGrid(extent, gridsize=gridsize, reduce=reduce)
+    for frame in frames:
+        grid.update(frame[x].values, frame[y].values, None if C is None else frame[C].values)
+    return grid
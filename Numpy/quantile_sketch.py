@@ -0,0 +1,193 @@
+"""
+Streaming Quantile Sketches for Box Plots
+---------------------------------------------------------------------------------------------
+This module builds box plots from mergeable KLL quantile sketches, so the quartiles,
+whiskers and outliers of a column can be computed without holding the column in memory.
+
+- a sketch keeps a few hundred weighted samples in a stack of compactors; whenever a
+  level is full it is sorted and every other item is promoted with twice the weight
+- sketches are filled one chunk at a time, e.g. from pd.read_csv(chunksize=...) or the
+  record batches of a Parquet file, and sketches of the same column can be merged
+- k sets the accuracy: the rank error is roughly 3.3 / k (about 1.65% for k = 200)
+- the exact count, mean, minimum and maximum are tracked alongside the sketch
+- outliers are taken from the retained samples in the sketch tails, each standing in
+  for up to 2^level original values
+
+box_stats() returns the dictionaries that matplotlib's Axes.bxp draws directly.
+---------------------------------------------------------------------------------------------
+"""
+
+import math
+
+import numpy as np
+
+#rank error is roughly RANK_ERROR_CONSTANT / k
+RANK_ERROR_CONSTANT = 3.3
+
+
+class QuantileSketch(object):
+    """
+    Mergeable KLL quantile sketch.
+
+    k    - size of the top compactor; larger k means smaller rank error
+    seed - seed for the random choice of which half is promoted on compaction
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = int(k)
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_error(cls, error, seed=None):
+        """Create a sketch whose rank error is about error (e.g. 0.01 for 1%)."""
+        return cls(k=max(int(math.ceil(RANK_ERROR_CONSTANT / error)), 8), seed=seed)
+
+    def capacity(self, level):
+        """Return how many items a level holds before it is compacted."""
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2. / 3) ** depth)), 2)
+
+    def compress(self):
+        """Compact every level that is over capacity, promoting half its items upward."""
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if items.size > self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                #an odd item out stays behind so no weight is lost
+                keep = items[:items.size % 2]
+                paired = items[items.size % 2:]
+                promoted = paired[self.rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+        return self
+
+    def update(self, values):
+        """Add one chunk of values to the sketch, ignoring NaNs."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self.n += values.size
+        self.total += values.sum()
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        return self.compress()
+
+    def merge(self, other):
+        """Fold another sketch into this one."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self.compress()
+
+    __iadd__ = merge
+
+    def weighted_items(self):
+        """Return the retained items sorted, with their weights."""
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level.size, 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='mergesort')
+        return items[order], weights[order]
+
+    def quantile(self, q):
+        """Return the approximate q quantile(s), with q=0 and q=1 giving the exact min and max."""
+        q = np.asarray(q, dtype=float)
+        if self.n == 0:
+            return np.full(q.shape, np.nan)
+        items, weights = self.weighted_items()
+        cumulative = np.cumsum(weights)
+        rank = q * cumulative[-1]
+        index = np.minimum(np.searchsorted(cumulative, rank, side='left'), items.size - 1)
+        result = items[index]
+        result = np.where(q <= 0, self.min, np.where(q >= 1, self.max, result))
+        return result if result.ndim else float(result)
+
+    def rank(self, value):
+        """Return the approximate fraction of values less than or equal to value."""
+        items, weights = self.weighted_items()
+        return weights[items <= value].sum() / max(weights.sum(), 1)
+
+    def mean(self):
+        """Return the exact mean of all values seen."""
+        return self.total / self.n if self.n else np.nan
+
+    def box_stats(self, whis=1.5, label=None):
+        """
+        Return a dictionary for matplotlib's Axes.bxp: quartiles, whiskers at the most
+        extreme values within whis * IQR of the box, and fliers from the sketch tails.
+        """
+        q1, med, q3 = self.quantile([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        lo_bound, hi_bound = q1 - whis * iqr, q3 + whis * iqr
+        items, weights = self.weighted_items()
+        items = np.unique(np.concatenate([items, [self.min, self.max]]))
+
+        inside = items[(items >= lo_bound) & (items <= hi_bound)]
+        whislo = inside.min() if inside.size else q1
+        whishi = inside.max() if inside.size else q3
+        fliers = items[(items < lo_bound) | (items > hi_bound)]
+        return dict(label=label, med=med, q1=q1, q3=q3, whislo=min(whislo, q1),
+            whishi=max(whishi, q3), fliers=fliers, mean=self.mean())
+
+
+def sketch_chunks(chunks, columns=None, by=None, k=200):
+    """
+    Fill sketches from an iterable of DataFrame chunks.
+
+    Returns {column: sketch}, or {(group, column): sketch} when by names a grouping column.
+    """
+    sketches = {}
+    for chunk in chunks:
+        names = columns if columns is not None else \
+            [c for c in chunk.select_dtypes('number').columns if c != by]
+        if by is None:
+            for name in names:
+                sketches.setdefault(name, QuantileSketch(k)).update(chunk[name].values)
+        else:
+            for group, part in chunk.groupby(by, observed=True, sort=False):
+                for name in names:
+                    sketches.setdefault((group, name), QuantileSketch(k)).update(part[name].values)
+    return sketches
+
+
+def sketch_csv(path, columns=None, by=None, k=200, chunksize=1000000, **read_csv_kwargs):
+    """Fill sketches from a csv file read chunksize rows at a time."""
+    import pandas as pd
+
+    usecols = None if columns is None else list(columns) + ([] if by is None else [by])
+    chunks = pd.read_csv(path, usecols=usecols, chunksize=chunksize, **read_csv_kwargs)
+    return sketch_chunks(chunks, columns=columns, by=by, k=k)
+
+
+def sketch_parquet(path, columns=None, by=None, k=200, batch_size=1000000):
+    """Fill sketches from a Parquet file read one record batch at a time (needs pyarrow)."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('sketch_parquet requires pyarrow, install it with: pip install pyarrow')
+
+    parquet = pq.ParquetFile(path)
+    read = None if columns is None else list(columns) + ([] if by is None else [by])
+    chunks = (batch.to_pandas() for batch in parquet.iter_batches(batch_size=batch_size, columns=read))
+    return sketch_chunks(chunks, columns=columns, by=by, k=k)
+
+
+def draw_boxplot(ax, sketches, whis=1.5, **kwargs):
+    """Draw one box per sketch of a {label: sketch} mapping with Axes.bxp."""
+    stats = [sketch.box_stats(whis=whis, label=label) for label, sketch in sketches.items()]
+    return ax.bxp(stats, **kwargs)
@@ -0,0 +1,231 @@
+"""
+Streaming, Mergeable Histograms
+---------------------------------------------------------------------------------------------
+This module accumulates a histogram in one pass over chunks of data, so that a plot of
+continuously arriving data only has to bin the new values on every refresh.
+
+Two kinds of edges are supported:
+- fixed edges, given explicitly or as a number of bins over a range
+  (values outside the range are counted as underflow/overflow)
+- adaptive edges, where the range is unknown up front; the bins live on a power-of-two
+  lattice and the bin width doubles whenever new values fall outside the current span
+
+Histograms with the same fixed edges, or adaptive histograms with the same number of
+bins, can be merged, e.g. after each worker has binned its own share of the data.
+A finished histogram draws onto a matplotlib axes, or exports its edges and counts for
+any other plotting front end.
+---------------------------------------------------------------------------------------------
+"""
+
+import math
+
+import numpy as np
+
+
+class StreamingHistogram(object):
+    """
+    One-pass histogram accumulator.
+
+    bins  - number of bins (must be even for adaptive histograms)
+    range - (lo, hi) of uniform fixed bins
+    edges - explicit, monotonically increasing fixed bin edges
+
+    If neither range nor edges is given, the histogram is adaptive.
+    """
+
+    def __init__(self, bins=10, range=None, edges=None):
+        self.underflow = 0
+        self.overflow = 0
+        self.total = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+        if edges is not None:
+            edges = np.asarray(edges, dtype=float)
+            if edges.ndim != 1 or edges.size < 2 or np.any(np.diff(edges) <= 0):
+                raise ValueError('edges must be a 1-D, strictly increasing array of at least 2 values')
+            self.fixed_edges = edges
+            self.adaptive = False
+            self.bins = edges.size - 1
+            self.origin = edges[0]
+            self.width = None
+        elif range is not None:
+            lo, hi = float(range[0]), float(range[1])
+            if not hi > lo:
+                raise ValueError('range must have hi > lo, got %r' % (range,))
+            self.fixed_edges = None
+            self.adaptive = False
+            self.bins = int(bins)
+            self.origin = lo
+            self.hi = hi
+            self.width = (hi - lo) / self.bins
+        else:
+            if bins % 2:
+                raise ValueError('adaptive histograms need an even number of bins, got %d' % bins)
+            self.fixed_edges = None
+            self.adaptive = True
+            self.bins = int(bins)
+            self.origin = None
+            self.width = None
+
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+
+    @property
+    def edges(self):
+        """The bin edges, or None for an adaptive histogram that has not seen data yet."""
+        if self.fixed_edges is not None:
+            return self.fixed_edges
+        if self.width is None:
+            return None
+        if not self.adaptive:
+            return np.linspace(self.origin, self.hi, self.bins + 1)
+        return self.origin + self.width * np.arange(self.bins + 1)
+
+    def _grow(self, lo, hi):
+        """Double the adaptive bin width until [lo, hi] fits, folding the old counts in."""
+        if self.width is None:
+            span = max(hi - lo, np.finfo(float).tiny) if hi > lo else max(abs(lo), 1.0) * 1e-9
+            self.width = 2.0 ** math.ceil(math.log2(span / self.bins))
+            self.origin = math.floor(lo / self.width) * self.width
+        while lo < self.origin or hi >= self.origin + self.bins * self.width:
+            width = 2.0 * self.width
+            #any multiple of the new width that still contains the old span will do,
+            #so pick the one that reaches furthest towards lo
+            lowest = math.ceil((self.origin - self.bins * self.width) / width) * width
+            highest = math.floor(self.origin / width) * width
+            origin = min(max(math.floor(lo / width) * width, lowest), highest)
+            shift = int(round((self.origin - origin) / self.width))
+            target = (np.arange(self.bins) + shift) // 2
+            self.counts = np.bincount(target, weights=self.counts, minlength=self.bins).astype(np.int64)
+            self.origin = origin
+            self.width = width
+
+    def bin_index(self, values):
+        """Return the bin of every value, -1 below the first edge and bins above the last."""
+        if self.fixed_edges is not None:
+            index = np.searchsorted(self.fixed_edges, values, side='right') - 1
+            #the last bin is closed on the right, as in np.histogram
+            index[values == self.fixed_edges[-1]] = self.bins - 1
+            return np.clip(index, -1, self.bins)
+        edges = self.edges
+        if self.adaptive:
+            index = np.floor((values - self.origin) / self.width).astype(np.int64)
+        else:
+            index = np.floor((values - self.origin) * (self.bins / (self.hi - self.origin))).astype(np.int64)
+        index = np.clip(index, -1, self.bins)
+        #correct for roundoff against the exact edges, as np.histogram does
+        inner = (index >= 0) & (index < self.bins)
+        index[inner & (values < edges[np.clip(index, 0, self.bins)])] -= 1
+        index[inner & (values >= edges[np.clip(index + 1, 0, self.bins)])] += 1
+        if not self.adaptive:
+            index[values == edges[-1]] = self.bins - 1
+        return np.clip(index, -1, self.bins)
+
+    def update(self, values):
+        """Bin one chunk of values, ignoring NaNs."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        lo, hi = values.min(), values.max()
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+        self.total += values.size
+        if self.adaptive:
+            self._grow(lo, hi)
+
+        index = self.bin_index(values)
+        self.underflow += int(np.count_nonzero(index < 0))
+        self.overflow += int(np.count_nonzero(index >= self.bins))
+        inside = index[(index >= 0) & (index < self.bins)]
+        self.counts += np.bincount(inside, minlength=self.bins)
+        return self
+
+    def merge(self, other):
+        """Fold another histogram with compatible edges into this one."""
+        if self.adaptive != other.adaptive or self.bins != other.bins:
+            raise ValueError('can only merge histograms of the same kind and number of bins')
+        if self.adaptive:
+            if other.width is None:
+                return self
+            self._grow(other.origin, other.origin + other.bins * other.width - other.width / 2)
+            #coarsen the other histogram's lattice onto ours
+            other_edges = other.origin + other.width * np.arange(other.bins)
+            target = np.floor((other_edges - self.origin) / self.width + 1e-9).astype(np.int64)
+            self.counts += np.bincount(target, weights=other.counts, minlength=self.bins).astype(np.int64)
+        else:
+            if not np.array_equal(self.edges, other.edges):
+                raise ValueError('can only merge fixed histograms with identical edges')
+            self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    __iadd__ = merge
+
+    def coarsen(self, factor):
+        """Return a new histogram whose bins each combine factor neighbouring bins."""
+        if self.bins % factor:
+            raise ValueError('bins (%d) must be divisible by factor (%d)' % (self.bins, factor))
+        edges = self.edges
+        if edges is None:
+            raise ValueError('cannot coarsen an adaptive histogram before it has seen data')
+        coarse = StreamingHistogram(edges=edges[::factor])
+        coarse.counts = self.counts.reshape(-1, factor).sum(axis=1)
+        for name in ('underflow', 'overflow', 'total', 'min', 'max'):
+            setattr(coarse, name, getattr(self, name))
+        return coarse
+
+    def trimmed(self):
+        """Return (edges, counts) with empty leading and trailing bins removed."""
+        nonzero = np.flatnonzero(self.counts)
+        if nonzero.size == 0:
+            return self.edges, self.counts
+        first, last = nonzero[0], nonzero[-1] + 1
+        return self.edges[first:last + 1], self.counts[first:last]
+
+    def density(self):
+        """Return the counts normalised to a probability density over the binned values."""
+        edges = self.edges
+        return self.counts / (self.counts.sum() * np.diff(edges))
+
+    def to_dict(self):
+        """Export the histogram for plotting front ends other than matplotlib."""
+        edges, counts = self.trimmed() if self.adaptive else (self.edges, self.counts)
+        return dict(edges=edges.tolist(), counts=counts.tolist(),
+            underflow=self.underflow, overflow=self.overflow, total=self.total)
+
+    def draw(self, ax, density=False, **kwargs):
+        """Draw the histogram with ax.hist, so it picks up the usual bar styling."""
+        edges, counts = self.trimmed() if self.adaptive else (self.edges, self.counts)
+        return ax.hist(edges[:-1], bins=edges, weights=counts, density=density, **kwargs)
+
+    def save(self, path):
+        """Write the histogram to an .npz file so another process can merge it."""
+        np.savez(path, adaptive=self.adaptive, bins=self.bins, counts=self.counts,
+            edges=np.array([]) if self.edges is None else self.edges,
+            fixed=self.fixed_edges is not None,
+            stats=np.array([self.underflow, self.overflow, self.total, self.min, self.max], dtype=float))
+
+    @classmethod
+    def load(cls, path):
+        """Read a histogram written by save()."""
+        with np.load(path) as arrays:
+            bins = int(arrays['bins'])
+            edges = arrays['edges']
+            if bool(arrays['fixed']):
+                hist = cls(edges=edges)
+            elif bool(arrays['adaptive']):
+                hist = cls(bins=bins)
+                if edges.size:
+                    hist.origin, hist.width = edges[0], edges[1] - edges[0]
+            else:
+                hist = cls(bins=bins, range=(edges[0], edges[-1]))
+            hist.counts = arrays['counts'].copy()
+            underflow, overflow, total, lo, hi = arrays['stats']
+        hist.underflow, hist.overflow, hist.total = int(underflow), int(overflow), int(total)
+        hist.min, hist.max = lo, hi
+        return hist
@@ -0,0 +1,244 @@
+"""
+Sweep Beeswarm Layout with a Density Strip Fallback
+---------------------------------------------------------------------------------------------
+sns.swarmplot() places its points one at a time: every new point scans back through the
+swarm built so far in a Python loop, and the swarm array is copied each time a point is
+added. Laying out 20k points took about 5 seconds here, and crowded swarms that cannot
+fit are still laid out in full before most of their points are pushed to the edges.
+
+This module lays out the same swarm with a sorted sweep:
+- the values are sorted once, and for every point the window of earlier points that can
+  touch it (less than one marker diameter away along the value axis) is found with one
+  searchsorted over the whole column
+- the candidate offsets next to each neighbour in the window are tested against all of
+  the window at once, and the most central free one is taken, as seaborn does
+- the work per point depends on the window, never on the number of points placed:
+  20k points take under a second and 100k points about 5 seconds
+- before laying out, the width the swarm will need is estimated from the densest window;
+  a swarm whose point centres overflow the slot a little is kept, with the overflowing
+  points moved to the edge of the slot as in seaborn's gutters, and only when more than
+  GUTTER_SHARE of the points (seaborn's warning threshold) would overflow, or the estimate
+  already exceeds the slot by that much, are they drawn as a density strip instead:
+  random offsets scaled by the local density of the values, which keeps the shape of the
+  swarm without any overlap checks
+
+swarmplot() draws a swarm plot like sns.swarmplot (x/y/hue/dodge, horizontal when the
+categorical variable is on y), also on top of an existing violin or box plot. Its swarms
+are the groups of the shared grouped view of the data.
+---------------------------------------------------------------------------------------------
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from grouped_view import grouped_view
+
+#seaborn leaves a 5% gap between neighbouring points
+SPACING = 1.05
+
+#points in a hexagonal packing fill a band one diameter tall about this many times over
+PACKING = 2 / np.sqrt(3)
+
+#share of points a swarm may push into the gutters at the edges of its slot, as in seaborn
+GUTTER_SHARE = 0.05
+
+#the density strip uses the values' density smoothed over this many marker diameters
+STRIP_BANDWIDTH = 4
+
+
+def swarm_offsets(values, diameter):
+    """
+    Return the offset of every point from the center line so that no two markers of the
+    given diameter overlap. values and diameter are in the same (display) units.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    order = np.argsort(values, kind='stable')
+    ordered = values[order]
+    #the first earlier point that is still less than one diameter away
+    starts = np.searchsorted(ordered, ordered - diameter, 'right')
+    placed = np.zeros(n)
+    for i in range(1, n):
+        start = starts[i]
+        if start == i:
+            continue
+        neighbours = placed[start:i]
+        reach = np.sqrt(np.maximum(diameter ** 2 - (ordered[i] - ordered[start:i]) ** 2, 0)) * SPACING
+        #left and right of every neighbour, alternating which side is tried first
+        flip = np.arange(len(reach)) % 2 == 1
+        first = np.where(flip, neighbours + reach, neighbours - reach)
+        second = np.where(flip, neighbours - reach, neighbours + reach)
+        candidates = np.concatenate([[0.0], np.column_stack([first, second]).ravel()])
+        free = np.all(np.abs(candidates[:, None] - neighbours[None, :]) >= reach[None, :] / SPACING - 1e-9, axis=1)
+        choices = candidates[free]
+        placed[i] = choices[np.argmin(np.abs(choices))]
+    offsets = np.empty(n)
+    offsets[order] = placed
+    return offsets
+
+
+def required_width(values, diameter):
+    """Estimate the full width a swarm of these values needs, from its densest window."""
+    ordered = np.sort(np.asarray(values, dtype=float))
+    if len(ordered) == 0:
+        return 0.0
+    crowd = np.searchsorted(ordered, ordered + diameter, 'left') - np.arange(len(ordered))
+    return crowd.max() * diameter * SPACING / PACKING
+
+
+def strip_offsets(values, diameter, width, seed=0):
+    """
+    Return density-strip offsets: uniform random offsets, scaled so the strip is as wide as
+    the local density of the values (widest where the values are densest).
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return np.zeros(0)
+    lo, hi = values.min(), values.max()
+    bins = max(1, int(np.ceil((hi - lo) / diameter)))
+    counts, edges = np.histogram(values, bins=bins, range=(lo, hi + 1e-12))
+    #smooth the histogram with a small gaussian so the outline is not ragged
+    radius = STRIP_BANDWIDTH
+    kernel = np.exp(-0.5 * (np.arange(-3 * radius, 3 * radius + 1) / radius) ** 2)
+    density = np.convolve(counts, kernel / kernel.sum(), mode='same')
+    index = np.clip(((values - lo) / diameter).astype(np.int64), 0, bins - 1)
+    scale = density[index] / density.max()
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-1, 1, len(values)) * scale * (width - diameter) / 2
+
+
+def layout(values, diameter, width, seed=0):
+    """
+    Return (offsets, mode): a swarm if its point centres fit in width, with at most
+    GUTTER_SHARE of them moved in from beyond the edges, else a density strip.
+    mode is 'swarm' or 'strip'.
+    """
+    if len(values) and required_width(values, diameter) <= width * (1 + GUTTER_SHARE):
+        offsets = swarm_offsets(values, diameter)
+        edge = width / 2
+        if np.count_nonzero(np.abs(offsets) > edge) <= GUTTER_SHARE * len(offsets):
+            return np.clip(offsets, -edge, edge), 'swarm'
+    return strip_offsets(values, diameter, width, seed), 'strip'
+
+
+def swarmplot(x=None, y=None, data=None, hue=None, order=None, hue_order=None, dodge=False, split=False,
+        orient=None, color=None, palette=None, size=5, width=0.8, seed=0, ax=None, **kwargs):
+    """
+    Draw a swarm plot with the sweep layout, taking sns.swarmplot's main arguments.
+
+    data      - a DataFrame or its GroupedView
+    split     - the older name of dodge, accepted for the scripts written against it
+    orient    - 'v' or 'h'; inferred from which of x and y is categorical when None
+    seed      - seed of the density-strip offsets
+    Other keyword arguments go to Axes.scatter. Returns the axes.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    if ax is None:
+        ax = plt.gca()
+    dodge = dodge or split
+    view = grouped_view(data)
+    data = view.data
+    if orient is None:
+        orient = 'h' if pd.api.types.is_numeric_dtype(data[x]) and not pd.api.types.is_numeric_dtype(data[y]) else 'v'
+    category, value = (y, x) if orient == 'h' else (x, y)
+
+    levels = view.levels(category, order)
+    category_codes = view.codes(category, order)
+    values = data[value].to_numpy(dtype=float)
+    if hue is not None:
+        hue_levels = view.levels(hue, hue_order)
+        hue_codes = view.codes(hue, hue_order)
+        colors = sns.color_palette(palette, len(hue_levels))
+    else:
+        hue_levels, hue_codes = [None], np.zeros(len(values), dtype=np.int8)
+        colors = sns.color_palette(palette, len(levels)) if palette is not None else [color or sns.color_palette()[0]]
+
+    #fix the limits first, so the layout can be made in display units
+    if not ax.has_data():
+        finite = values[np.isfinite(values)]
+        pad = 0.05 * (finite.max() - finite.min() or 1)
+        limits = (finite.min() - pad, finite.max() + pad)
+        if orient == 'h':
+            ax.set_xlim(limits)
+            ax.set_ylim(len(levels) - 0.5, -0.5)
+        else:
+            ax.set_ylim(limits)
+            ax.set_xlim(-0.5, len(levels) - 0.5)
+    box = ax.get_window_extent()
+    (x0, x1), (y0, y1) = ax.get_xlim(), ax.get_ylim()
+    category_scale = (box.height / abs(y1 - y0)) if orient == 'h' else (box.width / abs(x1 - x0))
+    value_scale = (box.width / abs(x1 - x0)) if orient == 'h' else (box.height / abs(y1 - y0))
+    diameter = size * ax.figure.dpi / 72.0
+
+    slots = len(hue_levels) if dodge else 1
+    slot_width = width / slots
+    #one swarm per category, or per (category, hue) pair when dodging
+    if dodge:
+        grouping = view.grouping([category, hue], [order, hue_order])
+    else:
+        grouping = view.grouping([category], [order])
+    positions = np.full(len(values), np.nan)
+    strips = 0
+    keep = (category_codes >= 0) & (hue_codes >= 0) & np.isfinite(values)
+    for g in range(len(grouping)):
+        c, s = divmod(g, slots)
+        members = grouping.members(g)
+        members = members[keep[members]]
+        if len(members):
+            center = c - width / 2 + slot_width * (s + 0.5) if dodge else c
+            offsets, mode = layout(values[members] * value_scale, diameter, slot_width * category_scale, seed)
+            strips += mode == 'strip'
+            positions[members] = center + offsets / category_scale
+    if strips:
+        warnings.warn('%d of the swarms cannot fit without overlapping and are drawn as density strips; '
+            'use a smaller size or a wider plot to see every point' % strips, UserWarning)
+
+    kwargs.setdefault('linewidth', 0)
+    for h, level in enumerate(hue_levels):
+        members = keep & (hue_codes == h)
+        #without hue, a palette colors the categories
+        point_colors = np.array(colors)[category_codes[members]] if hue is None and palette is not None else colors[h]
+        xy = (values[members], positions[members]) if orient == 'h' else (positions[members], values[members])
+        ax.scatter(xy[0], xy[1], s=size ** 2, color=point_colors, label=level, **kwargs)
+
+    ticks = np.arange(len(levels))
+    if orient == 'h':
+        ax.set_yticks(ticks, [str(level) for level in levels])
+        ax.set_xlabel(value)
+        ax.set_ylabel(category)
+    else:
+        ax.set_xticks(ticks, [str(level) for level in levels])
+        ax.set_xlabel(category)
+        ax.set_ylabel(value)
+    if hue is not None:
+        ax.legend(title=hue)
+    return ax
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Compare the sweep layout with seaborn's beeswarm.")
+    parser.add_argument('--points', type=int, nargs='+', default=[1000, 2000, 5000])
+    args = parser.parse_args()
+
+    from seaborn.categorical import Beeswarm
+
+    rng = np.random.default_rng(0)
+    diameter = 5 * 100 / 72.0
+    for n in args.points:
+        #values spread over a tall axis, so that the swarm fits
+        values = rng.normal(0, n / 4.0, n)
+        start = time.perf_counter()
+        offsets = swarm_offsets(values, diameter)
+        sweep = time.perf_counter() - start
+        xyr = np.column_stack([np.zeros(n), np.sort(values), np.full(n, diameter / 2)])
+        start = time.perf_counter()
+        Beeswarm().beeswarm(xyr)
+        seaborn_time = time.perf_counter() - start
+        print('%7d points: sweep %.2fs, seaborn %.2fs, swarm width %.0f px' % (n, sweep, seaborn_time, np.ptp(offsets) + diameter))
@@ -0,0 +1,145 @@
+"""
+Typed, Cached CSV Loader
+---------------------------------------------------------------------------------------------
+This module loads the artificially created csv data files used by the Pandas scripts
+with a declared schema, and keeps a binary columnar cache next to them so that the
+text is only tokenized once.
+
+- each schema declares the index (optionally a DatetimeIndex) and the column dtypes
+- float columns can be downcast to float32 to halve memory use
+- the cache stores one memory-mapped .npy file per column plus a small manifest
+- the cache is keyed on the file size, modification time and a content hash,
+  so editing or replacing the csv file transparently triggers a re-parse (the keying,
+  swapping and cleanup of cache entries are shared with Plotly's formatted_columns.py,
+  see file_cache.py in the Numpy folder)
+
+Repeat runs load straight from the .npy files instead of re-parsing the csv text.
+---------------------------------------------------------------------------------------------
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+#the cache bookkeeping shared with the Plotly loaders lives in ../Numpy
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Numpy'))
+import file_cache
+
+#bump this whenever the on-disk cache layout changes
+CACHE_VERSION = 1
+
+#df1.csv - daily DatetimeIndex and four float columns
+DF1_SCHEMA = dict(
+    index_col = 0,
+    parse_dates = True,
+    columns = {'A':'float64', 'B':'float64', 'C':'float64', 'D':'float64'}
+    )
+
+#df2.csv - default RangeIndex and four float columns
+DF2_SCHEMA = dict(
+    index_col = None,
+    parse_dates = False,
+    columns = {'a':'float64', 'b':'float64', 'c':'float64', 'd':'float64'}
+    )
+
+
+def cache_key(path, schema, float32=False, full_hash=False):
+    """Build the cache key for a csv file from its size, mtime, content hash and schema."""
+    return file_cache.cache_key(path, full_hash, version=CACHE_VERSION, schema=schema, float32=float32)
+
+
+def schema_dtypes(schema, float32=False):
+    """Return the column dtypes of a schema, downcasting floats to float32 if requested."""
+    dtypes = {}
+    for column, dtype in schema['columns'].items():
+        if float32 and np.dtype(dtype).kind == 'f':
+            dtype = 'float32'
+        dtypes[column] = dtype
+    return dtypes
+
+
+def parse_csv(path, schema, float32=False):
+    """Parse a csv file according to its schema, without touching the cache."""
+    dtypes = schema_dtypes(schema, float32)
+    frame = pd.read_csv(path,
+        index_col = schema['index_col'],
+        parse_dates = schema['parse_dates'],
+        dtype = dtypes)
+    if schema['parse_dates'] and not isinstance(frame.index, pd.DatetimeIndex):
+        frame.index = pd.to_datetime(frame.index)
+    return frame[list(dtypes)]
+
+
+def write_cache(frame, cache_path):
+    """Write a parsed DataFrame as one .npy file per column plus a json manifest."""
+    parent = os.path.dirname(cache_path)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent)
+
+    manifest = dict(columns=[str(c) for c in frame.columns], index=None, index_name=frame.index.name)
+    if isinstance(frame.index, pd.DatetimeIndex):
+        manifest['index'] = 'datetime'
+        manifest['tz'] = None if frame.index.tz is None else str(frame.index.tz)
+        values = frame.index.tz_localize(None) if frame.index.tz is not None else frame.index
+        np.save(os.path.join(staging, 'index.npy'), values.values.astype('datetime64[ns]').view('i8'))
+    elif not isinstance(frame.index, pd.RangeIndex):
+        manifest['index'] = 'values'
+        np.save(os.path.join(staging, 'index.npy'), frame.index.values)
+
+    for i, column in enumerate(frame.columns):
+        np.save(os.path.join(staging, 'col_%d.npy' % i), np.ascontiguousarray(frame[column].values))
+
+    with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    #swap the finished directory in atomically so readers never see a partial cache
+    file_cache.swap_in(staging, cache_path)
+
+
+def read_cache(cache_path, mmap=True):
+    """Load a cached DataFrame, memory-mapping the column files by default."""
+    with open(os.path.join(cache_path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    mode = 'r' if mmap else None
+
+    data = {}
+    for i, column in enumerate(manifest['columns']):
+        data[column] = np.load(os.path.join(cache_path, 'col_%d.npy' % i), mmap_mode=mode)
+
+    index = None
+    if manifest['index'] == 'datetime':
+        stamps = np.load(os.path.join(cache_path, 'index.npy'), mmap_mode=mode)
+        index = pd.DatetimeIndex(np.asarray(stamps).view('datetime64[ns]'), name=manifest['index_name'])
+        if manifest.get('tz'):
+            index = index.tz_localize(manifest['tz'])
+    elif manifest['index'] == 'values':
+        index = pd.Index(np.load(os.path.join(cache_path, 'index.npy'), allow_pickle=True), name=manifest['index_name'])
+
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def load_csv(path, schema, float32=False, cache_dir=None, full_hash=False):
+    """
+    Load a csv file with a declared schema, going through the binary column cache.
+
+    path      - csv file to read
+    schema    - dict with index_col, parse_dates and a columns -> dtype mapping
+    float32   - downcast float columns to float32
+    cache_dir - where the cache lives, defaults to a .csv_cache folder next to the file
+    full_hash - hash every byte of the file instead of sampled blocks
+    """
+    cache_path = file_cache.cache_entry(path, cache_key(path, schema, float32, full_hash), cache_dir)
+
+    if os.path.isfile(os.path.join(cache_path, 'manifest.json')):
+        return read_cache(cache_path)
+
+    frame = parse_csv(path, schema, float32)
+
+    #drop stale caches of the same file before writing the new one
+    file_cache.drop_stale(cache_path)
+    write_cache(frame, cache_path)
+    return read_cache(cache_path)
@@ -28,13 +28,53 @@ https://matplotlib.org/gallery.html#style_sheets
 ---------------------------------------------------------------------------------------------
 """
 
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+#make the shared NumPy engines in ../Numpy and rendering helpers in ../Matplotlib
+#importable when running from this folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Numpy'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Matplotlib'))
+
+#chunked hexagonal binning engine
+from hexbin_aggregation import HexbinGrid
+
+#one-pass, mergeable histogram accumulator
+from streaming_histogram import StreamingHistogram
+
+#binned, FFT-convolved kernel density estimation
+from binned_kde import plot_kde
+
+#fixed-resolution density canvas for large scatter plots
+from density_canvas import rasterize_frame
+
+#peak-preserving downsampling of long series before drawing
+from downsampling import downsample_frame, ZoomDownsampler
+
+#mergeable quantile sketches for box plots of larger-than-memory data
+from quantile_sketch import sketch_csv, draw_boxplot
+
+#box statistics of every column computed in one vectorized pass
+from box_statistics import box_statistics
+
+#content-addressed cache of rendered figures
+from render_cache import RenderCache
+
+#precompiled styles applied per figure instead of globally
+from style_contexts import get_style, render_styles
+
+#typed loader that keeps a binary column cache of the csv files
+from cached_loader import load_csv, DF1_SCHEMA, DF2_SCHEMA
+
 #read in dataframes from artificially created csv data files
-df1 = pd.read_csv('df1.csv',index_col = 0)
-df2 = pd.read_csv('df2.csv')
+#the first run parses the text, later runs load the cached columns
+#pass float32 = True to halve memory use for large files
+df1 = load_csv('df1.csv', DF1_SCHEMA)
+df2 = load_csv('df2.csv', DF2_SCHEMA)
 
 #print head for each file
 print('DF1:')
@@ -52,10 +92,28 @@ print('\n')
 ---------------------------------------------------------------------------------------------
 Area Plots
 - can take in entire dataframe or individual x,y column arguments
+- downsample_frame keeps the min/max rows of every column per screen pixel, so long
+  series draw quickly without losing their peaks (short frames are returned unchanged)
 ---------------------------------------------------------------------------------------------
 """
 print('Showing Example Area Plot...')
-df2.plot.area(alpha=0.4)
+downsample_frame(df2, n_out=2000, method='minmax').plot.area(alpha=0.4)
+plt.show()
+print('\n')
+
+
+"""
+---------------------------------------------------------------------------------------------
+Line Plots of Long Series
+- df1 is indexed by daily dates, long series like this can hold millions of rows
+- ZoomDownsampler draws a Largest-Triangle-Three-Buckets downsampled line per column,
+  and re-runs the downsampling on the visible range whenever the plot is zoomed
+---------------------------------------------------------------------------------------------
+"""
+print('Showing Example Downsampled Line Plot of DF1...')
+fig, ax = plt.subplots()
+df1_zoom = ZoomDownsampler(ax, df1.index.values, df1.cumsum().values, n_out=250, method='lttb', labels=df1.columns)
+ax.legend()
 plt.show()
 print('\n')
 
@@ -76,10 +134,18 @@ print('\n')
 ---------------------------------------------------------------------------------------------
 Histograms
 - takes in one column of a data set
+- the StreamingHistogram is updated one chunk at a time, so new data only needs
+  to be binned once, and partial histograms from several workers can be merged
+- the 50 bin histogram is kept and reused for the style sheet examples below
 ---------------------------------------------------------------------------------------------
 """
 print('Showing Example Histogram...')
-df1['A'].plot.hist(bins=50)
+column_hist = StreamingHistogram(bins=50, range=(df1['A'].min(), df1['A'].max()))
+for start in range(0, len(df1), 250):
+	column_hist.update(df1['A'].values[start:start + 250])
+fig, ax = plt.subplots()
+column_hist.draw(ax)
+ax.set_ylabel('Frequency')
 plt.show()
 print('\n')
 
@@ -89,6 +155,9 @@ print('\n')
 Scatter Plots
 - takes in individual x and y parameters
 - takes in cmap for color, and s for point size based on column C
+- for large data, rasterize_frame aggregates the points onto a fixed pixel canvas,
+  so draw time and saved file size depend on the resolution, not the number of rows
+- pixels are colored by the point count, or here by the mean of column C
 ---------------------------------------------------------------------------------------------
 """
 print('Showing Example Scatter Plot...')
@@ -96,16 +165,36 @@ df1.plot.scatter(x='A',y='B')
 plt.show()
 print('\n')
 
+print('Showing Example Rasterized Scatter Plot, Colored by Mean of C...')
+scatter_canvas = rasterize_frame(df1, x='A', y='B', c='C', how='mean', width=100, height=100)
+fig, ax = plt.subplots()
+scatter_canvas.draw(ax, cmap='coolwarm', norm='linear')
+ax.set_xlabel('A')
+ax.set_ylabel('B')
+plt.show()
+print('\n')
+
 
 """
 ---------------------------------------------------------------------------------------------
 Box Plots
 - takes in entire data frame
 - can use the by= argument to groupby
+- box_statistics computes the quartiles, whiskers and fliers of all columns at once, which
+  keeps wide frames with thousands of columns fast
+- for data that does not fit in memory, sketch_csv fills one quantile sketch per column
+  while reading the csv in chunks, and the sketches are drawn as a box plot directly
 ---------------------------------------------------------------------------------------------
 """
 print('Showing Example Box Plot...')
-df2.plot.box()
+box_statistics(df2).draw()
+plt.show()
+print('\n')
+
+print('Showing Example Box Plot Built from Quantile Sketches...')
+column_sketches = sketch_csv('df2.csv', k=200, chunksize=5)
+fig, ax = plt.subplots()
+draw_boxplot(ax, column_sketches)
 plt.show()
 print('\n')
 
@@ -115,11 +204,21 @@ print('\n')
 Hexgonal Bin Plots
 - takes in two x and y column parameters
 - in this example we will plot a hex bin for a random data set
+- the HexbinGrid engine bins the data one chunk at a time, so the raw X,Y columns
+  never need to be held in memory at once (e.g. chunks from pd.read_csv(chunksize=...))
+- partial grids over the same extent can be merged, then drawn directly
 ---------------------------------------------------------------------------------------------
 """
 print('Showing Example Hexgonal Bin Plot...')
 rand_df = pd.DataFrame(np.random.randn(500, 2), columns=['X', 'Y'])
-rand_df.plot.hexbin(x='X',y='Y',gridsize=25,cmap='Greens')
+hex_grid = HexbinGrid(extent=(rand_df['X'].min(), rand_df['X'].max(), rand_df['Y'].min(), rand_df['Y'].max()), gridsize=25)
+for start in range(0, len(rand_df), 100):
+	chunk = rand_df.iloc[start:start + 100]
+	hex_grid.update(chunk['X'].values, chunk['Y'].values)
+fig, ax = plt.subplots()
+hex_grid.draw(ax, cmap='Greens')
+ax.set_xlabel('X')
+ax.set_ylabel('Y')
 plt.show()
 print('\n')
 
@@ -129,55 +228,81 @@ print('\n')
 Kernel Density Estimation Plots
 - takes in column of data and estimates kernel density
 - can also take in entire dataframe
+- plot_kde bins the data onto the evaluation grid and convolves it with the kernel
+  using an FFT, so the cost does not grow with samples x grid points
+- every column of a dataframe is estimated in a single call
 ---------------------------------------------------------------------------------------------
 """
 print('Showing Example KDE Plot for Column a, DF2...')
-df2['a'].plot.kde()
+plot_kde(df2['a'])
 plt.show()
 print('\n')
 
 print('Showing Example KDE Plot for DF2...')
-df2.plot.density()
+plot_kde(df2)
 plt.show()
 print('\n')
 
+
+"""
+---------------------------------------------------------------------------------------------
+Render Cache
+- figures saved for reports only need to be redrawn when something they depend on changes
+- the cache key hashes the data, the plot parameters, the library versions and the
+  active rcParams (style), and the stored image is reused when the key is unchanged
+- run the script twice to see the second run reuse the cached image
+---------------------------------------------------------------------------------------------
+"""
+print('Rendering Example Bar Plot through the Render Cache...')
+render_cache = RenderCache('.render_cache')
+bar_path, bar_cached = render_cache.render(lambda: df2.plot.bar(stacked = True).figure, data=df2, params=dict(kind='bar', stacked=True))
+print('Bar plot image:', bar_path, '(reused from cache)' if bar_cached else '(rendered)')
+print('\n')
+
 """
 ---------------------------------------------------------------------------------------------
 Style Sheets with Matplotlib and Pandas
 - Demonstrate 3 different styles that can be used with Pandas
+- the histogram is not rebinned for each style, the 50 bin histogram from above
+  is coarsened to the 10 bins that df1['A'].hist() would use
+- get_style returns a cached, precompiled style that only applies inside its with block,
+  instead of plt.style.use changing the style of every later plot
 ---------------------------------------------------------------------------------------------
 """
+style_hist = column_hist.coarsen(5)
 
 #ggplot
-plt.style.use('ggplot')
 print('ggplot style example...')
-df1['A'].hist()
-plt.show()
+with get_style('ggplot'):
+	fig, ax = plt.subplots()
+	style_hist.draw(ax)
+	ax.grid(True)
+	plt.show()
 print('\n')
 
 #dark_background
-plt.style.use('dark_background')
 print('dark_background style example...')
-df1['A'].hist()
-plt.show()
+with get_style('dark_background'):
+	fig, ax = plt.subplots()
+	style_hist.draw(ax)
+	ax.grid(True)
+	plt.show()
 print('\n')
 
 #fivethirtyeight
-plt.style.use('fivethirtyeight')
 print('fivethirtyeight style example...')
-df1['A'].hist()
-plt.show()
+with get_style('fivethirtyeight'):
+	fig, ax = plt.subplots()
+	style_hist.draw(ax)
+	ax.grid(True)
+	plt.show()
 print('\n')
 
-
-
-
-
-
-
-
-
-
-
-
-
+#the same histogram can also be rendered to images in all three styles from a thread pool,
+#without any style leaking into the global settings
+print('Rendering histogram images in all three styles...')
+with ThreadPoolExecutor(max_workers=3) as pool:
+	style_images = render_styles(lambda fig: style_hist.draw(fig.add_subplot()), ['ggplot','dark_background','fivethirtyeight'], executor=pool)
+for style_name, image in style_images.items():
+	print(style_name, 'image:', len(image), 'bytes')
+print('\n')
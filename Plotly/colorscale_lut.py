@@ -0,0 +1,184 @@
+"""
+Colorscale Lookup Tables
+--------------------------------------------------------------------------------------------------------------------------------
+The maps in plotly_geoplotting_python.py color their regions with named colorscales
+('Portland', 'Rainbow', 'Viridis' with reversescale=True). Turning a value into a color
+means finding its place between the stops of the scale and blending the two colors on
+either side, channel by channel, for every region.
+
+This module does that work once per scale instead of once per region:
+- each colorscale (and its reversed form) is compiled into a fixed-size RGBA table of
+  LUT_SIZE colors, and compiled tables are kept for the rest of the process
+- values are normalized to the table with one of three normalizations:
+  'linear'   - zmin..zmax, as plotly does
+  'log'      - log10(zmin)..log10(zmax), for values spanning orders of magnitude (GDP)
+  'quantile' - the quantile of the value among all values, so every color is used equally
+- a whole array of values becomes colors with one vectorized index computation and a
+  single take from the table; missing (and, for log, non-positive) values get the
+  missing color
+
+Run this file directly to compare the lookup with per-region interpolation:
+    python colorscale_lut.py [--regions 100000]
+--------------------------------------------------------------------------------------------------------------------------------
+"""
+
+import functools
+
+import numpy as np
+
+#colors per table; at 1024 neighbouring rows of any plotly scale differ by at most 2 rgb units
+LUT_SIZE = 1024
+
+NORMALIZATIONS = ('linear', 'log', 'quantile')
+
+#color of missing values, fully transparent
+MISSING_COLOR = (0, 0, 0, 0)
+
+
+def parse_color(color):
+    """Return an (r, g, b, a) tuple of 0-255 ints for a '#rrggbb', 'rgb(...)' or 'rgba(...)' color."""
+    color = color.strip()
+    if color.startswith('#'):
+        digits = color[1:]
+        if len(digits) == 3:
+            digits = ''.join(d * 2 for d in digits)
+        return tuple(int(digits[i:i + 2], 16) for i in (0, 2, 4)) + (255,)
+    if color.startswith('rgb'):
+        parts = [float(p) for p in color[color.index('(') + 1:color.index(')')].split(',')]
+        alpha = int(round(parts[3] * 255)) if len(parts) > 3 else 255
+        return tuple(int(round(p)) for p in parts[:3]) + (alpha,)
+    raise ValueError('cannot parse color %r' % color)
+
+
+def colorscale_stops(colorscale, reversescale=False):
+    """Return (positions, rgba colors) of a named or explicit plotly colorscale."""
+    from plotly.colors import PLOTLY_SCALES, get_colorscale
+    if isinstance(colorscale, str):
+        #plotly.js names first, its Rainbow differs from plotly.express's
+        colorscale = PLOTLY_SCALES.get(colorscale) or get_colorscale(colorscale)
+    positions = np.array([float(stop[0]) for stop in colorscale])
+    colors = np.array([parse_color(stop[1]) for stop in colorscale], dtype='f8')
+    if reversescale:
+        positions, colors = 1.0 - positions[::-1], colors[::-1]
+    return positions, colors
+
+
+class ColorscaleLUT(object):
+    """
+    A colorscale compiled into a table of size colors, plus the missing color in its last row.
+
+    colorscale  - plotly colorscale name, or a list of [position, color] stops
+    reversescale - flip the scale, as the trace property of the same name
+    """
+
+    def __init__(self, colorscale, reversescale=False, size=LUT_SIZE, missing=MISSING_COLOR):
+        self.colorscale = colorscale
+        self.reversescale = reversescale
+        self.size = size
+        positions, colors = colorscale_stops(colorscale, reversescale)
+        grid = np.linspace(0, 1, size)
+        self.table = np.empty((size + 1, 4), dtype=np.uint8)
+        for channel in range(4):
+            self.table[:size, channel] = np.round(np.interp(grid, positions, colors[:, channel]))
+        self.table[size] = missing
+
+    def __repr__(self):
+        return 'ColorscaleLUT(%r, reversescale=%r, size=%d)' % (self.colorscale, self.reversescale, self.size)
+
+    def index(self, z, zmin=None, zmax=None, norm='linear'):
+        """Return the table row of every value, size for missing values."""
+        if norm not in NORMALIZATIONS:
+            raise ValueError('norm must be one of %s, not %r' % (', '.join(NORMALIZATIONS), norm))
+        z = np.asarray(getattr(z, 'values', z), dtype='f8')
+        if norm == 'log':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                z = np.where(z > 0, np.log10(z), np.nan)
+            zmin = np.log10(zmin) if zmin is not None and zmin > 0 else None
+            zmax = np.log10(zmax) if zmax is not None and zmax > 0 else None
+        finite = np.isfinite(z)
+
+        if norm == 'quantile':
+            #one quantile edge between every pair of table rows, so each row gets an equal share
+            #of the values; a search against the edges replaces ranking every value
+            if finite.any():
+                edges = np.quantile(z[finite], np.linspace(0, 1, self.size + 1)[1:-1])
+                rows = np.searchsorted(edges, np.where(finite, z, 0), 'left')
+            else:
+                rows = np.zeros(z.shape, dtype=np.intp)
+        else:
+            if zmin is None:
+                zmin = z[finite].min() if finite.any() else 0.0
+            if zmax is None:
+                zmax = z[finite].max() if finite.any() else 1.0
+            position = (z - zmin) / (zmax - zmin) if zmax > zmin else np.full(z.shape, 0.5)
+            rows = np.clip(np.nan_to_num(position) * (self.size - 1) + 0.5, 0, self.size - 1).astype(np.intp)
+        rows[~finite] = self.size
+        return rows
+
+    def map(self, z, zmin=None, zmax=None, norm='linear'):
+        """Return an (..., 4) uint8 RGBA array with the color of every value."""
+        return self.table[self.index(z, zmin, zmax, norm)]
+
+    def css(self, z, zmin=None, zmax=None, norm='linear'):
+        """Return 'rgba(r,g,b,a)' strings for every value, formatting each table row only once."""
+        strings = np.array(['rgba(%d,%d,%d,%.3g)' % (r, g, b, a / 255.0) for r, g, b, a in self.table.tolist()], dtype=object)
+        return strings[self.index(z, zmin, zmax, norm)]
+
+
+@functools.lru_cache(maxsize=128)
+def _named_lut(colorscale, reversescale, size):
+    return ColorscaleLUT(colorscale, reversescale, size)
+
+
+def get_lut(colorscale, reversescale=False, size=LUT_SIZE):
+    """Return the compiled table of a colorscale; named scales are compiled once per process."""
+    if isinstance(colorscale, str):
+        return _named_lut(colorscale, bool(reversescale), size)
+    return ColorscaleLUT(colorscale, reversescale, size)
+
+
+def precompile(names=None, size=LUT_SIZE):
+    """Compile every plotly.js named scale (or the given names) and its reversed form ahead of time."""
+    if names is None:
+        from plotly.colors import PLOTLY_SCALES
+        names = list(PLOTLY_SCALES)
+    return [get_lut(name, reversescale, size) for name in names for reversescale in (False, True)]
+
+
+def map_colors(z, colorscale, reversescale=False, zmin=None, zmax=None, norm='linear'):
+    """RGBA colors of z on a colorscale, see ColorscaleLUT.map."""
+    return get_lut(colorscale, reversescale).map(z, zmin, zmax, norm)
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Compare the colorscale lookup with per-region interpolation.')
+    parser.add_argument('--regions', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    z = np.random.default_rng(0).lognormal(3, 2, args.regions)
+
+    def interpolate(z):
+        positions, colors = colorscale_stops('Viridis', True)
+        t = (z - z.min()) / (z.max() - z.min())
+        return np.stack([np.round(np.interp(t, positions, colors[:, c])) for c in range(4)], axis=-1).astype(np.uint8)
+
+    def best(func):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return min(times) * 1000
+
+    start = time.perf_counter()
+    precompile()
+    print('compiled %d tables in %.1f ms' % (len(precompile()), (time.perf_counter() - start) * 1000))
+    print('%d regions' % args.regions)
+    print('  interpolation      %8.2f ms' % best(lambda: interpolate(z)))
+    for norm in NORMALIZATIONS:
+        print('  lookup (%-8s)   %8.2f ms' % (norm, best(lambda: map_colors(z, 'Viridis', True, norm=norm))))
+    print('  largest difference %d rgb units' % np.abs(interpolate(z).astype(int) - map_colors(z, 'Viridis', True).astype(int)).max())
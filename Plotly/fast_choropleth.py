@@ -0,0 +1,253 @@
+"""
+Fast Path for Building Choropleth Figures
+--------------------------------------------------------------------------------------------------------------------------------
+go.Figure(data=[...], layout=...) runs Plotly's property validators over every element of
+every trace, and then serializes the validated object tree to JSON. For county-level maps
+with tens of thousands of locations, z values and text labels, this is the slowest step.
+
+This module builds the same figure JSON directly from NumPy/pandas columns for trusted
+input (dictionaries written like the ones in plotly_geoplotting_python.py):
+- plotly.io's default template goes into layout.template unless the layout names its own,
+  as go.Figure does; it is converted to JSON-ready data once per process
+- numeric arrays are emitted as base64 typed arrays ({"dtype": "f8", "bdata": ...}),
+  which plotly.js (2.28+) decodes without parsing one number at a time
+- string arrays are emitted as plain JSON lists
+- string titles are wrapped as {"text": ...}, the one normalization plotly.js needs
+- serialization uses orjson when it is installed, and the standard json module otherwise
+
+Nothing is validated: a misspelled property is silently ignored by plotly.js instead of
+raising an error, so use go.Figure while developing a map and this path in production.
+
+Run this file directly to benchmark both paths on the five maps of the script:
+    python fast_choropleth.py [--scale ROWS]
+--------------------------------------------------------------------------------------------------------------------------------
+"""
+
+import base64
+import functools
+import json
+import os
+import webbrowser
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+#numpy dtypes that plotly.js can decode from base64 typed arrays
+TYPED_ARRAY_DTYPES = {'f8': 'f8', 'f4': 'f4', 'i4': 'i4', 'u4': 'u4', 'i2': 'i2', 'u2': 'u2', 'i1': 'i1', 'u1': 'u1'}
+
+#plotly.js bundle used when the figure html references the CDN
+PLOTLYJS_CDN = 'https://cdn.plot.ly/plotly-%s.min.js'
+DEFAULT_PLOTLYJS_VERSION = '2.35.2'
+
+#keys whose plain string values plotly.js expects wrapped as {"text": ...}
+TITLE_KEYS = ('title',)
+
+
+def encode_array(values, typed_arrays=True):
+    """Return a JSON-ready version of a column: a typed array for numbers, a list otherwise."""
+    values = np.asarray(getattr(values, 'values', values))
+    if values.dtype.kind in 'iuf' and typed_arrays:
+        if values.dtype.kind in 'iu' and values.dtype.itemsize > 4:
+            info = np.iinfo('i4')
+            fits = values.size == 0 or (values.min() >= info.min and values.max() <= info.max)
+            values = values.astype('i4' if fits else 'f8')
+        code = values.dtype.str.lstrip('<>=|')
+        if code not in TYPED_ARRAY_DTYPES:
+            values, code = values.astype('f8'), 'f8'
+        data = dict(dtype=code, bdata=base64.b64encode(np.ascontiguousarray(values).astype(values.dtype.newbyteorder('<'))).decode('ascii'))
+        if values.ndim > 1:
+            data['shape'] = ','.join(str(n) for n in values.shape)
+        return data
+    if values.dtype.kind in 'fO':
+        #NaN is not valid JSON, plotly.js treats null as a missing value
+        return [None if v != v else v for v in values.tolist()]
+    return values.tolist()
+
+
+def prepare(value, typed_arrays=True):
+    """Recursively convert a trace or layout specification into JSON-ready objects."""
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key in TITLE_KEYS and isinstance(item, str):
+                item = {'text': item}
+            result[key] = prepare(item, typed_arrays)
+        return result
+    if isinstance(value, np.ndarray) or hasattr(value, 'dtype') and hasattr(value, 'values'):
+        return encode_array(value, typed_arrays)
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value):
+            return encode_array(np.asarray(value), typed_arrays)
+        return [prepare(v, typed_arrays) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+@functools.lru_cache(maxsize=8)
+def template_json(name):
+    """Return a plotly.io template, by name, as JSON-ready data."""
+    import plotly.io as pio
+    return pio.templates[name].to_plotly_json()
+
+
+def default_template():
+    """Return plotly.io's default template as JSON-ready data, or None without plotly or a default."""
+    try:
+        import plotly.io as pio
+    except ImportError:
+        return None
+    name = pio.templates.default
+    return template_json(name) if name else None
+
+
+def fast_figure(data, layout=None, typed_arrays=True):
+    """
+    Build a figure dictionary from trusted trace and layout dictionaries, without validation.
+
+    data         - list of trace dictionaries, as passed to go.Figure(data=...)
+    layout       - layout dictionary, as passed to go.Figure(layout=...)
+    typed_arrays - emit numeric columns as base64 typed arrays (needs plotly.js 2.28+)
+    """
+    layout = prepare(layout or {}, typed_arrays)
+    if 'template' not in layout:
+        template = default_template()
+        if template is not None:
+            #shared by every figure, the template is only read when serializing
+            layout['template'] = template
+    return dict(data=[prepare(trace, typed_arrays) for trace in data], layout=layout)
+
+
+def figure_json(figure):
+    """Serialize a figure dictionary to a JSON string."""
+    if orjson is not None:
+        return orjson.dumps(figure, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+    return json.dumps(figure, separators=(',', ':'), default=lambda o: o.tolist() if hasattr(o, 'tolist') else str(o))
+
+
+def plotlyjs_version():
+    """Return the plotly.js version bundled with the installed plotly package, if any."""
+    try:
+        from plotly.offline import get_plotlyjs_version
+        return get_plotlyjs_version()
+    except ImportError:
+        return DEFAULT_PLOTLYJS_VERSION
+
+
+def plotlyjs_script(include_plotlyjs='cdn'):
+    """Return the <script> tag that loads plotly.js: from the CDN, inline, or a given path."""
+    if include_plotlyjs == 'cdn':
+        return '<script src="%s" charset="utf-8"></script>' % (PLOTLYJS_CDN % plotlyjs_version())
+    if include_plotlyjs is True:
+        from plotly.offline import get_plotlyjs
+        return '<script type="text/javascript">%s</script>' % get_plotlyjs()
+    if include_plotlyjs:
+        return '<script src="%s" charset="utf-8"></script>' % include_plotlyjs
+    return ''
+
+
+def figure_html(figure, include_plotlyjs='cdn', div_id='plot'):
+    """Return a standalone html page that draws a figure dictionary."""
+    return '\n'.join([
+        '<html>',
+        '<head><meta charset="utf-8" /></head>',
+        '<body>',
+        plotlyjs_script(include_plotlyjs),
+        '<div id="%s" style="height:100%%;width:100%%;"></div>' % div_id,
+        '<script type="text/javascript">',
+        'var figure = %s;' % figure_json(figure),
+        'Plotly.newPlot("%s", figure.data, figure.layout, {responsive: true});' % div_id,
+        '</script>',
+        '</body>',
+        '</html>'])
+
+
+def write_html(figure, filename='temp-plot.html', include_plotlyjs='cdn', auto_open=False):
+    """Write a figure dictionary to an html file, optionally opening it in the browser."""
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(figure_html(figure, include_plotlyjs))
+    if auto_open:
+        webbrowser.open('file://' + os.path.abspath(filename))
+    return filename
+
+
+def script_maps(scale=None):
+    """
+    Return (name, data, layout) for the five maps of plotly_geoplotting_python.py.
+    With scale, every table is repeated up to that many rows to mimic county-level maps.
+    """
+    import pandas as pd
+
+    folder = os.path.dirname(os.path.abspath(__file__))
+
+    def read(name):
+        frame = pd.read_csv(os.path.join(folder, name))
+        if scale:
+            frame = frame.iloc[np.arange(scale) % len(frame)].reset_index(drop=True)
+        return frame
+
+    agri = read('2011_US_AGRI_Exports.csv')
+    gdp = read('2014_World_GDP.csv')
+    power = read('2014_World_Power_Consumption.csv')
+    election = read('2012_Election_Data.csv')
+    usa_lakes = dict(scope='usa', showlakes=True, lakecolor='rgb(85,173,240)')
+    return [
+        ('simple us map',
+            [dict(type='choropleth', locations=['CA','NY','CO'], locationmode='USA-states', colorscale='Portland',
+                text=['Sunshine State','Never Sleeps','Mile High'], z=[1,2,3], colorbar={'title':'State Z Value'})],
+            dict(geo={'scope':'usa'})),
+        ('agriculture exports',
+            [dict(type='choropleth', colorscale='Rainbow', locations=agri['code'], z=agri['total exports'],
+                locationmode='USA-states', text=agri['text'], colorbar={'title':'Millions USD'})],
+            dict(title='2011 US Agriculture Exports by State', geo=usa_lakes)),
+        ('world gdp',
+            [dict(type='choropleth', locations=gdp['CODE'], z=gdp['GDP (BILLIONS)'], text=gdp['COUNTRY'],
+                colorbar={'title':'GDP Billions US'})],
+            dict(title='2014 World GDP', geo=dict(showframe=True, projection={'type':'mercator'}))),
+        ('power consumption',
+            [dict(type='choropleth', colorscale='Viridis', reversescale=True, locations=power['Country'],
+                locationmode='country names', z=power['Power Consumption KWH'], text=power['Country'],
+                colorbar={'title':'Power Consumption in KWH'})],
+            dict(title='2014 Power Consumption in KWH', geo=dict(showframe=False, projection={'type':'mercator'}))),
+        ('election',
+            [dict(type='choropleth', colorscale='Viridis', reversescale=True, locations=election['State Abv'],
+                z=election['Voting-Age Population (VAP)'], locationmode='USA-states', text=election['State'],
+                marker=dict(line=dict(color='rgb(255,255,255)', width=1)),
+                colorbar={'title':'Voting-Age Population (VAP)'})],
+            dict(title='2012 Election Voting Data', geo=usa_lakes)),
+        ]
+
+
+def benchmark(scale=None, repeat=5):
+    """Time go.Figure(...).to_json() against fast_figure + figure_json for the script's maps."""
+    import time
+    import plotly.graph_objs as go
+
+    def best(func):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    print('%-22s %8s %14s %14s %9s' % ('map', 'rows', 'go.Figure', 'fast path', 'speedup'))
+    for name, data, layout in script_maps(scale):
+        rows = len(data[0]['locations'])
+        slow = best(lambda: go.Figure(data=data, layout=layout).to_json())
+        fast = best(lambda: figure_json(fast_figure(data, layout)))
+        print('%-22s %8d %12.2fms %12.2fms %8.1fx' % (name, rows, slow * 1e3, fast * 1e3, slow / fast))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark go.Figure against the fast choropleth path.')
+    parser.add_argument('--scale', type=int, default=None, help='repeat each table to this many rows')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    benchmark(args.scale, args.repeat)
@@ -0,0 +1,191 @@
+"""
+Vectorized Loader for Formatted Numeric Columns
+--------------------------------------------------------------------------------------------------------------------------------
+Several of the csv files in this folder store numbers the way a spreadsheet displays them,
+e.g. "2,074,338" or "58.6%", so pandas reads those columns as strings and they cannot be
+used as the z values of a map.
+
+This module declares the kind of every column in a schema and converts each column in one
+vectorized pass instead of parsing values one at a time:
+- 'integer'  - thousands-separated integers ("2,074,338"), parsed by read_csv itself
+- 'float'    - thousands-separated decimals ("1,234.5")
+- 'percent'  - percentages ("58.6%"), kept in percent points (58.6) unless fraction=True
+- 'currency' - amounts with a currency symbol and separators ("$1,234.50", "(12.00)")
+- 'string'   - text columns, left as they are
+
+Empty cells become NaN, so integer columns with missing values are returned as float64.
+The typed result is cached on disk (keyed on the file size, mtime, contents and schema),
+so repeat loads of large precinct-level files skip parsing entirely; the cache entries are
+keyed, swapped in and cleaned up by file_cache.py in the Numpy folder, as the Pandas
+loader's are.
+--------------------------------------------------------------------------------------------------------------------------------
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+#the cache bookkeeping shared with the Pandas loader lives in ../Numpy
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Numpy'))
+import file_cache
+
+#bump this whenever the on-disk cache layout changes
+CACHE_VERSION = 1
+
+COLUMN_KINDS = ('integer', 'float', 'percent', 'currency', 'string')
+
+#characters removed from currency values before conversion
+CURRENCY_CHARACTERS = '$€£¥,'
+
+#2012_Election_Data.csv - every column declared, so every column can be mapped
+ELECTION_SCHEMA = dict(
+    columns = {
+        'Year':'integer',
+        'ICPSR State Code':'integer',
+        'Alphanumeric State Code':'integer',
+        'State':'string',
+        'VEP Total Ballots Counted':'percent',
+        'VEP Highest Office':'percent',
+        'VAP Highest Office':'percent',
+        'Total Ballots Counted':'integer',
+        'Highest Office':'integer',
+        'Voting-Eligible Population (VEP)':'integer',
+        'Voting-Age Population (VAP)':'float',
+        '% Non-citizen':'percent',
+        'Prison':'integer',
+        'Probation':'integer',
+        'Parole':'integer',
+        'Total Ineligible Felon':'integer',
+        'State Abv':'string'
+        }
+    )
+
+
+def check_schema(schema):
+    for column, kind in schema['columns'].items():
+        if kind not in COLUMN_KINDS:
+            raise ValueError('column %r has unknown kind %r, expected one of %s' % (column, kind, ', '.join(COLUMN_KINDS)))
+
+
+def infer_kinds(path, nrows=1000):
+    """Guess a column kind for every column from the first rows of a csv file."""
+    sample = pd.read_csv(path, nrows=nrows, dtype=str, keep_default_na=False)
+    kinds = {}
+    for column in sample.columns:
+        values = sample[column].str.strip()
+        values = values[values != '']
+        if values.empty:
+            kinds[column] = 'float'
+        elif values.str.fullmatch(r'-?[\d,]*\.?\d+\s*%').all():
+            kinds[column] = 'percent'
+        elif values.str.fullmatch(r'\(?-?[$€£¥]?\s*-?[\d,]*\.?\d+\)?').all() and values.str.contains(r'[$€£¥]').any():
+            kinds[column] = 'currency'
+        elif values.str.fullmatch(r'-?\d{1,3}(,\d{3})*|-?\d+').all():
+            kinds[column] = 'integer'
+        elif values.str.fullmatch(r'-?[\d,]*\.?\d+([eE][-+]?\d+)?').all():
+            kinds[column] = 'float'
+        else:
+            kinds[column] = 'string'
+    return dict(columns=kinds)
+
+
+def to_number(values, characters):
+    """Remove the given characters from a string column and convert it to float64."""
+    for character in characters:
+        values = values.str.replace(character, '', regex=False)
+    return values.str.strip().replace('', None).astype('float64')
+
+
+def parse_formatted_csv(path, schema, fraction=False):
+    """Parse a csv file according to its column kinds, without touching the cache."""
+    check_schema(schema)
+    kinds = schema['columns']
+    numeric = [c for c, kind in kinds.items() if kind in ('integer', 'float')]
+    formatted = [c for c, kind in kinds.items() if kind in ('percent', 'currency', 'string')]
+
+    #read_csv strips the thousands separators of the plain numeric columns while tokenizing
+    dtypes = dict((c, 'float64') for c in numeric)
+    dtypes.update((c, str) for c in formatted)
+    frame = pd.read_csv(path, usecols=list(kinds), dtype=dtypes, thousands=',')
+
+    for column in numeric:
+        values = frame[column]
+        if kinds[column] == 'integer' and not values.isna().any():
+            frame[column] = values.astype('int64')
+    for column in formatted:
+        if kinds[column] == 'percent':
+            values = to_number(frame[column].str.rstrip('%'), ',')
+            frame[column] = values / 100.0 if fraction else values
+        elif kinds[column] == 'currency':
+            #accounting style negatives are written in parentheses
+            negative = frame[column].str.startswith('(', na=False).to_numpy()
+            values = to_number(frame[column], CURRENCY_CHARACTERS + '()')
+            frame[column] = np.where(negative, -values.abs(), values)
+    return frame[list(kinds)]
+
+
+def cache_key(path, schema, fraction=False):
+    """Build the cache key for a csv file from its size, mtime, content hash and schema."""
+    return file_cache.cache_key(path, version=CACHE_VERSION, schema=schema, fraction=fraction)
+
+
+def write_cache(frame, cache_path):
+    """Save a typed frame as a .npz archive: numbers as-is, text as codes into its unique values."""
+    arrays = {}
+    for i, column in enumerate(frame.columns):
+        values = frame[column]
+        if values.dtype.kind in 'iuf':
+            arrays['col_%d' % i] = values.to_numpy()
+        else:
+            #text columns repeat a few values (states, counties), so store each one once
+            codes, uniques = pd.factorize(values)
+            arrays['col_%d' % i] = codes
+            arrays['uniques_%d' % i] = np.asarray(uniques, dtype='U')
+    arrays['columns'] = np.array([str(c) for c in frame.columns])
+
+    handle, staging = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix='.npz')
+    os.close(handle)
+    np.savez(staging, **arrays)
+    file_cache.swap_in(staging, cache_path)
+
+
+def read_cache(cache_path):
+    """Load a frame written by write_cache."""
+    with np.load(cache_path, allow_pickle=False) as archive:
+        data = {}
+        for i, column in enumerate(archive['columns'].tolist()):
+            values = archive['col_%d' % i]
+            if 'uniques_%d' % i in archive:
+                values = pd.array(archive['uniques_%d' % i], dtype=str).take(values, allow_fill=True)
+            data[column] = values
+    return pd.DataFrame(data)
+
+
+def load_formatted_csv(path, schema=None, fraction=False, cache_dir=None):
+    """
+    Load a csv file with formatted numeric columns as typed columns, through a disk cache.
+
+    path      - csv file to read
+    schema    - dict with a columns -> kind mapping, inferred from the file when None
+    fraction  - return percent columns as fractions (0.586) instead of percent points (58.6)
+    cache_dir - where the cache lives, defaults to a .csv_cache folder next to the file
+    """
+    path = os.path.abspath(path)
+    if schema is None:
+        schema = infer_kinds(path)
+    check_schema(schema)
+    cache_path = file_cache.cache_entry(path, cache_key(path, schema, fraction), cache_dir, '.npz')
+
+    if os.path.isfile(cache_path):
+        return read_cache(cache_path)
+
+    frame = parse_formatted_csv(path, schema, fraction)
+
+    #drop stale caches of the same file before writing the new one
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    file_cache.drop_stale(cache_path)
+    write_cache(frame, cache_path)
+    return frame
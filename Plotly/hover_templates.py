@@ -0,0 +1,128 @@
+"""
+Vectorized Hover-Text Templates
+--------------------------------------------------------------------------------------------------------------------------------
+The hover text of a map is usually built one row at a time, e.g.
+    text = [f"{row.state}<br>Beef {row.beef} Dairy {row.dairy}" for row in frame.itertuples()]
+which means one Python format call per region, and the labels ("Beef", "Dairy") are
+repeated in the payload for every region.
+
+HoverTemplate compiles a template written in the same {column:format} syntax once, and
+offers two ways to use it:
+- render(frame) builds the text column with whole-column operations: each field is
+  factorized and only its distinct values are formatted, then every row is assembled
+  with a single join of its pieces (no per-row format calls)
+- plotly(frame) returns hovertemplate + customdata for the trace instead, so the labels
+  are sent once in the template and only the values travel per region, formatted by
+  plotly.js in the browser (its d3-format specs match Python's for , .Nf d and %)
+
+Fields named location, z or text that are not columns of the frame refer to the trace's
+own values, and are not copied into customdata.
+--------------------------------------------------------------------------------------------------------------------------------
+"""
+
+import functools
+import itertools
+import re
+
+import numpy as np
+import pandas as pd
+
+#{column} or {column:format}; column names may contain spaces, e.g. {total fruits:.1f}
+FIELD_PATTERN = re.compile(r'\{([^{}:]+)(?::([^{}]*))?\}')
+
+#trace attributes that plotly.js can put in a hovertemplate without customdata
+TRACE_FIELDS = ('location', 'z', 'text')
+
+
+def format_column(values, spec='', missing=''):
+    """
+    Format a whole column with a Python format spec and return an array of strings.
+
+    The column is factorized first, so format() runs once per distinct value and the
+    rows are filled in with one take; missing values become the missing string.
+    """
+    codes, uniques = pd.factorize(pd.Series(getattr(values, 'values', values)), use_na_sentinel=True)
+    table = np.array([format(value, spec) for value in np.asarray(uniques).tolist()] + [missing], dtype=str)
+    return table[codes]
+
+
+class HoverTemplate(object):
+    """
+    A hover-text template over column names, compiled once.
+
+    template - text with {column} or {column:format} fields, e.g.
+               '{state}<br>Beef {beef:.1f} Dairy {dairy:.1f}'
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self.literals = []
+        self.fields = []
+        position = 0
+        for match in FIELD_PATTERN.finditer(template):
+            self.literals.append(template[position:match.start()])
+            self.fields.append((match.group(1), match.group(2) or ''))
+            position = match.end()
+        self.literals.append(template[position:])
+
+    def __repr__(self):
+        return 'HoverTemplate(%r)' % self.template
+
+    def columns(self, frame):
+        """Return the field names that are columns of frame (not trace attributes)."""
+        names = []
+        for name, spec in self.fields:
+            if name not in names and (name in frame or name not in TRACE_FIELDS):
+                names.append(name)
+        return names
+
+    def render(self, frame, missing=''):
+        """Return the filled-in template for every row of frame as an array of strings."""
+        parts = [itertools.repeat(self.literals[0])]
+        for (name, spec), literal in zip(self.fields, self.literals[1:]):
+            if name not in frame:
+                raise KeyError('template field %r is not a column of the frame' % name)
+            parts.append(format_column(frame[name], spec, missing).tolist())
+            parts.append(itertools.repeat(literal))
+        #one C-level join per row moves less memory than repeated whole-column string adds
+        return np.array(list(map(''.join, zip(*parts))), dtype=object)
+
+    def plotly(self, frame, extra=''):
+        """
+        Return trace properties (hovertemplate, customdata) that show this template.
+
+        extra - text of the secondary hover box, '' hides it as in most maps
+        """
+        names = self.columns(frame)
+        pieces = [self.literals[0]]
+        for (name, spec), literal in zip(self.fields, self.literals[1:]):
+            variable = name if name not in names else 'customdata[%d]' % names.index(name)
+            pieces.append('%%{%s%s}' % (variable, ':' + spec if spec else ''))
+            pieces.append(literal)
+        properties = dict(hovertemplate=''.join(pieces) + '<extra>%s</extra>' % extra)
+        if names:
+            columns = [np.asarray(getattr(frame[name], 'values', frame[name])) for name in names]
+            if all(column.dtype.kind in 'iuf' for column in columns):
+                #a numeric 2d array is sent as one binary typed array
+                properties['customdata'] = np.column_stack(columns).astype('f8')
+            else:
+                customdata = np.column_stack([column.astype(object) for column in columns])
+                customdata[pd.isna(customdata)] = None
+                properties['customdata'] = customdata.tolist()
+        return properties
+
+
+@functools.lru_cache(maxsize=256)
+def compile_template(template):
+    """Return the cached HoverTemplate for a template string."""
+    return HoverTemplate(template)
+
+
+def render_text(frame, template, missing=''):
+    """Vectorized text column for a template, see HoverTemplate.render."""
+    return compile_template(template).render(frame, missing)
+
+
+def hover_properties(frame, template, extra=''):
+    """hovertemplate/customdata trace properties for a template, see HoverTemplate.plotly."""
+    return compile_template(template).plotly(frame, extra)
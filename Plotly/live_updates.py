@@ -0,0 +1,332 @@
+"""
+Delta Updates for Live Choropleth Maps
+--------------------------------------------------------------------------------------------------------------------------------
+When the numbers behind a map change, calling plot() again re-serializes the whole figure
+(locations, colorbar, layout and every value) and reloads a multi-MB html page.
+
+LiveMap keeps the current z/text arrays of a map and, on update(), sends only what changed:
+- the new arrays are compared with the previous ones in one vectorized pass (NaN aware),
+  and a JSON patch lists just the changed positions and their new values
+- an array whose length changes is sent whole, as a replacement
+- patches are pushed to every open page over server-sent events (SSE), served by the
+  standard library http.server, no extra packages needed
+- the page applies a patch to its local copy of the arrays and calls Plotly.restyle, so
+  the geometry and layout are never sent or redrawn from scratch
+- each patch carries a version number; a page that falls behind or reconnects is sent a
+  full snapshot first, so it can never show a half-applied state
+
+Run this file directly for a demo that changes random states of the election map:
+    python live_updates.py [--port 8050] [--interval 1.0] [--changes 5]
+--------------------------------------------------------------------------------------------------------------------------------
+"""
+
+import gzip
+import json
+import queue
+import threading
+import webbrowser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from fast_choropleth import encode_array, fast_figure, figure_json
+
+#trace properties that update() diffs and patches
+PATCH_KEYS = ('z', 'text')
+
+#patches a slow page may fall behind by before it is sent a fresh snapshot instead
+MAX_PENDING = 256
+
+#seconds between keep-alive comments on an idle event stream
+KEEPALIVE = 15.0
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8" /><title>%(title)s</title></head>
+<body style="font-family:sans-serif;">
+<script src="/plotly.min.js" charset="utf-8"></script>
+<div id="map" style="height:90vh;"></div>
+<div id="status" style="color:#888;"></div>
+<script type="text/javascript">
+var gd = document.getElementById('map'), version = -1, state = [];
+var TYPED = {f8: Float64Array, f4: Float32Array, i4: Int32Array, u4: Uint32Array,
+             i2: Int16Array, u2: Uint16Array, i1: Int8Array, u1: Uint8Array};
+function copy(values) { return values && values.slice ? values.slice() : values; }
+function decode(values) {
+    if (!values || !values.bdata) { return copy(values); }
+    var bytes = Uint8Array.from(atob(values.bdata), function (c) { return c.charCodeAt(0); });
+    return new TYPED[values.dtype](bytes.buffer);
+}
+var events = new EventSource('/events');
+events.addEventListener('reset', function (message) {
+    var snapshot = JSON.parse(message.data);
+    version = snapshot.version;
+    state = snapshot.figure.data.map(function (trace) {
+        var arrays = {};
+        %(keys)s.forEach(function (key) { arrays[key] = decode(trace[key]); });
+        return arrays;
+    });
+    Plotly.react(gd, snapshot.figure.data, snapshot.figure.layout || {}, {responsive: true});
+});
+events.onmessage = function (message) {
+    var patch = JSON.parse(message.data);
+    if (patch.version <= version) { return; }
+    var update = {}, arrays = state[patch.trace];
+    Object.keys(patch.changes).forEach(function (key) {
+        var change = patch.changes[key];
+        if (change.replace) {
+            arrays[key] = change.replace;
+        } else {
+            //typed arrays would store null as 0, missing numbers are NaN instead
+            var missing = ArrayBuffer.isView(arrays[key]) ? NaN : null;
+            for (var i = 0; i < change.index.length; i++) {
+                var value = change.values[i];
+                arrays[key][change.index[i]] = value === null ? missing : value;
+            }
+        }
+        update[key] = [copy(arrays[key])];
+    });
+    version = patch.version;
+    Plotly.restyle(gd, update, [patch.trace]);
+    document.getElementById('status').textContent = 'version ' + version + ', ' + message.data.length + ' bytes';
+};
+</script>
+</body>
+</html>
+"""
+
+
+def as_array(values):
+    return np.asarray(getattr(values, 'values', values))
+
+
+def changed_positions(old, new):
+    """Return the positions where two equally long arrays differ, treating NaN == NaN."""
+    if old.dtype.kind in 'iufb' and new.dtype.kind in 'iufb':
+        same = (old == new) | (np.isnan(old.astype('f8')) & np.isnan(new.astype('f8')))
+    else:
+        same = (old == new) | (pd.isna(old) & pd.isna(new))
+    return np.flatnonzero(~same)
+
+
+def diff_arrays(old, new):
+    """
+    Return the JSON-ready change from old to new: None if nothing changed,
+    {'index': [...], 'values': [...]} for changed positions, or {'replace': [...]}.
+    """
+    old, new = as_array(old), as_array(new)
+    if old.shape != new.shape:
+        return dict(replace=encode_array(new, typed_arrays=False))
+    index = changed_positions(old, new)
+    if not len(index):
+        return None
+    return dict(index=index.tolist(), values=encode_array(new[index], typed_arrays=False))
+
+
+class Subscriber(object):
+    """One open event stream: a bounded queue of pending messages."""
+
+    def __init__(self):
+        self.queue = queue.Queue(MAX_PENDING)
+        self.stale = False
+
+
+class LiveMap(object):
+    """
+    A map whose trace arrays can be updated in place on every open page.
+
+    data   - list of trace dictionaries, as passed to fast_figure / go.Figure
+    layout - layout dictionary
+    keys   - trace properties that update() accepts
+    """
+
+    def __init__(self, data, layout=None, keys=PATCH_KEYS, title='Live Map'):
+        self.data = [dict(trace) for trace in data]
+        self.layout = layout or {}
+        self.keys = tuple(keys)
+        self.title = title
+        self.version = 0
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.server = None
+        for trace in self.data:
+            for key in self.keys:
+                if key in trace:
+                    trace[key] = as_array(trace[key])
+
+    def snapshot(self):
+        """Return the current full figure and version as a JSON string."""
+        return figure_json(dict(version=self.version, figure=fast_figure(self.data, self.layout)))
+
+    def update(self, trace=0, **arrays):
+        """
+        Replace some of the arrays of one trace, e.g. update(z=new_values), and push the
+        changes to every open page. Returns the patch that was sent, or None if nothing changed.
+        """
+        unknown = set(arrays) - set(self.keys)
+        if unknown:
+            raise ValueError('cannot update %s, LiveMap was created with keys=%r' % (', '.join(sorted(unknown)), self.keys))
+        with self.lock:
+            changes = {}
+            for key, values in arrays.items():
+                #copied, so a caller changing its array in place cannot change the stored state
+                values = as_array(values).copy()
+                change = diff_arrays(self.data[trace][key], values) if key in self.data[trace] else dict(replace=encode_array(values, typed_arrays=False))
+                if change is not None:
+                    changes[key] = change
+                self.data[trace][key] = values
+            if not changes:
+                return None
+            self.version += 1
+            patch = dict(version=self.version, trace=trace, changes=changes)
+            self.broadcast('data: %s\n\n' % figure_json(patch))
+        return patch
+
+    def broadcast(self, message):
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                #the page fell too far behind, drop it so it reconnects and gets a snapshot
+                subscriber.stale = True
+                self.subscribers.discard(subscriber)
+
+    def subscribe(self):
+        """Register a new event stream and return it with the snapshot it must start from."""
+        with self.lock:
+            subscriber = Subscriber()
+            self.subscribers.add(subscriber)
+            return subscriber, self.snapshot()
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def serve(self, host='127.0.0.1', port=8050, open_browser=False):
+        """Start serving the page and event stream on a background thread, and return the url."""
+        self.server = ThreadingHTTPServer((host, port), make_handler(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        url = 'http://%s:%d/' % (host, self.server.server_address[1])
+        if open_browser:
+            webbrowser.open(url)
+        return url
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+_plotlyjs = {}
+
+
+def plotlyjs_bytes():
+    """Return plotly.js as (raw, gzipped) bytes, read and compressed once per process."""
+    if not _plotlyjs:
+        from plotly.offline import get_plotlyjs
+        raw = get_plotlyjs().encode('utf-8')
+        _plotlyjs['raw'], _plotlyjs['gzip'] = raw, gzip.compress(raw, 6)
+    return _plotlyjs['raw'], _plotlyjs['gzip']
+
+
+def make_handler(live_map):
+    """Return a request handler class serving one LiveMap."""
+
+    class LiveMapHandler(BaseHTTPRequestHandler):
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_body(self, body, content_type, encoding=None):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/':
+                page = PAGE % dict(title=live_map.title, keys=json.dumps(list(live_map.keys)))
+                self.send_body(page.encode('utf-8'), 'text/html; charset=utf-8')
+            elif self.path == '/plotly.min.js':
+                raw, compressed = plotlyjs_bytes()
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    self.send_body(compressed, 'application/javascript', 'gzip')
+                else:
+                    self.send_body(raw, 'application/javascript')
+            elif self.path == '/events':
+                self.stream()
+            else:
+                self.send_error(404)
+
+        def stream(self):
+            subscriber, snapshot = live_map.subscribe()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            try:
+                self.wfile.write(('event: reset\ndata: %s\n\n' % snapshot).encode('utf-8'))
+                self.wfile.flush()
+                while not subscriber.stale and live_map.server is not None:
+                    try:
+                        message = subscriber.queue.get(timeout=KEEPALIVE)
+                    except queue.Empty:
+                        message = ': keep-alive\n\n'
+                    self.wfile.write(message.encode('utf-8'))
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                live_map.unsubscribe(subscriber)
+
+    return LiveMapHandler
+
+
+def demo(port=8050, interval=1.0, changes=5, rounds=None):
+    """Serve the election map and change the voting-age population of a few states at a time."""
+    import os
+    import time
+
+    folder = os.path.dirname(os.path.abspath(__file__))
+    election = pd.read_csv(os.path.join(folder, '2012_Election_Data.csv'))
+    data = [dict(type='choropleth', colorscale='Viridis', reversescale=True, locations=election['State Abv'],
+        z=election['Voting-Age Population (VAP)'], locationmode='USA-states', text=election['State'],
+        marker=dict(line=dict(color='rgb(255,255,255)', width=1)), colorbar={'title':'Voting-Age Population (VAP)'})]
+    layout = dict(title='2012 Election Voting Data (live)', geo=dict(scope='usa', showlakes=True, lakecolor='rgb(85,173,240)'))
+
+    live_map = LiveMap(data, layout, title='Live Election Map')
+    url = live_map.serve(port=port, open_browser=True)
+    print('Serving %s, full snapshot is %d bytes (press Ctrl+C to stop)' % (url, len(live_map.snapshot())))
+
+    rng = np.random.default_rng()
+    z = live_map.data[0]['z'].copy()
+    round_number = 0
+    try:
+        while rounds is None or round_number < rounds:
+            time.sleep(interval)
+            states = rng.choice(len(z), size=min(changes, len(z)), replace=False)
+            z[states] *= rng.uniform(0.9, 1.1, size=len(states))
+            patch = live_map.update(z=z)
+            round_number += 1
+            print('version %d: %d bytes' % (patch['version'], len(figure_json(patch))))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        live_map.shutdown()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve a live election map that receives delta updates.')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between updates')
+    parser.add_argument('--changes', type=int, default=5, help='states changed per update')
+    args = parser.parse_args()
+    demo(args.port, args.interval, args.changes)
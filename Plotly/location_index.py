@@ -0,0 +1,184 @@
+"""
+Precomputed Location Index for Country Names and ISO Codes
+--------------------------------------------------------------------------------------------------------------------------------
+locationmode = "country names" leaves it to plotly.js to match every name against its own
+list while the map is drawn, and names it does not know are silently left blank. The two
+2014 data sets also identify countries differently (names vs ISO-3 codes), so they cannot
+be joined directly.
+
+LocationIndex resolves names, aliases, ISO-2 and ISO-3 codes to one canonical code:
+- a single hash index is built once from country_codes.csv, keyed on a normalized form of
+  every name and alias (case, accents, punctuation and word order are ignored, so
+  "Korea, South" and "South Korea" are the same key) and on every code
+- resolve() factorizes its input and looks up each distinct value only once, so a million
+  rows of mixed names and codes cost one pass over the rows plus a few hundred lookups
+- values with no exact key fall back to a memoized fuzzy match: a unique partial name
+  ("Saudi" -> Saudi Arabia), then difflib similarity above a cutoff
+- every resolve() can return a report of the fuzzy matches and of the names left unmatched
+
+Only the canonical codes are sent to plotly, using its default ISO-3 location mode.
+--------------------------------------------------------------------------------------------------------------------------------
+"""
+
+import difflib
+import functools
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+#bundled ISO 3166-1 table: name, iso2, iso3 and |-separated aliases
+COUNTRY_CODES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'country_codes.csv')
+
+CODE_TYPES = ('iso3', 'iso2', 'name')
+
+#words that do not distinguish one country name from another
+STOP_WORDS = frozenset(('the', 'of', 'and'))
+
+
+def normalize(name):
+    """Return the index key of a name: lower case ascii words, sorted, without stop words."""
+    name = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii')
+    name = name.lower().replace('&', ' and ')
+    words = re.sub(r'[^a-z0-9]+', ' ', name).split()
+    return ' '.join(sorted(w for w in words if w not in STOP_WORDS))
+
+
+class ResolutionReport(object):
+    """Counts of how the rows of one resolve() call were matched, and what was not."""
+
+    def __init__(self, exact, fuzzy, unmatched):
+        self.exact = exact
+        self.fuzzy = fuzzy
+        self.unmatched = unmatched
+
+    def __repr__(self):
+        return 'ResolutionReport(exact=%d rows, fuzzy=%d names, unmatched=%d names)' % (
+            self.exact, len(self.fuzzy), len(self.unmatched))
+
+    def __str__(self):
+        lines = ['%d rows matched exactly' % self.exact]
+        if self.fuzzy:
+            lines.append('fuzzy matches (name -> code, rows):')
+            lines.extend('    %r -> %s, %d' % item for item in self.fuzzy)
+        if self.unmatched:
+            lines.append('unmatched (name, rows):')
+            lines.extend('    %r, %d' % item for item in self.unmatched)
+        return '\n'.join(lines)
+
+
+class LocationIndex(object):
+    """
+    Hash index from country names, aliases and ISO codes to canonical codes.
+
+    path         - csv table with name, iso2, iso3 and aliases columns
+    fuzzy_cutoff - minimum difflib similarity for a fuzzy match, or None to disable it
+    """
+
+    def __init__(self, path=COUNTRY_CODES, fuzzy_cutoff=0.85):
+        #keep_default_na=False, or Namibia's ISO-2 code NA would be read as missing
+        table = pd.read_csv(path, dtype=str, keep_default_na=False)
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.names = dict(zip(table['iso3'], table['name']))
+        self.iso2 = dict(zip(table['iso3'], table['iso2']))
+        self.keys, self.codes = {}, {}
+        for name, iso2, iso3, aliases in table[['name', 'iso2', 'iso3', 'aliases']].itertuples(index=False):
+            for alias in [name] + [a for a in aliases.split('|') if a]:
+                self.keys[normalize(alias)] = iso3
+            self.codes[iso2] = iso3
+            self.codes[iso3] = iso3
+        self.words = dict((key, set(key.split())) for key in self.keys)
+        self.fuzzy_match = functools.lru_cache(maxsize=65536)(self._fuzzy_match)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _fuzzy_match(self, key):
+        """Return the iso3 code of the only name containing every word of key, or the closest name."""
+        words = set(key.split())
+        if not words:
+            return None
+        candidates = set(code for name, name_words in self.words.items()
+            if all(any(w.startswith(part) for w in name_words) for part in words) for code in [self.keys[name]])
+        if len(candidates) == 1:
+            return candidates.pop()
+        if self.fuzzy_cutoff is None or candidates:
+            #several countries share these words ("South", "Korea"), so there is no safe guess
+            return None
+        close = difflib.get_close_matches(key, list(self.words), n=1, cutoff=self.fuzzy_cutoff)
+        return self.keys[close[0]] if close else None
+
+    def lookup(self, value):
+        """Return (iso3 code or None, exact) for a single name or code."""
+        text = str(value).strip()
+        #codes are matched before normalizing, which would drop e.g. Andorra's AND
+        if len(text) in (2, 3) and text.upper() in self.codes:
+            return self.codes[text.upper()], True
+        key = normalize(text)
+        code = self.keys.get(key)
+        if code is not None:
+            return code, True
+        return self.fuzzy_match(key), False
+
+    def convert(self, codes, to='iso3'):
+        """Convert an array of iso3 codes (None for unmatched) to another code type."""
+        if to == 'iso3':
+            return codes
+        if to not in CODE_TYPES:
+            raise ValueError('to must be one of %s' % ', '.join(CODE_TYPES))
+        table = self.iso2 if to == 'iso2' else self.names
+        return np.array([table.get(code) for code in codes], dtype=object)
+
+    def resolve(self, values, to='iso3', report=False):
+        """
+        Resolve a column of names and/or codes to canonical codes.
+
+        values - list, array or Series of names, aliases, ISO-2 or ISO-3 codes
+        to     - 'iso3' (plotly's default location mode), 'iso2' or 'name'
+        report - also return a ResolutionReport of fuzzy and unmatched names
+
+        The result is a pandas Categorical of the canonical codes (a categorical Series with
+        the same index for Series input), with unmatched values missing.
+        """
+        index = values.index if isinstance(values, pd.Series) else None
+        if not isinstance(values, (pd.Series, pd.Index, pd.Categorical)):
+            values = pd.Series(values, dtype=object)
+        #factorizing the column directly (string or categorical) avoids boxing every row
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        uniques = np.asarray(uniques, dtype=object)
+        resolved, exact = [], []
+        for value in uniques:
+            code, hit = self.lookup(value)
+            resolved.append(code)
+            exact.append(hit)
+        resolved = self.convert(np.array(resolved, dtype=object), to)
+
+        #rows become integer codes into the distinct canonical codes, never boxed strings
+        found = np.array([code is not None for code in resolved], dtype=bool)
+        categories, lut = np.unique(resolved[found].astype(str), return_inverse=True)
+        remap = np.full(len(uniques) + 1, -1, dtype=np.int32)
+        remap[np.flatnonzero(found)] = lut
+        result = pd.Categorical.from_codes(remap[codes], categories)
+        if index is not None:
+            result = pd.Series(result, index=index, name=getattr(values, 'name', None))
+        if not report:
+            return result
+
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        fuzzy = [(uniques[i], resolved[i], int(counts[i])) for i in range(len(uniques)) if not exact[i] and resolved[i] is not None]
+        unmatched = [(uniques[i], int(counts[i])) for i in range(len(uniques)) if resolved[i] is None]
+        exact_rows = int(sum(counts[i] for i in range(len(uniques)) if exact[i]))
+        return result, ResolutionReport(exact_rows, fuzzy, unmatched)
+
+
+@functools.lru_cache(maxsize=None)
+def default_index():
+    """Return the LocationIndex built from the bundled country_codes.csv, built once per process."""
+    return LocationIndex()
+
+
+def resolve_locations(values, to='iso3', report=False):
+    """Resolve names/codes with the shared default index, see LocationIndex.resolve."""
+    return default_index().resolve(values, to, report)
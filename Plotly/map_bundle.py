@@ -0,0 +1,193 @@
+"""
+Multi-Map HTML Bundles with One Shared plotly.js Asset
+--------------------------------------------------------------------------------------------------------------------------------
+Every call to plot() writes a separate html file with its own copy of the several-MB
+plotly.js bundle, and opens a new browser tab. MapBundle collects figures instead, and
+writes them all out once:
+
+- write_dashboard() writes a single scrolling page with every map, plus one shared
+  plotly.js asset (and a gzip-compressed copy for web servers that serve .gz files)
+- write_pages() writes a folder with an index and one page per map, all referencing
+  the same shared asset
+- figure data is only parsed and drawn when its map scrolls into view, so a report with
+  many maps opens as fast as one with a single map
+- with inline_data=False, figure JSON is written to separate files and only fetched on
+  scroll (this needs the pages to be served over http, browsers block fetch on file://)
+
+Figures can be go.Figure objects or the dictionaries built by fast_choropleth.fast_figure.
+--------------------------------------------------------------------------------------------------------------------------------
+"""
+
+import gzip
+import html
+import os
+import re
+import webbrowser
+
+from fast_choropleth import figure_json, plotlyjs_version, PLOTLYJS_CDN
+
+#height of each map on the dashboard, in pixels
+MAP_HEIGHT = 600
+
+#loads a map's figure the first time its container scrolls into view
+LAZY_LOADER = """
+<script type="text/javascript">
+(function () {
+    function draw(container) {
+        var source = container.getAttribute('data-figure-src');
+        var load = source ? fetch(source).then(function (r) { return r.json(); })
+                          : Promise.resolve(JSON.parse(document.getElementById(container.id + '-data').textContent));
+        load.then(function (figure) {
+            Plotly.newPlot(container, figure.data, figure.layout || {}, {responsive: true});
+        });
+    }
+    var maps = document.querySelectorAll('.lazy-map');
+    if (!('IntersectionObserver' in window)) {
+        maps.forEach(draw);
+        return;
+    }
+    var observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                draw(entry.target);
+            }
+        });
+    }, {rootMargin: '200px'});
+    maps.forEach(function (map) { observer.observe(map); });
+})();
+</script>
+"""
+
+
+def slugify(name):
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-') or 'map'
+
+
+def as_figure_dict(figure):
+    """Accept a go.Figure or a plain figure dictionary."""
+    if hasattr(figure, 'to_plotly_json'):
+        return figure.to_plotly_json()
+    return figure
+
+
+def write_plotlyjs_asset(directory):
+    """
+    Write plotly.js (and a gzip copy) into directory once, and return its file name.
+    The file name carries the version, so stale copies are never reused.
+    """
+    name = 'plotly-%s.min.js' % plotlyjs_version()
+    path = os.path.join(directory, name)
+    if not os.path.isfile(path) or not os.path.isfile(path + '.gz'):
+        from plotly.offline import get_plotlyjs
+        source = get_plotlyjs().encode('utf-8')
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(source)
+        with gzip.GzipFile(path + '.gz', 'wb', compresslevel=9, mtime=0) as f:
+            f.write(source)
+    return name
+
+
+def safe_json(text):
+    """Escape a JSON string for embedding inside a <script> element."""
+    return text.replace('</', '<\\/')
+
+
+class MapBundle(object):
+    """
+    Collects figures and writes them as one dashboard or a folder of pages.
+
+    title      - page title of the dashboard / index
+    plotlyjs   - 'asset' to write one shared plotly.js file next to the output,
+                 'cdn' to load it from the plotly CDN, or a path/URL to an existing copy
+    """
+
+    def __init__(self, title='Maps', plotlyjs='asset'):
+        self.title = title
+        self.plotlyjs = plotlyjs
+        self.figures = []
+
+    def add(self, name, figure):
+        """Add a figure under a display name, replacing any figure with the same name."""
+        self.figures = [(n, f) for n, f in self.figures if n != name]
+        self.figures.append((name, as_figure_dict(figure)))
+        return self
+
+    def script_tag(self, output_dir, relative_to):
+        """Return the <script> tag that loads plotly.js for a page in relative_to."""
+        if self.plotlyjs == 'cdn':
+            source = PLOTLYJS_CDN % plotlyjs_version()
+        elif self.plotlyjs == 'asset':
+            asset_dir = os.path.join(output_dir, 'assets')
+            name = write_plotlyjs_asset(asset_dir)
+            source = os.path.relpath(os.path.join(asset_dir, name), relative_to).replace(os.sep, '/')
+        else:
+            source = self.plotlyjs
+        return '<script src="%s" charset="utf-8"></script>' % source
+
+    def map_blocks(self, names_and_figures, data_dir=None, relative_to=None):
+        """Return the html for lazily drawn map containers, with inline or external data."""
+        blocks = []
+        for name, figure in names_and_figures:
+            slug, title = slugify(name), html.escape(name)
+            text = figure_json(figure)
+            if data_dir is None:
+                blocks.append('<h2>%s</h2>\n<div id="%s" class="lazy-map" style="height:%dpx;"></div>\n'
+                    '<script type="application/json" id="%s-data">%s</script>'
+                    % (title, slug, MAP_HEIGHT, slug, safe_json(text)))
+            else:
+                os.makedirs(data_dir, exist_ok=True)
+                with open(os.path.join(data_dir, slug + '.json'), 'w', encoding='utf-8') as f:
+                    f.write(text)
+                source = os.path.relpath(os.path.join(data_dir, slug + '.json'), relative_to).replace(os.sep, '/')
+                blocks.append('<h2>%s</h2>\n<div id="%s" class="lazy-map" data-figure-src="%s" style="height:%dpx;"></div>'
+                    % (title, slug, source, MAP_HEIGHT))
+        return blocks
+
+    def page(self, title, script_tag, blocks, extra=''):
+        return '\n'.join([
+            '<!DOCTYPE html>',
+            '<html>',
+            '<head><meta charset="utf-8" /><title>%s</title></head>' % html.escape(title),
+            '<body style="font-family:sans-serif;">',
+            '<h1>%s</h1>' % html.escape(title),
+            extra,
+            script_tag,
+            '\n'.join(blocks),
+            LAZY_LOADER,
+            '</body>',
+            '</html>'])
+
+    def write_dashboard(self, path='maps.html', inline_data=True, auto_open=False):
+        """Write every map into one scrolling html page and return its path."""
+        output_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(output_dir, exist_ok=True)
+        data_dir = None if inline_data else os.path.join(output_dir, 'data')
+        blocks = self.map_blocks(self.figures, data_dir, output_dir)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.page(self.title, self.script_tag(output_dir, output_dir), blocks))
+        if auto_open:
+            webbrowser.open('file://' + os.path.abspath(path))
+        return path
+
+    def write_pages(self, directory='maps', inline_data=True, auto_open=False):
+        """Write an index plus one page per map into directory and return the index path."""
+        directory = os.path.abspath(directory)
+        os.makedirs(directory, exist_ok=True)
+        data_dir = None if inline_data else os.path.join(directory, 'data')
+        links = []
+        for name, figure in self.figures:
+            slug = slugify(name)
+            blocks = self.map_blocks([(name, figure)], data_dir, directory)
+            with open(os.path.join(directory, slug + '.html'), 'w', encoding='utf-8') as f:
+                f.write(self.page(name, self.script_tag(directory, directory), blocks, '<a href="index.html">All maps</a>'))
+            links.append('<li><a href="%s.html">%s</a></li>' % (slug, html.escape(name)))
+
+        index = os.path.join(directory, 'index.html')
+        with open(index, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(['<!DOCTYPE html>', '<html>', '<head><meta charset="utf-8" /><title>%s</title></head>' % html.escape(self.title),
+                '<body style="font-family:sans-serif;">', '<h1>%s</h1>' % html.escape(self.title), '<ul>'] + links + ['</ul>', '</body>', '</html>']))
+        if auto_open:
+            webbrowser.open('file://' + index)
+        return index
@@ -14,14 +14,33 @@ geographical plots. This script will utilize data from the following .csv files:
 This public data will be used to demonstrate plotly's visualization capabilities, 
 specifically, those related to geoplotting on the national and international scale.
 
-IMPORTANT: If you intend to view each type of plot within this script, you will
-need to comment out the sections of code that do not involve the desired plot.
-If this script is run as is, it will plot everything at once and you will only
-be able to interact with the last plot demonstrated (2012 Election Data). 
+Each map section adds its figure to a MapBundle instead of opening its own browser
+tab. The last section writes every map into a single dashboard page that loads one
+shared copy of plotly.js and only draws each map when it is scrolled into view.
 
-Each section is designed to run on its own.
+The map sections therefore only add to the bundle, and nothing is drawn until the
+'View Every Map in One Dashboard' section at the end runs. When stepping through the
+sections by hand, run a map's section and then the dashboard section to view it;
+run_sections.py replays every map section when it is asked for the dashboard alone.
 
 For all method parameters, refer to Plotly official documentation.
+
+The maps are built with fast_figure() instead of go.Figure(). It takes the same data and
+layout dictionaries but skips Plotly's property validation and writes numeric columns as
+binary typed arrays, which matters for maps with tens of thousands of regions.
+Run fast_choropleth.py directly to benchmark both paths on the maps in this script.
+
+For maps whose numbers change while they are open (e.g. election night), live_updates.py
+serves a map and pushes only the changed z/text values to the page instead of re-plotting.
+Run it directly for a demo using the election map of this script.
+
+The maps here use plotly's built-in state and country outlines. For county or ZIP-code
+maps drawn from your own GeoJSON file, pass choropleth_geojson(path, zoom=...) from
+topojson_cache.py as the geojson of the trace: it simplifies and quantizes the shapes
+once, keeping shared borders gap-free, and caches the result next to the file.
+
+On a headless machine with no browser, static_maps.py draws the same figures to PNG or
+SVG with NumPy, and render_many() renders a batch of them in a process pool.
 --------------------------------------------------------------------------------------------------------------------------------
 """
 
@@ -33,6 +52,23 @@ from plotly.offline import download_plotlyjs, init_notebook_mode, plot, iplot
 #import pandas for data manipulation
 import pandas as pd
 
+#validator-free figure builder for trusted input
+from fast_choropleth import fast_figure
+
+#typed loading of csv columns stored as formatted text (thousands separators, percent)
+from formatted_columns import load_formatted_csv, ELECTION_SCHEMA
+
+#resolves country names, aliases and ISO-2/ISO-3 codes to canonical ISO-3 codes
+from location_index import resolve_locations
+
+#hover text templates over column names, as vectorized text or plotly hovertemplates
+from hover_templates import hover_properties
+
+#collects every map into one html dashboard with a single shared plotly.js asset
+from map_bundle import MapBundle
+
+map_bundle = MapBundle(title = 'Geoplotting and Choropleth Maps')
+
 """
 --------------------------------------------------------------------------------------------------------------------------------
 Simple Choropleth US Map Example
@@ -53,11 +89,11 @@ map_data = dict(type = 'choropleth', locations = ['CA','NY','CO'], locationmode
 map_layout = dict(geo = {'scope':'usa'})
 
 #create an instance of the map
-choropleth_map = go.Figure(data=[map_data],layout=map_layout)
+choropleth_map = fast_figure(data=[map_data],layout=map_layout)
 
-#call plotly to create the plot (opens browser)
-print('\nOpened Browser: Simple Plotly US Map...')
-plot(choropleth_map)
+#add the map to the dashboard
+print('\nAdded to Map Dashboard: Simple Plotly US Map...')
+map_bundle.add('Simple Plotly US Map', choropleth_map)
 print('\n')
 
 
@@ -69,6 +105,8 @@ Create a Map Showing Agricultural Exports by State
 - Create a US Map that shows each state's Agricultural exports in Millions USD
 - Format the data dictionary to more easily understand parameters
 - Change the layout to show lakes on the map, define lake color
+- Build the hover text from the data columns with a template instead of the text column
+	- the labels are sent once in a plotly hovertemplate, only the values are sent per state
 --------------------------------------------------------------------------------------------------------------------------------
 """
 
@@ -80,13 +118,18 @@ print('Showing 2011 Agricultural Exports Head:')
 print(agri_exports.head())
 print('\n')
 
+#compile the hover text template, fields are column names with optional formats
+#location and z are the trace's own state code and total exports, shown as in plotly's default hover
+agri_hover = hover_properties(agri_exports, '{location}: {z}<br>{state}<br>Beef {beef} Dairy {dairy}<br>Fruits {total fruits} Veggies {total veggies}<br>Wheat {wheat} Corn {corn}')
+
 #define the map data
 agri_data = dict(type='choropleth',
             colorscale = 'Rainbow',
             locations = agri_exports['code'],  		#use the state code data 
             z = agri_exports['total exports'], 		#color by amount of exports
             locationmode = 'USA-states',
-            text = agri_exports['text'],				#use the text column data
+            hovertemplate = agri_hover['hovertemplate'],	#labels of the hover text
+            customdata = agri_hover['customdata'],		#values of the hover text
             colorbar = {'title':"Millions USD"}
             ) 
 
@@ -100,11 +143,11 @@ agri_layout = dict(
         )
 
 #create the agricultural exports map object
-agri_choromap = go.Figure(data = [agri_data], layout = agri_layout)
+agri_choromap = fast_figure(data = [agri_data], layout = agri_layout)
 
-#display the geomap
-print('\nOpened Browser: 2011 US Agriculture Exports by State...')
-plot(agri_choromap)
+#add the map to the dashboard
+print('\nAdded to Map Dashboard: 2011 US Agriculture Exports by State...')
+map_bundle.add('2011 US Agriculture Exports by State', agri_choromap)
 print('\n')
 
 
@@ -113,6 +156,8 @@ print('\n')
 Create a World Map to Visualize Countries and their GDP
 --------------------------------------------------------------------------------------------------------------------------------
 - Read in data from 2014_World_GDP
+- Resolve the COUNTRY names to ISO-3 codes with the location index
+	- a few of the CODE values in the file are wrong (e.g. North and South Korea are swapped)
 - Create a World Map that shows country GDP data
 - Change the layout to a Mercator style - an interactive globe
 	You can click and drag to move around globe
@@ -130,7 +175,7 @@ print('\n')
 #define the world map data
 world_map_data = dict(
         type = 'choropleth',
-        locations = world_gdp_data['CODE'],
+        locations = resolve_locations(world_gdp_data['COUNTRY']),
         z = world_gdp_data['GDP (BILLIONS)'],
         text = world_gdp_data['COUNTRY'],
         colorbar = {'title' : 'GDP Billions US'},
@@ -146,11 +191,11 @@ world_map_layout = dict(
 )
 
 #create the agricultural exports map object
-world_gdp_choromap = go.Figure(data = [world_map_data], layout = world_map_layout)
+world_gdp_choromap = fast_figure(data = [world_map_data], layout = world_map_layout)
 
-#display the geomap
-print('\nOpened Browser: 2014 World GDP...')
-plot(world_gdp_choromap)
+#add the map to the dashboard
+print('\nAdded to Map Dashboard: 2014 World GDP...')
+map_bundle.add('2014 World GDP', world_gdp_choromap)
 print('\n')
 
 
@@ -162,6 +207,9 @@ Create a World Map to Visualize Global Power Consumption
 - Create a World Map that shows country power consumption data
 - Add a custom colorscale
 - Reverse the scale of the colormap
+- Resolve the country names to ISO-3 codes before plotting instead of locationmode = "country names"
+	- many names in this file are cut off after the first word ("Saudi", "Korea,")
+	- unique partial names are fuzzy matched, and the rest are listed in a report
 --------------------------------------------------------------------------------------------------------------------------------
 """
 
@@ -173,13 +221,18 @@ print('Showing World Power Consumption Data Head:')
 print(world_consumption_data.head())
 print('\n')
 
+#resolve the country names once, and show which ones could not be matched
+consumption_codes, location_report = resolve_locations(world_consumption_data['Country'], report = True)
+print('Showing Country Name Resolution Report:')
+print(location_report)
+print('\n')
+
 #define the world map data
 world_map_data = dict(
         type = 'choropleth',
         colorscale = 'Viridis',
         reversescale = True,
-        locations = world_consumption_data['Country'],
-        locationmode = "country names",
+        locations = consumption_codes,
         z = world_consumption_data['Power Consumption KWH'],
         text = world_consumption_data['Country'],
         colorbar = {'title' : 'Power Consumption in KWH'}
@@ -196,11 +249,11 @@ world_map_layout = dict(
 
 
 #create the agricultural exports map object
-world_power_choromap = go.Figure(data = [world_map_data], layout = world_map_layout)
+world_power_choromap = fast_figure(data = [world_map_data], layout = world_map_layout)
 
-#display the geomap
-print('\nOpened Browser: 2014 World Power Consumption...')
-plot(world_power_choromap)
+#add the map to the dashboard
+print('\nAdded to Map Dashboard: 2014 World Power Consumption...')
+map_bundle.add('2014 World Power Consumption', world_power_choromap)
 print('\n')
 
 
@@ -211,13 +264,15 @@ Create a US Map to Visualize Election Data by State
 --------------------------------------------------------------------------------------------------------------------------------
 - Read in data from 2012_Election_Data
 - Create a US Map that shows voting-age population (VAP) per state
-	- For exploration with other data columns, consider the data type
-	- VAP works nicely because it is already a float value
+	- Most columns are stored as formatted text, e.g. "2,074,338" or "58.6%"
+	- load_formatted_csv converts every column to a number using the kinds declared
+	  in ELECTION_SCHEMA, and caches the typed result in .csv_cache
 	- Add formatted markers
+- Create a second US Map that shows turnout, a percent column
 --------------------------------------------------------------------------------------------------------------------------------
 """
-#read in the csv file
-election_data = pd.read_csv('2012_Election_Data.csv')
+#read in the csv file, converting the formatted number columns
+election_data = load_formatted_csv('2012_Election_Data.csv', ELECTION_SCHEMA)
 
 #print the head of the data to understand contents
 print('Showing 2012 Election Data Head:')
@@ -249,13 +304,47 @@ map_layout = dict(
 
 
 #create the agricultural exports map object
-election_choromap = go.Figure(data = [map_data], layout = map_layout)
+election_choromap = fast_figure(data = [map_data], layout = map_layout)
 
-#display the geomap
-print('\nOpened Browser: 2012 Election, Voting Age Population by State...')
-plot(election_choromap)
+#add the map to the dashboard
+print('\nAdded to Map Dashboard: 2012 Election, Voting Age Population by State...')
+map_bundle.add('2012 Election, Voting Age Population by State', election_choromap)
 print('\n')
 
+#map the turnout column, stored as text like 58.6% in the csv file
+turnout_data = dict(
+			type='choropleth',
+			colorscale = 'Viridis',
+			reversescale = True,
+			locations = election_data['State Abv'],
+			z = election_data['VEP Highest Office'],
+			locationmode = 'USA-states',
+			text = election_data['State'],
+			marker = dict(line = dict(color = 'rgb(255,255,255)',width = 1)),
+			colorbar = {'title':"Turnout (% of VEP)"}
+			)
+
+#create the turnout map object
+turnout_choromap = fast_figure(data = [turnout_data], layout = dict(title = '2012 Election Turnout', geo = map_layout['geo']))
+
+#add the map to the dashboard
+print('\nAdded to Map Dashboard: 2012 Election, Turnout by State...')
+map_bundle.add('2012 Election, Turnout by State', turnout_choromap)
+print('\n')
 
 
+"""
+--------------------------------------------------------------------------------------------------------------------------------
+View Every Map in One Dashboard
+--------------------------------------------------------------------------------------------------------------------------------
+- Write all of the maps above into geoplotting_maps.html
+	- plotly.js is written once to assets/ (with a gzipped copy) and shared by every map
+	- figure data is embedded as JSON and only drawn when a map scrolls into view
+- Use map_bundle.write_pages('maps') instead for an index plus one page per map
+--------------------------------------------------------------------------------------------------------------------------------
+"""
 
+#write the dashboard and open it (opens browser)
+print('\nOpened Browser: Map Dashboard with %d Maps...' % len(map_bundle.figures))
+map_bundle.write_dashboard('geoplotting_maps.html', auto_open = True)
+print('\n')
@@ -0,0 +1,561 @@
+"""
+Static Choropleth Images Without a Browser
+--------------------------------------------------------------------------------------------------------------------------------
+plot() and write_html() need a browser to turn a map into pixels, and plotly's own image
+export starts a headless browser too. On a headless reporting box that is slow, or not
+possible at all.
+
+This module draws a choropleth figure to PNG or SVG with NumPy alone:
+- the same figure dictionaries (or go.Figure objects) as the rest of this folder are read:
+  locations, locationmode, z, zmin/zmax, colorscale, reversescale, marker line, the title
+  and layout.geo scope and projection ('equirectangular', 'mercator', 'albers usa')
+- every region is projected once and cached per worker process, so maps that differ only
+  in their numbers skip straight to drawing
+- PNG maps are rasterized with a vectorized scanline fill: all polygon edges are crossed
+  with all pixel rows in one pass, the spans are painted into an image of region indices,
+  and the colors are applied with a single lookup in the colorscale tables of
+  colorscale_lut.py (borders come from index changes)
+- SVG maps are written as one path per region
+- render_many() spreads a batch of maps over a process pool
+
+There is no network access while rendering, so the outlines come from local files:
+- the geojson of the trace itself (a GeoJSON dict, or a GeoJSON/TopoJSON file path, e.g.
+  the cache written by topojson_cache.py), matched with featureidkey as in plotly
+- for the built-in location modes, the usa_110m.json and world_110m.json topologies in the
+  geometry folder next to this file (GEOMETRY_DIR), laid out like the ones plotly.js
+  downloads from its CDN: countries keyed by ISO-3 code, states by postal code. They were
+  built with topojson_cache.build_topology from public domain data: Natural Earth's 110m
+  admin-0 countries (Kosovo keyed XKX) and the US Census 2016 cartographic boundary
+  states (cb_2016_us_state_500k, the 50 states and DC), simplified to 0.05 degrees
+- if one of those files is missing, its location mode is drawn as a labelled tile grid,
+  with a warning: a square per state in the usual layout of US tile maps, or a square per
+  listed country in rows sorted by code
+
+Text (title, colorbar and tile labels) is drawn into PNG maps only when Pillow is installed.
+
+Run this file directly to render the maps of plotly_geoplotting_python.py:
+    python static_maps.py [--out static_maps] [--format png] [--processes 4] [--repeat 20]
+--------------------------------------------------------------------------------------------------------------------------------
+"""
+
+import base64
+import functools
+import html
+import json
+import os
+import struct
+import warnings
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from colorscale_lut import colorscale_stops, get_lut, parse_color
+from map_bundle import as_figure_dict
+from topojson_cache import simplify_arc, topology_to_geojson
+
+#folder with the topologies of the built-in location modes
+GEOMETRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geometry')
+
+#plotly.js topology file and object used for the built-in location modes of each scope
+BUILTIN_GEOMETRY = {
+    'usa':('usa_110m.json', 'subunits'),
+    'world':('world_110m.json', 'countries')
+    }
+
+#(row, column) of every state in a US tile map, standing in for usa_110m.json
+STATE_TILES = {
+    'AK':(0,0), 'ME':(0,10),
+    'VT':(1,9), 'NH':(1,10),
+    'WA':(2,0), 'ID':(2,1), 'MT':(2,2), 'ND':(2,3), 'MN':(2,4), 'IL':(2,5), 'WI':(2,6), 'MI':(2,7), 'NY':(2,8), 'RI':(2,9), 'MA':(2,10),
+    'OR':(3,0), 'NV':(3,1), 'WY':(3,2), 'SD':(3,3), 'IA':(3,4), 'IN':(3,5), 'OH':(3,6), 'PA':(3,7), 'NJ':(3,8), 'CT':(3,9),
+    'CA':(4,0), 'UT':(4,1), 'CO':(4,2), 'NE':(4,3), 'MO':(4,4), 'KY':(4,5), 'WV':(4,6), 'VA':(4,7), 'MD':(4,8), 'DE':(4,9),
+    'AZ':(5,1), 'NM':(5,2), 'KS':(5,3), 'AR':(5,4), 'TN':(5,5), 'NC':(5,6), 'SC':(5,7), 'DC':(5,8),
+    'OK':(6,3), 'LA':(6,4), 'MS':(6,5), 'AL':(6,6), 'GA':(6,7),
+    'HI':(7,0), 'TX':(7,3), 'FL':(7,8)
+    }
+
+#gap between neighbouring tiles, as a fraction of a tile
+TILE_GAP = 0.1
+
+PROJECTIONS = ('equirectangular', 'mercator', 'albers usa')
+
+#mercator stretches to infinity at the poles, so latitudes are clipped here
+MERCATOR_LIMIT = 85.0
+
+#each pixel is drawn as SUPERSAMPLE x SUPERSAMPLE samples and averaged, to smooth the edges
+SUPERSAMPLE = 2
+
+#SVG outlines are simplified to this many pixels
+SVG_TOLERANCE = 0.25
+
+#plotly.js defaults for choropleth traces
+DEFAULT_COLORSCALE = 'Plasma'
+DEFAULT_LINE = dict(color='#444', width=1)
+
+BACKGROUND = (255, 255, 255, 255)
+
+
+def decode_array(values):
+    """Return a trace array as NumPy, including the binary typed arrays of fast_figure."""
+    if isinstance(values, dict) and 'bdata' in values:
+        array = np.frombuffer(base64.b64decode(values['bdata']), dtype=np.dtype(values['dtype']).newbyteorder('<'))
+        if 'shape' in values:
+            array = array.reshape([int(n) for n in str(values['shape']).split(',')])
+        return array
+    values = np.asarray(getattr(values, 'values', values))
+    if values.dtype.kind == 'O':
+        #None marks a missing number in a JSON-ready list
+        try:
+            return values.astype('f8')
+        except (TypeError, ValueError):
+            return values
+    return values
+
+
+def feature_id(feature, featureidkey='id'):
+    """Return a feature's id at featureidkey ('id' or a dotted path such as 'properties.GEOID')."""
+    value = feature
+    for part in featureidkey.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    return None if value is None else str(value)
+
+
+def read_geometry(source):
+    """Read a GeoJSON or TopoJSON file, or accept a GeoJSON dict, and return its features."""
+    if isinstance(source, dict):
+        collection = source
+    else:
+        with open(source) as f:
+            collection = json.load(f)
+    if collection.get('type') == 'Topology':
+        collection = topology_to_geojson(collection)
+    return collection['features'] if collection.get('type') == 'FeatureCollection' else [collection]
+
+
+def builtin_geometry(scope):
+    """Return (path, object name) of the topology for a scope, or None if it is not in GEOMETRY_DIR."""
+    name, layer = BUILTIN_GEOMETRY['usa' if scope == 'usa' else 'world']
+    path = os.path.join(GEOMETRY_DIR, name)
+    if not os.path.isfile(path):
+        return None
+    return path, layer
+
+
+def tile_geometry(scope, locations):
+    """
+    Return (ids, rings, ring feature index) of a tile grid for a built-in location mode: the
+    US tile map for 'usa', otherwise the listed locations in sorted rows. Rings are in screen
+    units, y pointing down, so they are not projected.
+    """
+    if scope == 'usa':
+        cells = STATE_TILES
+    else:
+        ids = sorted(set(str(location) for location in locations.tolist() if location is not None))
+        #a little wider than tall, like the map area
+        columns = max(1, int(np.ceil(np.sqrt(len(ids) * 1.5))))
+        cells = dict((location, divmod(i, columns)) for i, location in enumerate(ids))
+    ids = list(cells)
+    half = (1 - TILE_GAP) / 2
+    square = np.array([[-half, -half], [half, -half], [half, half], [-half, half]])
+    rings = [square + (column + 0.5, row + 0.5) for row, column in (cells[i] for i in ids)]
+    return ids, rings, np.arange(len(ids), dtype=np.int64)
+
+
+def feature_rings(features, featureidkey='id'):
+    """Return (ids, rings of each feature) with rings as (n, 2) lon/lat arrays."""
+    ids, rings = [], []
+    for feature in features:
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') == 'Polygon':
+            polygons = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiPolygon':
+            polygons = geometry['coordinates']
+        else:
+            continue
+        ids.append(feature_id(feature, featureidkey))
+        rings.append([np.asarray(ring, dtype='f8')[:, :2] for polygon in polygons for ring in polygon if len(ring) >= 3])
+    return ids, rings
+
+
+def conic_equal_area(lon, lat, rotate, center, parallels, scale=1.0, offset=(0.0, 0.0)):
+    """Albers conic equal-area projection, laid out like d3's geoConicEqualArea."""
+    y0, y1 = np.radians(parallels)
+    n = (np.sin(y0) + np.sin(y1)) / 2
+    c = 1 + np.sin(y0) * (2 * n - np.sin(y0))
+    r0 = np.sqrt(c) / n
+
+    def raw(lon, lat):
+        r = np.sqrt(np.maximum(c - 2 * n * np.sin(lat), 0)) / n
+        return r * np.sin(lon * n), r0 - r * np.cos(lon * n)
+
+    lon = np.radians((lon + rotate + 180) % 360 - 180)
+    x, y = raw(lon, np.radians(lat))
+    cx, cy = raw(*np.radians(center))
+    return offset[0] + scale * (x - cx), offset[1] - scale * (y - cy)
+
+
+def project(lonlat, projection):
+    """Project (n, 2) lon/lat points to screen units, y pointing down."""
+    lon, lat = lonlat[:, 0], lonlat[:, 1]
+    if projection == 'equirectangular':
+        x, y = np.radians(lon), -np.radians(lat)
+    elif projection == 'mercator':
+        lat = np.clip(lat, -MERCATOR_LIMIT, MERCATOR_LIMIT)
+        x, y = np.radians(lon), -np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    elif projection == 'albers usa':
+        #lower 48 states, with Alaska and Hawaii moved into insets as in plotly.js (d3 geoAlbersUsa);
+        #a ring goes into an inset by its mean position, as the Alaska panhandle reaches past 130W
+        mean_lon, mean_lat = lon.mean(), lat.mean()
+        if mean_lat > 50 and (mean_lon < -130 or mean_lon > 170):
+            x, y = conic_equal_area(lon, lat, 154, (-2, 58.5), (55, 65), 0.35, (-0.307, 0.201))
+        elif mean_lat < 30 and mean_lon < -150:
+            x, y = conic_equal_area(lon, lat, 157, (-3, 19.9), (8, 18), 1.0, (-0.205, 0.212))
+        else:
+            x, y = conic_equal_area(lon, lat, 96, (-0.6, 38.7), (29.5, 45.5))
+    else:
+        raise ValueError('projection must be one of %s, not %r' % (', '.join(PROJECTIONS), projection))
+    return np.column_stack([x, y])
+
+
+@functools.lru_cache(maxsize=32)
+def projected_geometry(source, layer, featureidkey, projection):
+    """
+    Return (ids, projected rings, ring feature index) of a geometry file, cached per
+    process so that a worker reads and projects each file only once.
+    """
+    if layer is not None:
+        with open(source) as f:
+            features = topology_to_geojson(json.load(f), name=layer)['features']
+    else:
+        features = read_geometry(source)
+    return project_features(features, featureidkey, projection)
+
+
+def project_features(features, featureidkey, projection):
+    ids, rings = feature_rings(features, featureidkey)
+    projected, owner = [], []
+    for index, feature in enumerate(rings):
+        for ring in feature:
+            projected.append(project(ring, projection))
+            owner.append(index)
+    return ids, projected, np.array(owner, dtype=np.int64)
+
+
+def fit(rings, width, height, margin=10):
+    """Return the rings scaled and moved to fill a width x height box, keeping the aspect ratio."""
+    points = np.concatenate(rings)
+    low, high = points.min(axis=0), points.max(axis=0)
+    span = np.maximum(high - low, 1e-12)
+    scale = min((width - 2 * margin) / span[0], (height - 2 * margin) / span[1])
+    offset = (np.array([width, height]) - span * scale) / 2 - low * scale
+    return [ring * scale + offset for ring in rings]
+
+
+def rasterize(rings, owner, width, height):
+    """
+    Fill polygons into an int32 (height, width) image of their feature index (-1 where
+    there is none). Rings of one feature are filled together with the even-odd rule,
+    so holes stay empty; a pixel belongs to a polygon when its center is inside it.
+    """
+    lengths = np.array([len(ring) for ring in rings])
+    starts = np.concatenate(rings)
+    #each point joins the next one of its ring, the last one wraps around to the first
+    following = np.arange(1, len(starts) + 1)
+    following[np.cumsum(lengths) - 1] = np.cumsum(lengths) - lengths
+    ends = starts[following]
+    feature = np.repeat(owner, lengths)
+    x0, y0, x1, y1 = starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1]
+
+    #every edge crosses the pixel-center rows between its end points (horizontal ones none)
+    first = np.clip(np.ceil(np.minimum(y0, y1) - 0.5), 0, height).astype(np.int64)
+    last = np.clip(np.ceil(np.maximum(y0, y1) - 0.5), 0, height).astype(np.int64)
+    count = last - first
+    edge = np.repeat(np.arange(len(count)), count)
+    row = np.repeat(first, count) + np.arange(len(edge)) - np.repeat(np.cumsum(count) - count, count)
+    slope = (x1 - x0)[edge] / (y1 - y0)[edge]
+    x = x0[edge] + (row + 0.5 - y0[edge]) * slope
+
+    #sorted by feature, row and x, the crossings pair up into the filled spans
+    order = np.lexsort((x, row, feature[edge]))
+    x, row, painted = x[order], row[order], feature[edge][order]
+    left = np.clip(np.ceil(x[0::2] - 0.5), 0, width).astype(np.int64)
+    right = np.clip(np.ceil(x[1::2] - 0.5), 0, width).astype(np.int64)
+    length = np.maximum(right - left, 0)
+    span = np.repeat(np.arange(len(length)), length)
+    pixel = np.repeat(row[0::2] * width + left, length) + np.arange(len(span)) - np.repeat(np.cumsum(length) - length, length)
+
+    image = np.full(height * width, -1, dtype=np.int32)
+    image[pixel] = painted[0::2][span]
+    return image.reshape(height, width)
+
+
+def borders(image, width=1):
+    """Return a mask of the pixels on a border between features, or a feature and the background."""
+    mask = np.zeros(image.shape, dtype=bool)
+    horizontal = (image[:, 1:] != image[:, :-1]) & ((image[:, 1:] >= 0) | (image[:, :-1] >= 0))
+    vertical = (image[1:, :] != image[:-1, :]) & ((image[1:, :] >= 0) | (image[:-1, :] >= 0))
+    mask[:, 1:] |= horizontal
+    mask[1:, :] |= vertical
+    #thicker lines grow the mask by one pixel at a time, alternating sides to stay centered
+    for step in range(int(round(width)) - 1):
+        grown = mask.copy()
+        if step % 2:
+            grown[:, :-1] |= mask[:, 1:]
+            grown[:-1, :] |= mask[1:, :]
+        else:
+            grown[:, 1:] |= mask[:, :-1]
+            grown[1:, :] |= mask[:-1, :]
+        mask = grown
+    return mask
+
+
+def png_bytes(rgba):
+    """Encode an (height, width, 4) uint8 image as PNG."""
+    height, width = rgba.shape[:2]
+    #every row starts with a filter type byte, 0 = none
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, -1)], axis=1).tobytes()
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(raw, 6)) + chunk(b'IEND', b''))
+
+
+class MapScene(object):
+    """
+    A choropleth figure resolved to projected regions and their colors, ready to draw.
+
+    figure - go.Figure or figure dictionary with one or more choropleth traces
+    width  - image width in pixels
+    height - image height in pixels
+    """
+
+    def __init__(self, figure, width=900, height=500):
+        figure = as_figure_dict(figure)
+        self.layout = figure.get('layout', {})
+        self.width, self.height = width, height
+        geo = self.layout.get('geo', {})
+        scope = geo.get('scope', 'world')
+        self.projection = (geo.get('projection') or {}).get('type') or ('albers usa' if scope == 'usa' else 'equirectangular')
+        title = self.layout.get('title')
+        self.title = (title.get('text') if isinstance(title, dict) else title) or ''
+        #the map leaves room on the right for the colorbar
+        self.map_width = int(width * 0.84)
+
+        self.rings, self.owner, self.colors, self.colorbars, self.labels = [], [], [], [], []
+        self.line = DEFAULT_LINE
+        for trace in figure.get('data', []):
+            if trace.get('type', 'choropleth') == 'choropleth':
+                self.add_trace(trace, scope)
+        if not self.rings:
+            raise ValueError('the figure has no choropleth regions to draw')
+        self.owner = np.concatenate(self.owner)
+        self.colors = np.concatenate(self.colors + [np.array([BACKGROUND], dtype=np.uint8)])
+        self.rings = fit(self.rings, self.map_width, height)
+        #tiles are labelled at their centres, in white on dark tiles
+        luma = self.colors[:, :3] @ np.array([0.299, 0.587, 0.114])
+        self.labels = [(self.rings[ring].mean(axis=0), text, (255, 255, 255) if luma[self.owner[ring]] < 128 else (0, 0, 0))
+            for ring, text in self.labels]
+
+    def add_trace(self, trace, scope):
+        locations = decode_array(trace.get('locations', []))
+        locationmode = trace.get('locationmode', 'ISO-3')
+        featureidkey = trace.get('featureidkey', 'id')
+        if locationmode == 'country names':
+            from location_index import resolve_locations
+            locations = np.asarray(resolve_locations(locations).astype(object))
+
+        source, layer, tiles = trace.get('geojson'), None, False
+        if source is None:
+            geometry_scope = 'usa' if locationmode == 'USA-states' else 'world'
+            builtin = builtin_geometry(geometry_scope)
+            if builtin is None:
+                warnings.warn('%s is not in %s, so the %s regions are drawn as tiles; restore the topology there '
+                    'or give the trace a geojson for outlines' % (BUILTIN_GEOMETRY[geometry_scope][0], GEOMETRY_DIR, locationmode),
+                    stacklevel=3)
+                tiles = True
+            else:
+                source, layer = builtin
+            featureidkey = 'id'
+        if tiles:
+            ids, rings, owner = tile_geometry(geometry_scope, locations)
+            self.labels.extend((len(self.rings) + i, location) for i, location in enumerate(ids))
+        elif isinstance(source, dict):
+            ids, rings, owner = project_features(read_geometry(source), featureidkey, self.projection)
+        else:
+            ids, rings, owner = projected_geometry(source, layer, featureidkey, self.projection)
+        z = decode_array(trace.get('z', []))
+        line = dict(DEFAULT_LINE, **(trace.get('marker', {}).get('line') or {}))
+        colorscale = trace.get('colorscale') or DEFAULT_COLORSCALE
+        reversescale = trace.get('reversescale', False)
+        zmin, zmax = trace.get('zmin'), trace.get('zmax')
+        if zmin is None or zmax is None:
+            finite = np.asarray(z, dtype='f8')[np.isfinite(np.asarray(z, dtype='f8'))]
+            zmin = finite.min() if zmin is None and len(finite) else zmin
+            zmax = finite.max() if zmax is None and len(finite) else zmax
+
+        #regions without a value are drawn as outlines only, as plotly does
+        position = dict((str(location), i) for i, location in enumerate(locations.tolist()) if location is not None)
+        values = np.full(len(ids), np.nan)
+        matched = np.array([position.get(i, -1) for i in ids], dtype=np.int64)
+        values[matched >= 0] = np.asarray(z, dtype='f8')[matched[matched >= 0]]
+        colors = get_lut(colorscale, reversescale).map(values, zmin, zmax)
+        colors[~np.isfinite(values)] = BACKGROUND
+
+        base = sum(len(c) for c in self.colors)
+        self.rings.extend(rings)
+        self.owner.append(owner + base)
+        self.colors.append(colors)
+        self.line = line
+        colorbar = trace.get('colorbar') or {}
+        title = colorbar.get('title')
+        self.colorbars.append(dict(colorscale=colorscale, reversescale=reversescale, zmin=zmin, zmax=zmax,
+            title=(title.get('text') if isinstance(title, dict) else title) or ''))
+
+    def colorbar_rgba(self, height, width):
+        """Return the first colorbar as a (height, width, 4) strip, maximum at the top."""
+        bar = self.colorbars[0]
+        lut = get_lut(bar['colorscale'], bar['reversescale'])
+        strip = lut.table[np.linspace(lut.size - 1, 0, height).round().astype(np.intp)]
+        return np.repeat(strip[:, None, :], width, axis=1)
+
+    def png(self, supersample=SUPERSAMPLE):
+        """Return the map as PNG bytes."""
+        s = int(supersample)
+        rings = [ring * s for ring in self.rings]
+        image = rasterize(rings, self.owner, self.map_width * s, self.height * s)
+        rgba = self.colors[image]
+        if self.line['width'] > 0:
+            rgba[borders(image, self.line['width'] * s)] = parse_color(self.line['color'])
+        #average each s x s block of samples into one pixel, in integers
+        blocks = rgba.reshape(self.height, s, self.map_width, s, 4).sum(axis=(1, 3), dtype=np.uint16)
+        rgba = ((blocks + s * s // 2) // (s * s)).astype(np.uint8)
+
+        canvas = np.empty((self.height, self.width, 4), dtype=np.uint8)
+        canvas[:] = BACKGROUND
+        canvas[:, :self.map_width] = rgba
+        top, bottom = int(self.height * 0.15), int(self.height * 0.85)
+        left = self.map_width + int(self.width * 0.03)
+        canvas[top:bottom, left:left + 20] = self.colorbar_rgba(bottom - top, 20)
+        return png_bytes(self.annotate(canvas, top, bottom, left + 26))
+
+    def annotate(self, canvas, top, bottom, left):
+        """Draw the title and colorbar labels with Pillow, if it is installed."""
+        try:
+            from PIL import Image, ImageDraw
+        except ImportError:
+            return canvas
+        image = Image.fromarray(canvas, 'RGBA')
+        draw = ImageDraw.Draw(image)
+        bar = self.colorbars[0]
+        draw.text((10, 8), self.title, fill=(0, 0, 0, 255))
+        draw.text((left - 26, top - 16), bar['title'], fill=(0, 0, 0, 255))
+        for value, y in ((bar['zmax'], top), (bar['zmin'], bottom - 10)):
+            if value is not None:
+                draw.text((left, y), '%.4g' % value, fill=(0, 0, 0, 255))
+        for (x, y), text, color in self.labels:
+            box = draw.textbbox((0, 0), text)
+            draw.text((x - (box[2] + box[0]) / 2, y - (box[3] + box[1]) / 2), text, fill=color + (255,))
+        return np.asarray(image)
+
+    def svg(self):
+        """Return the map as an SVG document."""
+        paths = {}
+        for ring, owner in zip(self.rings, self.owner.tolist()):
+            #points closer than a fraction of a pixel to the outline add bytes but nothing visible
+            points = ' '.join('%.1f,%.1f' % tuple(point) for point in simplify_arc(ring, SVG_TOLERANCE).tolist())
+            paths.setdefault(owner, []).append('M%sZ' % points)
+        line = self.line
+        elements = []
+        for owner, parts in paths.items():
+            r, g, b, a = self.colors[owner].tolist()
+            elements.append('<path d="%s" fill="rgb(%d,%d,%d)" fill-opacity="%.3g"/>' % (' '.join(parts), r, g, b, a / 255.0))
+
+        bar = self.colorbars[0]
+        positions, colors = colorscale_stops(bar['colorscale'], bar['reversescale'])
+        stops = ''.join('<stop offset="%.4f" stop-color="rgb(%d,%d,%d)"/>' % ((1 - p,) + tuple(c[:3]))
+            for p, c in zip(positions[::-1], colors[::-1].astype(int)))
+        top, bottom = int(self.height * 0.15), int(self.height * 0.85)
+        left = self.map_width + int(self.width * 0.03)
+        labels = [(bar['zmax'], top + 10), (bar['zmin'], bottom)]
+        return ''.join([
+            '<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" viewBox="0 0 %d %d">' % (self.width, self.height, self.width, self.height),
+            '<rect width="100%" height="100%" fill="white"/>',
+            '<g fill-rule="evenodd" stroke="%s" stroke-width="%s" stroke-linejoin="round">' % (html.escape(line['color']), line['width']),
+            ''.join(elements), '</g>',
+            '<g font-family="sans-serif" font-size="10" text-anchor="middle" dominant-baseline="central">%s</g>' % ''.join(
+                '<text x="%.1f" y="%.1f" fill="rgb(%d,%d,%d)">%s</text>' % ((x, y) + color + (html.escape(text),))
+                for (x, y), text, color in self.labels),
+            '<defs><linearGradient id="colorbar" x1="0" y1="0" x2="0" y2="1">%s</linearGradient></defs>' % stops,
+            '<rect x="%d" y="%d" width="20" height="%d" fill="url(#colorbar)"/>' % (left, top, bottom - top),
+            '<g font-family="sans-serif" font-size="12">',
+            '<text x="10" y="22" font-size="16">%s</text>' % html.escape(self.title),
+            '<text x="%d" y="%d">%s</text>' % (left, top - 8, html.escape(bar['title'])),
+            ''.join('<text x="%d" y="%d">%.4g</text>' % (left + 26, y, value) for value, y in labels if value is not None),
+            '</g></svg>'])
+
+
+def render_figure(figure, path=None, format=None, width=900, height=500):
+    """
+    Draw a choropleth figure as 'png' or 'svg' and return the bytes, also written to path if given.
+    The format defaults to the extension of path, or png.
+    """
+    if format is None:
+        format = os.path.splitext(path)[1].lstrip('.').lower() if path else 'png'
+    if format not in ('png', 'svg'):
+        raise ValueError('format must be png or svg, not %r' % format)
+    scene = MapScene(figure, width, height)
+    data = scene.png() if format == 'png' else scene.svg().encode('utf-8')
+    if path:
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+    return data
+
+
+def render_job(job):
+    figure, path, options = job
+    render_figure(figure, path, **options)
+    return path
+
+
+def render_many(jobs, processes=None, **options):
+    """
+    Render many figures in a process pool and return their paths.
+
+    jobs    - list of (figure, path) pairs; figures are plain dictionaries or go.Figure objects
+    options - width, height or format, passed to render_figure
+    Geometry given as a file path is read and projected once per worker, not once per map.
+    """
+    tasks = [(as_figure_dict(figure), path, options) for figure, path in jobs]
+    if (processes or os.cpu_count() or 1) == 1:
+        return [render_job(task) for task in tasks]
+    with ProcessPoolExecutor(processes) as pool:
+        return list(pool.map(render_job, tasks, chunksize=max(1, len(tasks) // (4 * (processes or os.cpu_count() or 1)))))
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    from fast_choropleth import fast_figure, script_maps
+    from map_bundle import slugify
+
+    parser = argparse.ArgumentParser(description='Render the maps of plotly_geoplotting_python.py without a browser.')
+    parser.add_argument('--out', default='static_maps', help='output folder')
+    parser.add_argument('--format', default='png', choices=('png', 'svg'))
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=1, help='render every map this many times, to measure throughput')
+    args = parser.parse_args()
+
+    jobs = []
+    for name, data, layout in script_maps():
+        for copy in range(args.repeat):
+            jobs.append((fast_figure(data, layout), os.path.join(args.out, '%s-%d.%s' % (slugify(name), copy, args.format))))
+    start = time.perf_counter()
+    render_many(jobs, args.processes)
+    elapsed = time.perf_counter() - start
+    print('%d maps in %.2fs, %.0f maps per minute, written to %s' % (len(jobs), elapsed, len(jobs) * 60 / elapsed, args.out))
@@ -0,0 +1,364 @@
+"""
+Simplified, Quantized TopoJSON Geometry Cache
+--------------------------------------------------------------------------------------------------------------------------------
+The maps in plotly_geoplotting_python.py use plotly's built-in state and country outlines.
+County or ZIP-code maps have to pass their own GeoJSON to the trace, which is often tens
+of MB per figure: full-resolution coordinates, written with 15 digits, and every border
+written twice (once for the region on each side).
+
+This module turns such a GeoJSON file into a compact topology, once, and caches it:
+- coordinates are quantized to an integer grid (quantization steps across the bounding box)
+- rings are cut into arcs at the points where three or more regions meet, and each shared
+  border is stored once and referenced by both neighbours, as in TopoJSON
+- every arc is simplified with Douglas-Peucker to a tolerance (in degrees, or derived from
+  a target zoom level); arc end points never move, so neighbouring regions stay gap-free
+- the result is written as TopoJSON in a .geometry_cache folder next to the source file,
+  keyed on the file contents, tolerance and quantization
+
+plotly's choropleth traces take GeoJSON, so choropleth_geojson() decodes the cached
+topology back into GeoJSON with coordinates rounded to the quantization grid.
+
+Run this file directly to report the size reduction for a GeoJSON file:
+    python topojson_cache.py counties.geojson [--zoom 5 | --tolerance 0.01]
+--------------------------------------------------------------------------------------------------------------------------------
+"""
+
+import hashlib
+import json
+import math
+import os
+import tempfile
+
+import numpy as np
+
+#bump this whenever the topology layout or simplification changes
+CACHE_VERSION = 1
+
+#size of a web map tile in pixels, used to turn a zoom level into a tolerance
+TILE_SIZE = 256
+
+
+def tolerance_for_zoom(zoom, tile_size=TILE_SIZE):
+    """Return the width of one screen pixel in degrees of longitude at a web map zoom level."""
+    return 360.0 / (tile_size * 2 ** zoom)
+
+
+def read_features(path):
+    """Read the Polygon and MultiPolygon features of a GeoJSON file."""
+    with open(path) as f:
+        collection = json.load(f)
+    features = collection['features'] if collection.get('type') == 'FeatureCollection' else [collection]
+    for feature in features:
+        kind = (feature.get('geometry') or {}).get('type')
+        if kind not in ('Polygon', 'MultiPolygon', None):
+            raise ValueError('only Polygon and MultiPolygon features are supported, found %r' % kind)
+    return features
+
+
+def feature_polygons(feature):
+    """Return a feature's geometry as a list of polygons, each a list of (n, 2) rings."""
+    geometry = feature.get('geometry') or {}
+    if geometry.get('type') == 'Polygon':
+        polygons = [geometry['coordinates']]
+    elif geometry.get('type') == 'MultiPolygon':
+        polygons = geometry['coordinates']
+    else:
+        polygons = []
+    return [[np.asarray(ring, dtype='f8')[:, :2] for ring in polygon] for polygon in polygons]
+
+
+def simplify_line(points, tolerance):
+    """
+    Return the indices kept by Douglas-Peucker simplification of an open line.
+    The first and last points are always kept.
+    """
+    n = len(points)
+    if n <= 2 or tolerance <= 0:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        segment = end - start
+        inner = points[first + 1:last] - start
+        length = math.hypot(segment[0], segment[1])
+        if length == 0:
+            distance = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distance = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        farthest = int(np.argmax(distance))
+        if distance[farthest] > tolerance:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return np.flatnonzero(keep)
+
+
+def widest_point(points, end):
+    """Return the index of the point farthest from the line through points[0] and points[end]."""
+    segment = points[end] - points[0]
+    offsets = points - points[0]
+    if not segment.any():
+        return int(np.argmax(np.hypot(offsets[:, 0], offsets[:, 1])))
+    return int(np.argmax(np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0])))
+
+
+def simplify_arc(points, tolerance):
+    """Simplify one arc; closed arcs (whole rings) keep at least a triangle."""
+    return points[simplify_arc_indices(points, tolerance)]
+
+
+def simplify_arc_indices(points, tolerance):
+    """Return the indices simplify_arc keeps."""
+    if len(points) < 4 or not np.array_equal(points[0], points[-1]):
+        return simplify_line(points, tolerance)
+    #a closed ring is split at the point farthest from its start, so both halves are open lines
+    far = int(np.argmax(np.hypot(*(points - points[0]).T)))
+    head = simplify_line(points[:far + 1], tolerance)
+    tail = far + simplify_line(points[far:], tolerance)
+    kept = np.union1d(head, tail)
+    if len(kept) < 4:
+        kept = np.union1d(kept, [widest_point(points, far)])
+    return kept
+
+
+def quantize_rings(features, quantization):
+    """
+    Snap every ring to an integer grid and return (transform, features as integer rings).
+    Consecutive points that land on the same grid cell are merged, and rings that
+    collapse to fewer than three distinct points are dropped.
+    """
+    polygons = [feature_polygons(feature) for feature in features]
+    coordinates = [ring for feature in polygons for polygon in feature for ring in polygon]
+    if not coordinates:
+        raise ValueError('the GeoJSON file contains no polygons')
+    stacked = np.concatenate(coordinates)
+    low, high = stacked.min(axis=0), stacked.max(axis=0)
+    scale = np.where(high > low, (high - low) / (quantization - 1), 1.0)
+
+    quantized = []
+    for feature in polygons:
+        rings_of_feature = []
+        for polygon in feature:
+            rings = []
+            for ring in polygon:
+                grid = np.round((ring - low) / scale).astype(np.int64)
+                moved = np.ones(len(grid), dtype=bool)
+                moved[1:] = np.any(grid[1:] != grid[:-1], axis=1)
+                grid = grid[moved]
+                if len(grid) and np.array_equal(grid[0], grid[-1]):
+                    grid = grid[:-1]
+                if len(grid) >= 3:
+                    rings.append(grid)
+            if rings:
+                rings_of_feature.append(rings)
+        quantized.append(rings_of_feature)
+    return dict(scale=scale.tolist(), translate=low.tolist()), quantized
+
+
+def find_junctions(rings, width):
+    """
+    Return the point keys where borders meet or split: points whose neighbours differ
+    between the rings that pass through them.
+    """
+    keys, pairs = [], []
+    for ring in rings:
+        key = ring[:, 0] * width + ring[:, 1]
+        previous, following = np.roll(key, 1), np.roll(key, -1)
+        keys.append(key)
+        pairs.append(np.stack([np.minimum(previous, following), np.maximum(previous, following)], axis=1))
+    keys, pairs = np.concatenate(keys), np.concatenate(pairs)
+    #after sorting by point, a junction is a point whose neighbour pair changes within its run
+    order = np.argsort(keys, kind='stable')
+    keys, pairs = keys[order], pairs[order]
+    differs = (keys[1:] == keys[:-1]) & np.any(pairs[1:] != pairs[:-1], axis=1)
+    return set(keys[1:][differs].tolist())
+
+
+def build_topology(features, tolerance=0.0, quantization=100000, name='regions'):
+    """
+    Build a TopoJSON topology from GeoJSON features, with shared arcs, simplified to
+    tolerance (in the units of the coordinates, usually degrees).
+    """
+    transform, quantized = quantize_rings(features, int(quantization))
+    width = int(quantization) + 1
+    rings = [ring for feature in quantized for polygon in feature for ring in polygon]
+    junctions = find_junctions(rings, width)
+
+    arcs, arc_index = [], {}
+
+    def add_arc(points):
+        key = tuple((points[:, 0] * width + points[:, 1]).tolist())
+        backward = key[::-1]
+        if key in arc_index:
+            return arc_index[key]
+        if backward in arc_index:
+            return ~arc_index[backward]
+        arc_index[key] = len(arcs)
+        arcs.append(points)
+        return len(arcs) - 1
+
+    def ring_arcs(ring):
+        key = ring[:, 0] * width + ring[:, 1]
+        cuts = [i for i, k in enumerate(key.tolist()) if k in junctions]
+        if not cuts:
+            #a ring with no junctions is one closed arc; rotate it to a canonical start so
+            #that the same ring in two features (e.g. an enclave) is stored once
+            start = int(np.argmin(key))
+            rotated = np.roll(ring, -start, axis=0)
+            if key[(start + 1) % len(key)] < key[start - 1]:
+                return [add_arc(np.vstack([rotated, rotated[:1]]))]
+            #stored the other way round, so this ring references it reversed
+            rotated = np.roll(rotated[::-1], 1, axis=0)
+            return [~add_arc(np.vstack([rotated, rotated[:1]]))]
+        rotated = np.roll(ring, -cuts[0], axis=0)
+        closed = np.vstack([rotated, rotated[:1]])
+        bounds = [c - cuts[0] for c in cuts] + [len(ring)]
+        return [add_arc(closed[a:b + 1]) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    geometries, ring_indices = [], []
+    for feature, polygons in zip(features, quantized):
+        geometry = dict(type='MultiPolygon' if len(polygons) > 1 else 'Polygon')
+        arcs_of_polygons = [[ring_arcs(ring) for ring in polygon] for polygon in polygons]
+        ring_indices.extend(indices for polygon in arcs_of_polygons for indices in polygon)
+        geometry['arcs'] = arcs_of_polygons if len(polygons) > 1 else (arcs_of_polygons[0] if polygons else [])
+        if not polygons:
+            geometry = dict(type=None)
+        if 'id' in feature:
+            geometry['id'] = feature['id']
+        if feature.get('properties'):
+            geometry['properties'] = feature['properties']
+        geometries.append(geometry)
+
+    #simplify in grid units
+    grid_tolerance = tolerance / min(transform['scale'])
+    kept = [simplify_arc_indices(points.astype('f8'), grid_tolerance) for points in arcs]
+    #a ring of two arcs simplified to their end points has no area; its arcs keep their widest point
+    for indices in ring_indices:
+        if sum(len(kept[i if i >= 0 else ~i]) - 1 for i in indices) < 3:
+            for i in indices:
+                i = i if i >= 0 else ~i
+                if len(kept[i]) == 2 and len(arcs[i]) > 2:
+                    kept[i] = np.union1d(kept[i], [widest_point(arcs[i].astype('f8'), len(arcs[i]) - 1)])
+
+    #delta-encode as TopoJSON does
+    encoded = []
+    for points, index in zip(arcs, kept):
+        points = points[index]
+        encoded.append(np.vstack([points[:1], np.diff(points, axis=0)]).tolist())
+
+    return dict(type='Topology', transform=transform, arcs=encoded,
+        objects={name: dict(type='GeometryCollection', geometries=geometries)})
+
+
+def topology_to_geojson(topology, name=None, decimals=None):
+    """
+    Decode a topology object (the first one unless name is given) into a GeoJSON
+    FeatureCollection, with coordinates rounded to the quantization grid.
+    """
+    if 'transform' in topology:
+        scale = np.asarray(topology['transform']['scale'])
+        translate = np.asarray(topology['transform']['translate'])
+        if decimals is None:
+            decimals = max(0, int(math.ceil(-math.log10(scale.min()))) + 1)
+        arcs = [np.round(np.cumsum(np.asarray(arc, dtype=np.int64)[:, :2], axis=0) * scale + translate, decimals)
+            for arc in topology['arcs']]
+    else:
+        #a topology without a transform stores plain coordinates
+        arcs = [np.asarray(arc, dtype='f8')[:, :2] for arc in topology['arcs']]
+        if decimals is not None:
+            arcs = [np.round(arc, decimals) for arc in arcs]
+
+    def ring(indices):
+        pieces = [arcs[i] if i >= 0 else arcs[~i][::-1] for i in indices]
+        return np.vstack([pieces[0]] + [piece[1:] for piece in pieces[1:]]).tolist()
+
+    objects = topology['objects']
+    geometries = objects[name or next(iter(objects))]['geometries']
+    features = []
+    for geometry in geometries:
+        feature = dict(type='Feature', properties=geometry.get('properties', {}))
+        if 'id' in geometry:
+            feature['id'] = geometry['id']
+        if geometry['type'] == 'Polygon':
+            feature['geometry'] = dict(type='Polygon', coordinates=[ring(r) for r in geometry['arcs']])
+        elif geometry['type'] == 'MultiPolygon':
+            feature['geometry'] = dict(type='MultiPolygon', coordinates=[[ring(r) for r in polygon] for polygon in geometry['arcs']])
+        else:
+            feature['geometry'] = None
+        features.append(feature)
+    return dict(type='FeatureCollection', features=features)
+
+
+def cache_key(path, tolerance, quantization):
+    """Build the cache key of a source file from its contents, tolerance and quantization."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    key = dict(version=CACHE_VERSION, content=digest.hexdigest(), tolerance=float(tolerance), quantization=int(quantization))
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def load_topology(path, tolerance=None, zoom=None, quantization=100000, cache_dir=None):
+    """
+    Return the simplified topology of a GeoJSON file, building and caching it on first use.
+
+    path         - GeoJSON file with Polygon/MultiPolygon features
+    tolerance    - simplification tolerance in degrees (0 keeps every quantized point)
+    zoom         - alternatively, the web map zoom level the map will be viewed at
+    quantization - number of grid steps across the bounding box
+    cache_dir    - where the cache lives, defaults to a .geometry_cache folder next to the file
+    """
+    if tolerance is None:
+        tolerance = tolerance_for_zoom(zoom) if zoom is not None else 0.0
+    path = os.path.abspath(path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), '.geometry_cache')
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(cache_dir, '%s-%s.topo.json' % (stem, cache_key(path, tolerance, quantization)[:16]))
+
+    if os.path.isfile(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+
+    topology = build_topology(read_features(path), tolerance, quantization, name=stem)
+    os.makedirs(cache_dir, exist_ok=True)
+    handle, staging = tempfile.mkstemp(dir=cache_dir, suffix='.json')
+    with os.fdopen(handle, 'w') as f:
+        json.dump(topology, f, separators=(',', ':'))
+    os.replace(staging, cache_path)
+    return topology
+
+
+def choropleth_geojson(path, tolerance=None, zoom=None, quantization=100000, cache_dir=None):
+    """Return simplified GeoJSON for the geojson property of a choropleth trace, via the cache."""
+    return topology_to_geojson(load_topology(path, tolerance, zoom, quantization, cache_dir))
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Simplify a GeoJSON file into a cached TopoJSON topology.')
+    parser.add_argument('path')
+    parser.add_argument('--zoom', type=float, default=None, help='web map zoom level the map is viewed at')
+    parser.add_argument('--tolerance', type=float, default=None, help='tolerance in degrees (overrides --zoom)')
+    parser.add_argument('--quantization', type=int, default=100000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    topology = load_topology(args.path, args.tolerance, args.zoom, args.quantization)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    geojson = choropleth_geojson(args.path, args.tolerance, args.zoom, args.quantization)
+    cached = time.perf_counter() - start
+    print('source GeoJSON     %10d bytes' % os.path.getsize(args.path))
+    print('cached TopoJSON    %10d bytes' % len(json.dumps(topology, separators=(',', ':'))))
+    print('simplified GeoJSON %10d bytes' % len(json.dumps(geojson, separators=(',', ':'))))
+    print('first load %.2fs, cached load %.2fs' % (built, cached))
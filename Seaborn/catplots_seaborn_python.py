@@ -16,7 +16,7 @@ The examples contained in this script will demonstrate use of:
 
 Types of categorical plots available in Seaborn are:
 --------------------------------------------------------------------------------------------------------------------------------
-- factorplot()
+- factorplot() (catplot() in current seaborn)
 - boxplot()
 - violinplot()
 - stripplot()
@@ -29,13 +29,28 @@ For all method parameters, refer to Seaborn official documentation.
 """
 
 #import the necessary libraries
+import os
+import sys
 import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
 
+#make the shared NumPy engines in ../Numpy importable when running from this folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Numpy'))
+from bootstrap_ci import barplot, errorbar
+from box_statistics import boxplot
+from group_aggregation import countplot
+from grouped_view import grouped_view
+from swarm_layout import swarmplot
+from violin_kde import violinplot
+
 #load the dataset
 tips_data = sns.load_dataset('tips')
 
+#group the categorical columns once, every plot drawn from tips_view reuses the same groups
+#edits of tips_data are picked up under pandas 3 (copy-on-write); on older pandas call tips_view.invalidate() after editing it in place
+tips_view = grouped_view(tips_data)
+
 #print out the head of the data to terminal to understand columns
 print('\nTips Dataset Head:')
 print(tips_data.head())
@@ -47,19 +62,22 @@ print('\n')
 Bar and Count Plots - allow aggregation of data off of a categorical feature
 					- aggregate function defaults to mean()
 					- this estimator object can be changed to another function (vector->scalar)
+					- barplot() from bootstrap_ci draws the same chart, with its confidence intervals
+					  bootstrapped in batches (or computed analytically for very large groups)
+					- countplot() from group_aggregation counts every bar in one bincount pass
 --------------------------------------------------------------------------------------------------------------------------------
 """
 
 #create a barplot of the total_bill column of data
 print('Showing Barplot of mean total bill by gender...')
-sns.barplot(x='sex',y='total_bill',data=tips_data)
+barplot(x='sex',y='total_bill',data=tips_view)
 plt.title('Mean Total Bill by Gender')
 plt.show()
 print('\n')
 
 #create a barplot of total bill by gender, use the standard deviation estimator from numpy
 print('Showing Barplot of the standard deviation of total bill by gender...')
-sns.barplot(x='sex',y='total_bill',data=tips_data, estimator = np.std)
+barplot(x='sex',y='total_bill',data=tips_view, estimator = np.std)
 plt.title('Standard Deviation of Total Bill by Gender')
 plt.show()
 print('\n')
@@ -67,7 +85,7 @@ print('\n')
 #a count plot is the same as a barplot, except the estimator explicitly counts the num of occurrences
 #create a countplot of the number of males and females
 print('Showing Number of Males vs. Females in the Tips Dataset...')
-sns.countplot(x='sex',data=tips_data)
+countplot(x='sex',data=tips_view)
 plt.title('Number of Males vs. Females in the Tips Dataset')
 plt.show()
 print('\n')
@@ -77,7 +95,11 @@ print('\n')
 --------------------------------------------------------------------------------------------------------------------------------
 Box and Violin Plots - used to show distribution of categorical data
 					 - box plot shows distribution of quantitative data
+					 - boxplot() from box_statistics computes the boxes of every column of a dataframe
+					   in one vectorized pass
 					 - violin plot features a kernel density estimation of underlying distribution
+					 - violinplot() from violin_kde estimates every violin of a plot in one batched,
+					   binned KDE and remembers the densities for violins drawn again
 --------------------------------------------------------------------------------------------------------------------------------
 """
 #create a box plot showing the distribution of total_bill amounts by the day of the week
@@ -90,7 +112,7 @@ print('\n')
 #use the orient parameter = h to do a boxplot of the entire dataframe
 #this shows the total_bill, tip, and party size distributions for the entire dataset
 print('Showing Boxplot of Entire DataFrame...')
-sns.boxplot(data=tips_data,palette='coolwarm', orient = 'h')
+boxplot(data=tips_data,palette='coolwarm', orient = 'h')
 plt.title('Boxplot of Tips Dataset')
 plt.show()
 print('\n')
@@ -105,7 +127,7 @@ print('\n')
 
 #create a violin plot of the same data
 print('Showing Violinplot of Total Bill by Day of Week...')
-sns.violinplot(x='day', y='total_bill', data=tips_data,palette='rainbow')
+violinplot(x='day', y='total_bill', data=tips_view,palette='rainbow')
 plt.title('Violinplot of Total Bill by Day of Week')
 plt.show()
 print('\n')
@@ -113,7 +135,7 @@ print('\n')
 #create a violin plot of the same data, segmented by gender
 #include paramter (split = True) to see this a little differently
 print('Showing Violinplot of Total Bill by Day of Week, Segmented by Gender...')
-sns.violinplot(x='day', y='total_bill', hue = 'sex',data=tips_data,palette='rainbow')
+violinplot(x='day', y='total_bill', hue = 'sex',data=tips_view,palette='rainbow')
 plt.title('Violinplot of Total Bill by Day of Week, Segmented by Gender')
 plt.show()
 print('\n')
@@ -128,6 +150,8 @@ Strip and Swarm Plots - stripplot will draw a scatter plot with one categorical
 					  - swarmplot is similar, but points are adjusted so they do not overlap
 					  - provides a better representation for distribution of values
 					  - does not scale as well to large numbers of observations (both computationally and aesthetically)
+					  - swarmplot() from swarm_layout lays out the same swarm with a sorted sweep, and draws
+					    swarms too crowded to fit as density strips instead
 --------------------------------------------------------------------------------------------------------------------------------
 """
 #create a stripplot of the day of the week vs. the total bill amount
@@ -148,14 +172,14 @@ print('\n')
 
 #create a swarmplot of the same data
 print('Showing Swarmplot of Day vs. Total Bill Amount...')
-sns.swarmplot(x='day', y='total_bill', data= tips_data, palette = 'Set2')
+swarmplot(x='day', y='total_bill', data= tips_view, palette = 'Set2')
 plt.title('Swarmplot of Day vs. Total Bill Amount')
 plt.show()
 print('\n')
 
 #create another swarmplot, segmented by gender, and split = True for visualization
 print('Showing Swarmplot of Day vs. Total Bill Amount, Segmented by Gender...')
-sns.swarmplot(x='day', y='total_bill', data= tips_data, hue = 'sex', split = True, palette = 'Set2')
+swarmplot(x='day', y='total_bill', data= tips_view, hue = 'sex', split = True, palette = 'Set2')
 plt.title('Swarmplot of Day vs. Total Bill Amount, Segmented by Gender')
 plt.show()
 print('\n')
@@ -168,8 +192,8 @@ Combining Categorical Plots - to combine plots onto the same graph with seaborn,
 """
 # one effective plot combination can be created by combining the violin plot with the swarm plot
 print('Showing Violin/Swarm plot combination, Tip Amount vs. Day of Week...')
-sns.violinplot(x='tip', y='day', data=tips_data,palette='rainbow')
-sns.swarmplot(x='tip', y='day', data=tips_data,color='black',size=3)
+violinplot(x='tip', y='day', data=tips_view,palette='rainbow')
+swarmplot(x='tip', y='day', data=tips_view,color='black',size=3)
 plt.title('Violin/Swarm plot combination, Tip Amount vs. Day of Week')
 plt.show()
 print('\n')
@@ -179,12 +203,14 @@ print('\n')
 --------------------------------------------------------------------------------------------------------------------------------
 Factorplot - the most general form of categorical plot
 		   - can take in the 'kind' parameter to adjust plot type
+		   - seaborn renamed factorplot() to catplot(), which takes the same parameters
 --------------------------------------------------------------------------------------------------------------------------------
 """
-#use the factorplot method to create a bar graph
-print('Showing Use of Factorplot to create a bar graph...')
+#use catplot, the successor of the factorplot method, to create a bar graph
+#the error bars come from the batched bootstrap engine through the errorbar parameter
+print('Showing Use of Factorplot (catplot) to create a bar graph...')
+sns.catplot(x='sex',y='total_bill',data=tips_data,kind='bar', errorbar = errorbar())
 plt.title("Factorplot (kind = 'bar'), Total Bill Amount by Gender")
-sns.factorplot(x='sex',y='total_bill',data=tips_data,kind='bar')
 plt.show()
 print('\n')
 
@@ -28,10 +28,17 @@ For all method parameters, refer to Seaborn official documentation.
 """
 
 #import the necessary libraries
+import os
+import sys
 import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
 
+#make the shared NumPy engines in ../Numpy importable when running from this folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Numpy'))
+from hexbin_aggregation import HexbinGrid
+from binned_kde import plot_kde
+
 #load the dataset
 tips_data = sns.load_dataset('tips')
 
@@ -73,9 +80,14 @@ sns.jointplot(x='total_bill',y='tip',data=tips_data,kind='scatter')
 plt.show()
 print('\n')
 
-#repeat this type of plot, however this time change the kind type to 'hex'
+#repeat this type of plot, however this time use hexagonal bins
+#the hex counts come from the chunked HexbinGrid engine, drawn onto a JointGrid
 print('Showing Jointplot (Hex) of Total Bill vs. Tip Amount...')
-sns.jointplot(x='total_bill',y='tip',data=tips_data,kind='hex')
+joint_grid = sns.JointGrid(x='total_bill',y='tip',data=tips_data)
+hex_grid = HexbinGrid(extent=(tips_data['total_bill'].min(), tips_data['total_bill'].max(), tips_data['tip'].min(), tips_data['tip'].max()), gridsize=20)
+hex_grid.update(tips_data['total_bill'].values, tips_data['tip'].values)
+hex_grid.draw(joint_grid.ax_joint, cmap='Blues', mincnt=1, colorbar=False)
+joint_grid.plot_marginals(sns.histplot)
 plt.show()
 print('\n')
 
@@ -125,11 +137,13 @@ print('\n')
 ---------------------------------------------------------------------------------------
 KDE Plot - kernel density estimation plot
 		 - replace every observation of data with normal distribution around that value
+		 - plot_kde uses a binned, FFT-convolved estimate with kdeplot's defaults
+		   (scott bandwidth, 200 grid points, grid cut 3 bandwidths past the data)
 ---------------------------------------------------------------------------------------
 """
 #create a kde plot with seaborn 
 print('Showing KDE Plot of Total Bills...')
-sns.kdeplot(tips_data['total_bill'])
+plot_kde(tips_data['total_bill'], gridsize=200, cut=3)
 plt.title('KDE Plot of Total Bills')
 plt.xlabel('Total Bill ($)')
 plt.show()
@@ -137,7 +151,7 @@ print('\n')
 
 #show rugplot with the kde plot to visualize their relationship
 print('Showing KDE and Rug Plots of Total Bills...')
-sns.kdeplot(tips_data['total_bill'])
+plot_kde(tips_data['total_bill'], gridsize=200, cut=3)
 sns.rugplot(tips_data['total_bill'])
 plt.title('KDE and Rug Plots of Total Bills')
 plt.xlabel('Total Bill ($)')
@@ -146,7 +160,7 @@ print('\n')
 
 #show the same, but for data related to tip amount
 print('Showing KDE and Rug Plots of Tip Amounts...')
-sns.kdeplot(tips_data['tip'])
+plot_kde(tips_data['tip'], gridsize=200, cut=3)
 sns.rugplot(tips_data['tip'])
 plt.title('KDE and Rug Plots of Tip Amounts')
 plt.xlabel('Tip Amount ($)')
@@ -17,14 +17,24 @@ The examples contained in this script will demonstrate use of:
 The lmplot() method in seaborn allows you to easily plot linear models,
 it also allows the plots to be split and further classified based off features.
 
+The confidence bands are drawn by regression_band() from ../Numpy/bootstrap_ci.py, which
+refits every bootstrap resample in one batch instead of one fit at a time (ci=None turns
+off lmplot's own band, and map_dataframe draws ours on every facet and hue level).
+
 For all method parameters, refer to Seaborn official documentation.
 --------------------------------------------------------------------------------------------------------------------------------
 """
 #import the necessary libraries
+import os
+import sys
 import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
 
+#make the shared NumPy engines in ../Numpy importable when running from this folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Numpy'))
+from bootstrap_ci import regression_band
+
 #load the iris and tips datasets
 tips = sns.load_dataset('tips')
 
@@ -44,7 +54,8 @@ lmplot()
 #change the marker style for each gender
 #change the marker size using scatter_kws
 print('Showing Lmplot of Total Bill vs. Tip Amount, Segmented by Gender...')
-sns.lmplot(x='total_bill', y='tip', data=tips, hue='sex', palette = 'coolwarm', markers=['o','+'], scatter_kws={'s':20})
+lm_grid = sns.lmplot(x='total_bill', y='tip', data=tips, hue='sex', palette = 'coolwarm', markers=['o','+'], scatter_kws={'s':20}, ci=None)
+lm_grid.map_dataframe(regression_band, 'total_bill', 'tip')
 plt.show()
 print('\n')
 
@@ -58,7 +69,8 @@ Using lmplot() to create a feature segmented grid
 #showing total bill vs. tip with one column for each gender
 #showing one row for time lunch or dinner
 print('Showing Lmplot of Total Bill vs. Tip Amount, Separating Plots by Gender and Time of Meal...')
-sns.lmplot(x='total_bill',y='tip',data=tips, row='sex', col='time')
+lm_grid = sns.lmplot(x='total_bill',y='tip',data=tips, row='sex', col='time', ci=None)
+lm_grid.map_dataframe(regression_band, 'total_bill', 'tip')
 plt.show()
 print('\n')
 
@@ -66,7 +78,8 @@ print('\n')
 #showing total bill vs. tip with one column for each gender
 #showing one row for time lunch or dinner
 print('Showing Lmplot of Total Bill vs. Tip Amount, Separating Plots by Day, Segmenting by Gender...')
-sns.lmplot(x='total_bill',y='tip',data=tips, col='day', hue='sex', palette = 'coolwarm', aspect= 0.5, height = 7)
+lm_grid = sns.lmplot(x='total_bill',y='tip',data=tips, col='day', hue='sex', palette = 'coolwarm', aspect= 0.5, height = 7, ci=None)
+lm_grid.map_dataframe(regression_band, 'total_bill', 'tip')
 plt.show()
 print('\n')
 
@@ -0,0 +1,392 @@
+"""
+Plot Section Runner
+---------------------------------------------------------------------------------------------
+Command line entry point that runs individual plot sections of the scripts in this
+repository by name, importing only the libraries each section actually needs.
+
+Every script is split into sections at its dashed section header strings. To run a
+section, the runner keeps only the earlier statements (imports, data loading, helper
+objects) that define names the section uses, so e.g. a Pandas histogram never imports
+plotly and a map never imports matplotlib. This file itself only imports the standard
+library, so startup cost is paid only for what is run.
+
+Usage:
+    python run_sections.py list
+    python run_sections.py run pandas:histograms seaborn-catplots:bar-and-count-plots
+    python run_sections.py run pandas                  (every section of one script)
+    python run_sections.py bench [sections ...] [--budget SECONDS]
+
+bench runs every section in a fresh interpreter with a non-interactive backend and
+reports import time, time to the first finished figure, and total wall time; sections
+over the --budget (import + first figure) are flagged and make the command fail.
+---------------------------------------------------------------------------------------------
+"""
+
+import argparse
+import ast
+import builtins
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+#script name -> path, relative to the repository root
+SCRIPTS = {
+    'pandas': os.path.join('Pandas', 'pandas_data_visualization.py'),
+    'plotly': os.path.join('Plotly', 'plotly_geoplotting_python.py'),
+    'seaborn-catplots': os.path.join('Seaborn', 'catplots_seaborn_python.py'),
+    'seaborn-distplots': os.path.join('Seaborn', 'distplots_seaborn_python.py'),
+    'seaborn-grids': os.path.join('Seaborn', 'grids_seaborn_python.py'),
+    'seaborn-matrixplots': os.path.join('Seaborn', 'matrixplots_seaborn_python.py'),
+    'seaborn-lmplots': os.path.join('Seaborn', 'regression_lmplots_seaborn_python.py'),
+}
+
+BUILTIN_NAMES = set(dir(builtins))
+
+#prefix of the timing line a benchmark subprocess prints
+BENCH_MARKER = '@@section-timing '
+
+#methods that add to a collection built up across sections (e.g. map_bundle.add)
+FILL_METHODS = ('add', 'append', 'extend')
+
+
+class NameUsage(ast.NodeVisitor):
+    """Collect the free names a statement reads, ignoring lambda and comprehension variables."""
+
+    def __init__(self):
+        self.used = set()
+        self.bound = [set()]
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load) and not any(node.id in scope for scope in self.bound):
+            self.used.add(node.id)
+
+    def visit_Lambda(self, node):
+        self.bound.append(set(arg.arg for arg in node.args.args + node.args.kwonlyargs))
+        self.generic_visit(node)
+        self.bound.pop()
+
+    def visit_comprehension_node(self, node):
+        scope = set()
+        for generator in node.generators:
+            scope |= defined_names(generator.target)
+        self.bound.append(scope)
+        self.generic_visit(node)
+        self.bound.pop()
+
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = visit_comprehension_node
+
+
+def used_names(node):
+    """Return the free, non-builtin names a statement reads."""
+    usage = NameUsage()
+    usage.visit(node)
+    return usage.used - BUILTIN_NAMES
+
+
+def defined_names(node):
+    """Return the names a statement (or assignment target) binds at module level."""
+    names = set()
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        for alias in node.names:
+            names.add((alias.asname or alias.name).split('.')[0])
+    elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+        names.add(node.name)
+    else:
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+                names.add(child.id)
+    return names
+
+
+def mutated_names(node):
+    """Return the names whose methods are called inside a loop or with block (e.g. hist.update)."""
+    names = set()
+    if isinstance(node, (ast.For, ast.While, ast.With, ast.If)):
+        for child in ast.walk(node):
+            if isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute) \
+                    and isinstance(child.func.value, ast.Name):
+                names.add(child.func.value.id)
+    return names
+
+
+def fills_collection(node, needed):
+    """Return the needed name a top-level call like bundle.add(...) adds to, as a set."""
+    if not isinstance(node, ast.Expr) or not isinstance(node.value, ast.Call):
+        return set()
+    func = node.value.func
+    if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) \
+            and func.attr in FILL_METHODS and func.value.id in needed:
+        return set([func.value.id])
+    return set()
+
+
+def is_path_setup(node):
+    """True for top-level sys.path.insert/append calls, which imports below depend on."""
+    if not isinstance(node, ast.Expr) or not isinstance(node.value, ast.Call):
+        return False
+    func = node.value.func
+    return isinstance(func, ast.Attribute) and isinstance(func.value, ast.Attribute) \
+        and isinstance(func.value.value, ast.Name) and func.value.value.id == 'sys' \
+        and func.value.attr == 'path'
+
+
+def header_title(text):
+    """Return the title of a dashed section header string, or None if it is not one."""
+    lines = [line.strip() for line in text.strip().splitlines()]
+    for line in lines:
+        if line and not set(line) <= set('-'):
+            return re.split(r'\s+-\s+', line)[0].strip()
+    return None
+
+
+def slugify(title):
+    return re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-')
+
+
+def parse_script(path):
+    """Split a script into (setup statements, [(slug, title, statements)])."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    body = tree.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], 'value', None), ast.Constant):
+        body = body[1:]
+
+    setup, sections, current = [], [], None
+    for node in body:
+        is_header = isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) \
+            and isinstance(node.value.value, str) and header_title(node.value.value)
+        if is_header:
+            current = (header_title(node.value.value), [])
+            sections.append(current)
+        elif current is None:
+            setup.append(node)
+        else:
+            current[1].append(node)
+
+    named, seen = [], {}
+    for title, statements in sections:
+        if not statements:
+            continue
+        slug = slugify(title)
+        seen[slug] = seen.get(slug, 0) + 1
+        if seen[slug] > 1:
+            slug = '%s-%d' % (slug, seen[slug])
+        named.append((slug, title, statements))
+    return setup, named
+
+
+def slice_statements(setup, sections, target):
+    """
+    Return the statements needed to run one section: the earlier statements that define
+    (or fill, in a loop) the names it reads, followed by the section itself.
+    """
+    earlier = list(setup)
+    for slug, title, statements in sections:
+        if slug == target:
+            break
+        earlier.extend(statements)
+    section = dict((slug, statements) for slug, title, statements in sections)[target]
+
+    #names the section reads before defining them itself; a collection the section only
+    #adds to (e.g. map_bundle.add) needs to exist, but not the items added before
+    needed, read, defined = set(), set(), set()
+    for node in section:
+        needed |= used_names(node) - defined
+        read |= used_names(node) - fills_collection(node, needed) - defined
+        defined |= defined_names(node)
+
+    keep = []
+    for node in reversed(earlier):
+        if is_path_setup(node):
+            keep.append(node)
+            needed |= used_names(node)
+            continue
+        if isinstance(node, ast.Expr) and not fills_collection(node, read):
+            #prints, plt.show() and other display calls of earlier sections are skipped
+            continue
+        binds = defined_names(node) & needed
+        fills = (mutated_names(node) & needed) | fills_collection(node, read)
+        if binds or fills:
+            keep.append(node)
+            needed -= binds if not isinstance(node, (ast.For, ast.While, ast.AugAssign)) else set()
+            needed |= used_names(node)
+            read |= used_names(node) - fills_collection(node, needed)
+    keep.reverse()
+    return keep, section
+
+
+def script_path(name):
+    if name not in SCRIPTS:
+        raise SystemExit('unknown script %r, choose from: %s' % (name, ', '.join(sorted(SCRIPTS))))
+    return os.path.join(ROOT, SCRIPTS[name])
+
+
+def all_sections():
+    """Yield (section id, title) for every runnable section."""
+    for name in SCRIPTS:
+        setup, sections = parse_script(script_path(name))
+        for slug, title, statements in sections:
+            yield '%s:%s' % (name, slug), title
+
+
+def expand(ids):
+    """Expand bare script names into all of their sections."""
+    result = []
+    for section_id in ids:
+        if ':' in section_id:
+            result.append(section_id)
+        else:
+            setup, sections = parse_script(script_path(section_id))
+            result.extend('%s:%s' % (section_id, slug) for slug, title, statements in sections)
+    return result
+
+
+def run_section(section_id, benchmark=False):
+    """
+    Run one section in this interpreter. With benchmark=True, figures are drawn off-screen
+    and a timing dictionary is returned instead of showing them.
+    """
+    name, _, slug = section_id.partition(':')
+    path = script_path(name)
+    setup, sections = parse_script(path)
+    if slug not in [s for s, t, st in sections]:
+        raise SystemExit('unknown section %r, see: python run_sections.py list' % section_id)
+    prelude, section = slice_statements(setup, sections, slug)
+
+    if benchmark:
+        os.environ['MPLBACKEND'] = 'Agg'
+    namespace = {'__name__': '__section__', '__file__': path}
+    imports = [node for node in prelude if isinstance(node, (ast.Import, ast.ImportFrom)) or is_path_setup(node)]
+    rest = [node for node in prelude if node not in imports] + section
+    timing = dict(section=section_id, first_figure=None)
+
+    #scripts read their data files and sibling modules relative to their own folder
+    previous = os.getcwd()
+    os.chdir(os.path.dirname(path))
+    if os.path.dirname(path) not in sys.path:
+        sys.path.insert(0, os.path.dirname(path))
+    try:
+        start = time.perf_counter()
+        exec(compile(ast.Module(body=imports, type_ignores=[]), path, 'exec'), namespace)
+        timing['imports'] = time.perf_counter() - start
+        if benchmark:
+            patch_display(namespace, timing, start)
+        exec(compile(ast.Module(body=rest, type_ignores=[]), path, 'exec'), namespace)
+        timing['total'] = time.perf_counter() - start
+    finally:
+        os.chdir(previous)
+    return timing
+
+
+def patch_display(namespace, timing, start):
+    """Replace plt.show and the plotly html/bundle writers with off-screen versions that record latency."""
+    def record():
+        if timing['first_figure'] is None:
+            timing['first_figure'] = time.perf_counter() - start
+
+    if 'matplotlib.pyplot' in sys.modules:
+        plt = sys.modules['matplotlib.pyplot']
+
+        def show(*args, **kwargs):
+            for number in plt.get_fignums():
+                plt.figure(number).canvas.draw()
+            record()
+            plt.close('all')
+        plt.show = show
+
+    if callable(namespace.get('write_html')) and getattr(namespace['write_html'], '__module__', '') == 'fast_choropleth':
+        html_writer = namespace['write_html']
+
+        def write_html(figure, *args, **kwargs):
+            kwargs['auto_open'] = False
+            result = html_writer(figure, *args, **kwargs)
+            record()
+            return result
+        namespace['write_html'] = write_html
+
+    bundle_class = getattr(sys.modules.get('map_bundle'), 'MapBundle', None)
+    if bundle_class is not None:
+        for method in ('write_dashboard', 'write_pages'):
+            def writer(self, *args, _write=getattr(bundle_class, method), **kwargs):
+                kwargs['auto_open'] = False
+                result = _write(self, *args, **kwargs)
+                record()
+                return result
+            setattr(bundle_class, method, writer)
+
+    if callable(namespace.get('plot')) and getattr(namespace['plot'], '__module__', '').startswith('plotly'):
+        offline_plot = namespace['plot']
+
+        def plot(figure, *args, **kwargs):
+            kwargs.update(output_type='div', auto_open=False)
+            result = offline_plot(figure, *args, **kwargs)
+            record()
+            return result
+        namespace['plot'] = plot
+
+
+def benchmark(ids, budget=None):
+    """Run each section in a fresh interpreter and print a latency table."""
+    rows, failed = [], False
+    for section_id in ids:
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, os.path.abspath(__file__), '_bench_one', section_id],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        wall = time.perf_counter() - start
+        lines = [line[len(BENCH_MARKER):] for line in process.stdout.splitlines() if line.startswith(BENCH_MARKER)]
+        if process.returncode or not lines:
+            rows.append((section_id, None, None, wall, 'error: %s' % (process.stderr.strip().splitlines() or ['?'])[-1]))
+            failed = True
+            continue
+        timing = json.loads(lines[-1])
+        latency = timing['imports'] + (timing['first_figure'] or timing['total'])
+        note = ''
+        if budget is not None and latency > budget:
+            note = 'over budget'
+            failed = True
+        rows.append((section_id, timing['imports'], timing['first_figure'], wall, note))
+
+    print('%-62s %9s %13s %9s' % ('section', 'imports', 'first figure', 'wall'))
+    for section_id, imports, first, wall, note in rows:
+        fmt = lambda value: '-' if value is None else '%.3fs' % value
+        print('%-62s %9s %13s %9s  %s' % (section_id, fmt(imports), fmt(first), fmt(wall), note))
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run plot sections of the repository scripts by name.')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('list', help='list every runnable section')
+    run = commands.add_parser('run', help='run sections (or whole scripts) by name')
+    run.add_argument('sections', nargs='+')
+    bench = commands.add_parser('bench', help='report import and first-figure latency per section')
+    bench.add_argument('sections', nargs='*')
+    bench.add_argument('--budget', type=float, default=None,
+        help='flag sections whose import + first figure time exceeds this many seconds')
+    one = commands.add_parser('_bench_one')
+    one.add_argument('section')
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for section_id, title in all_sections():
+            print('%-62s %s' % (section_id, title))
+    elif args.command == 'run':
+        for section_id in expand(args.sections):
+            run_section(section_id)
+    elif args.command == 'bench':
+        ids = expand(args.sections) if args.sections else [s for s, t in all_sections()]
+        return benchmark(ids, args.budget)
+    elif args.command == '_bench_one':
+        print(BENCH_MARKER + json.dumps(run_section(args.section, benchmark=True)))
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())